@@ -0,0 +1,65 @@
+"""
+Gunicorn configuration for the My Story Buddy API
+Runs several uvicorn worker processes so CPU-bound work in one request
+(JSON, image resizing) doesn't stall every other client
+"""
+import os
+
+from uvicorn.workers import UvicornWorker
+
+
+class StoryBuddyWorker(UvicornWorker):
+    """Uvicorn worker with a per-process concurrency cap.
+
+    Past the cap uvicorn answers new requests with a quick 503 instead of
+    letting them queue behind slow OpenAI calls.
+    """
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "limit_concurrency": int(os.getenv("LIMIT_CONCURRENCY", "512")),
+    }
+
+
+bind = os.getenv("BIND", "0.0.0.0:8003")
+worker_class = StoryBuddyWorker
+
+# Starting point for an I/O-heavy app; benchmark and override with WEB_CONCURRENCY.
+# Caches are per process. DB_POOL_*_SIZE, STORY_WORKERS, AVATAR_WORKERS,
+# IMAGE_CONCURRENCY and the OpenAI budgets are host totals that each process
+# divides by this.
+workers = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+
+# Workers inherit this so they can split the host totals above between them
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+# Uvicorn workers use this as timeout_keep_alive; keep idle connections open
+# long enough for the follow-up request after a preflight or story poll
+keepalive = int(os.getenv("KEEPALIVE", "30"))
+backlog = 2048
+# The synchronous avatar endpoint waits on image generation
+timeout = 120
+# Longer than STORY_DRAIN_TIMEOUT so queued stories can finish on restart
+graceful_timeout = 45
+
+
+def on_starting(server):
+    """Fail avatars orphaned by the previous deployment, once for all workers."""
+    import asyncio
+    from core import database
+
+    async def sweep():
+        await database.db_manager.initialize()
+        try:
+            return await database.fail_stale_avatars(database.AVATAR_STALE_MINUTES)
+        finally:
+            await database.db_manager.close()
+
+    try:
+        failed = asyncio.run(sweep())
+    except Exception:
+        # Leave STALE_AVATARS_SWEPT unset so the workers try it themselves
+        server.log.exception("Stale avatar sweep failed")
+        return
+    server.log.info("Marked %s stale IN_PROGRESS avatar(s) as FAILED", failed)
+    # Workers are forked after this hook and inherit the flag
+    os.environ["STALE_AVATARS_SWEPT"] = "1"
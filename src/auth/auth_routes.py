@@ -190,6 +190,17 @@ async def send_otp(otp_request: OTPRequest, request: Request):
         
         email = otp_request.email.lower()
         
+        # Drop rapid resends before touching the database; storing a new OTP
+        # would invalidate the code that is already on its way
+        if email_service.otp_recently_sent(email):
+            logger.info(f"OTP recently sent to {email}, skipping resend")
+            return JSONResponse(
+                content={
+                    "message": "OTP sent to your email address",
+                    "expires_in": 300  # 5 minutes in seconds
+                }
+            )
+        
         # Check if user exists
         user = await UserDatabase.get_user_by_email(email)
         first_name = user['first_name'] if user else None
@@ -289,6 +289,10 @@ async def get_current_user_optional(credentials: HTTPAuthorizationCredentials =
 from fastapi.security.utils import get_authorization_scheme_param
 from fastapi import Request
 
+def is_bearer_scheme(scheme: str) -> bool:
+    """Case-insensitive check for the Bearer scheme, skipping lower() for the usual spelling"""
+    return scheme == "Bearer" or scheme.lower() == "bearer"
+
 async def get_optional_user(request: Request) -> Optional[dict]:
     """
     Dependency to get current user if authenticated, None otherwise
@@ -301,7 +305,7 @@ async def get_optional_user(request: Request) -> Optional[dict]:
             return None
             
         scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
+        if not is_bearer_scheme(scheme):
             return None
             
         # Verify JWT token
@@ -0,0 +1,77 @@
+"""
+In-process TTL cache for My Story Buddy
+Skips repeat database lookups for data that rarely changes
+"""
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+
+class TTLCache:
+    """LRU-bounded mapping whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entries past maxsize.
+        
+        ttl overrides the cache-wide ttl for this entry.
+        """
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Drop all entries"""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, or await loader() and cache its result.
+
+        Concurrent misses for the same key share one loader call instead of
+        stampeding the database. None results are cached too.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                value = self.get(key, _MISSING)
+                if value is _MISSING:
+                    value = await loader()
+                    self.set(key, value)
+                return value
+        finally:
+            if self._locks.get(key) is lock and not lock.locked():
+                del self._locks[key]
@@ -19,6 +19,17 @@ def get_db_config():
         'autocommit': True
     }
 
+# Connection pool sizing: keep enough warm connections for the story workers
+# and concurrent requests so queries don't wait on a fresh MySQL handshake.
+# The sizes are totals for the host; each of the WEB_CONCURRENCY server
+# processes opens its own pool, so they're split to stay under max_connections.
+WEB_WORKERS = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+DB_POOL_MIN_SIZE = max(1, int(os.getenv('DB_POOL_MIN_SIZE', '10')) // WEB_WORKERS)
+DB_POOL_MAX_SIZE = max(DB_POOL_MIN_SIZE, int(os.getenv('DB_POOL_MAX_SIZE', '50')) // WEB_WORKERS)
+
+# IN_PROGRESS avatars untouched for this long were orphaned by a dead process
+AVATAR_STALE_MINUTES = 15
+
 class DatabaseManager:
     def __init__(self):
         self.pool: Optional[aiomysql.Pool] = None
@@ -43,8 +54,8 @@ class DatabaseManager:
                 db=db_config['db'],
                 charset=db_config['charset'],
                 autocommit=db_config['autocommit'],
-                minsize=1,
-                maxsize=10,
+                minsize=DB_POOL_MIN_SIZE,
+                maxsize=DB_POOL_MAX_SIZE,
                 echo=False,
                 # Connection settings for better reliability
                 pool_recycle=3600,  # Recycle connections every hour
@@ -212,7 +223,8 @@ async def create_tables():
             FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
             INDEX idx_user_id (user_id),
             INDEX idx_created_at (created_at),
-            INDEX idx_is_active (is_active)
+            INDEX idx_is_active (is_active),
+            INDEX idx_user_active (user_id, is_active, created_at)
         ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
         """
         
@@ -334,6 +346,18 @@ async def run_migrations():
             else:
                 logger.warning(f"Error adding visual_traits column: {str(e)}")
         
+        # Migration 7: Composite index for active-avatar lookups/updates by user
+        try:
+            await db_manager.execute_update("""
+                ALTER TABLE user_avatars ADD INDEX idx_user_active (user_id, is_active, created_at)
+            """)
+            logger.info("Added composite index for active avatars per user")
+        except Exception as e:
+            if "Duplicate key name" in str(e):
+                logger.info("Active avatar composite index already exists")
+            else:
+                logger.warning(f"Error adding active avatar composite index: {str(e)}")
+        
         logger.info("Database migrations completed successfully!")
         
     except Exception as e:
@@ -545,6 +569,17 @@ async def get_story_by_id(story_id: int) -> dict:
         logger.error(f"Error fetching story by ID: {str(e)}")
         return None
 
+async def get_story_owner(story_id: int) -> str:
+    """Get the user ID a story belongs to, or None."""
+    try:
+        query = "SELECT user_id FROM stories WHERE id = %s"
+        results = await db_manager.execute_query(query, (story_id,))
+        return results[0]['user_id'] if results else None
+        
+    except Exception as e:
+        logger.error(f"Error fetching story owner: {str(e)}")
+        return None
+
 async def get_stories_with_status(user_id: str = None, limit: int = 10) -> list:
     """Get recent stories with status information."""
     try:
@@ -607,9 +642,45 @@ async def get_new_stories_count(user_id: str = None) -> int:
         logger.error(f"Error getting new stories count: {str(e)}")
         return 0
 
+async def get_stories_with_new_count(user_id: str, limit: int = 10) -> tuple:
+    """Get a user's recent stories and their new/unread count in one round trip."""
+    try:
+        query = """
+        SELECT id, title, story_content, prompt, image_urls, formats, created_at, updated_at, status,
+               (SELECT COUNT(*) FROM stories WHERE user_id = %s AND status = 'NEW') AS new_count
+        FROM stories 
+        WHERE user_id = %s
+        ORDER BY created_at DESC 
+        LIMIT %s
+        """
+        params = (user_id, user_id, limit)
+        
+        results = await db_manager.execute_query(query, params)
+        new_count = results[0]['new_count'] if results else 0
+        
+        # Parse JSON fields
+        import json
+        for result in results:
+            del result['new_count']
+            if result['image_urls']:
+                result['image_urls'] = json.loads(result['image_urls'])
+            if result['formats']:
+                result['formats'] = json.loads(result['formats'])
+                
+        return results, new_count
+        
+    except Exception as e:
+        logger.error(f"Error fetching stories with new count: {str(e)}")
+        return [], 0
+
 # Avatar management functions
-async def create_user_avatar(user_id: int, avatar_name: str, traits_description: str, s3_image_url: str = "", status: str = "COMPLETED", visual_traits: str = None) -> int:
-    """Create or update user avatar (limit one per user)."""
+async def create_user_avatar(user_id: int, avatar_name: str, traits_description: str, s3_image_url: str = "", status: str = "COMPLETED", visual_traits: str = None, with_timestamps: bool = False) -> dict:
+    """Create or update user avatar (limit one per user).
+    
+    Returns the new row so callers don't have to read it back. MySQL has no
+    RETURNING, so created_at/updated_at are only read back when
+    with_timestamps is set and are None otherwise.
+    """
     try:
         logger.info(f"Creating avatar for user_id: {user_id}, name: {avatar_name}, status: {status}")
         
@@ -635,6 +706,7 @@ async def create_user_avatar(user_id: int, avatar_name: str, traits_description:
         """
         
         params = (user_id, avatar_name, traits_description, s3_image_url or "", status, visual_traits)
+        created_at = updated_at = None
         
         # Use a direct connection to get the insert ID
         async with db_manager.get_connection() as conn:
@@ -653,9 +725,28 @@ async def create_user_avatar(user_id: int, avatar_name: str, traits_description:
                 if not avatar_id:
                     logger.error(f"Failed to get avatar_id after insert for user_id: {user_id}")
                     raise ValueError("Failed to get avatar_id after insert")
+                
+                if with_timestamps:
+                    # Timestamps come from the column defaults, on the database clock
+                    await cursor.execute(
+                        "SELECT created_at, updated_at FROM user_avatars WHERE id = %s",
+                        (avatar_id,)
+                    )
+                    row = await cursor.fetchone()
+                    if row:
+                        created_at, updated_at = row
         
         logger.info(f"Avatar created for user_id: {user_id}, avatar_id: {avatar_id}, status: {status}")
-        return avatar_id
+        return {
+            "id": avatar_id,
+            "avatar_name": avatar_name,
+            "traits_description": traits_description,
+            "s3_image_url": s3_image_url or "",
+            "status": status,
+            "visual_traits": visual_traits,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
         
     except Exception as e:
         logger.error(f"Error creating user avatar: {str(e)}")
@@ -721,6 +812,23 @@ async def update_avatar_status_with_traits(avatar_id: int, status: str, s3_image
         logger.error(f"Error updating avatar status with traits: {str(e)}")
         raise
 
+async def fail_stale_avatars(older_than_minutes: int) -> int:
+    """Mark IN_PROGRESS avatars not touched for a while as FAILED.
+    
+    Their generation jobs died with the process that ran them, and the
+    uploaded photo isn't kept, so they can't be resumed.
+    """
+    try:
+        query = """
+        UPDATE user_avatars 
+        SET status = 'FAILED', updated_at = CURRENT_TIMESTAMP
+        WHERE status = 'IN_PROGRESS' AND updated_at < NOW() - INTERVAL %s MINUTE
+        """
+        return await db_manager.execute_update(query, (older_than_minutes,))
+    except Exception as e:
+        logger.error(f"Error failing stale avatars: {str(e)}")
+        raise
+
 async def get_completed_avatars_count(user_id: int) -> int:
     """Get count of completed avatars that haven't been viewed (similar to new stories)."""
     try:
@@ -771,8 +879,12 @@ async def get_user_avatar_by_name(user_id: int, avatar_name: str) -> dict:
         logger.error(f"Error fetching user avatar by name: {str(e)}")
         return None
 
-async def update_user_avatar(user_id: int, avatar_name: str = None, traits_description: str = None) -> bool:
-    """Update user avatar details (not image)."""
+async def update_user_avatar(user_id: int, avatar_name: str = None, traits_description: str = None) -> Optional[dict]:
+    """Update user avatar details (not image).
+    
+    Returns the updated active avatar, or None if the user has none or
+    there is nothing to update.
+    """
     try:
         # Build dynamic update query
         update_fields = []
@@ -787,7 +899,7 @@ async def update_user_avatar(user_id: int, avatar_name: str = None, traits_descr
             params.append(traits_description)
             
         if not update_fields:
-            return False
+            return None
             
         update_fields.append("updated_at = CURRENT_TIMESTAMP")
         params.append(user_id)
@@ -801,61 +913,59 @@ async def update_user_avatar(user_id: int, avatar_name: str = None, traits_descr
         affected_rows = await db_manager.execute_update(query, tuple(params))
         if affected_rows > 0:
             logger.info(f"Avatar updated for user_id: {user_id}")
-            return True
+            return await get_user_avatar(user_id)
         else:
             logger.warning(f"No active avatar found for user_id: {user_id}")
-            return False
+            return None
         
     except Exception as e:
         logger.error(f"Error updating user avatar: {str(e)}")
         raise
 
+# Stories matching this predicate are considered broken and safe to delete.
+# Percent signs are doubled because execute_query/execute_update always
+# apply parameter interpolation.
+INVALID_STORY_PREDICATE = """
+    image_urls = '[]' OR 
+    image_urls = '' OR 
+    image_urls IS NULL OR
+    image_urls LIKE '%%placeholder%%' OR
+    image_urls LIKE '%%Comic+Generation+Failed%%' OR
+    image_urls LIKE '%%Image+Upload+Disabled%%' OR
+    image_urls LIKE '%%No+Image+Data%%' OR
+    title = 'Story in Progress...' OR
+    story_content = 'Your story is being generated...'
+"""
+
+# Rows deleted per transaction; keeps lock time and undo log small
+CLEANUP_BATCH_SIZE = 5000
+
 async def cleanup_invalid_stories() -> dict:
     """Clean up stories with invalid or blank image URLs."""
     try:
         logger.info("Starting cleanup of invalid stories...")
         
-        # First, get count of stories to be cleaned up
-        count_query = """
-        SELECT COUNT(*) as count FROM stories 
-        WHERE (
-            image_urls = '[]' OR 
-            image_urls = '' OR 
-            image_urls IS NULL OR
-            image_urls LIKE '%placeholder%' OR
-            image_urls LIKE '%Comic+Generation+Failed%' OR
-            image_urls LIKE '%Image+Upload+Disabled%' OR
-            image_urls LIKE '%No+Image+Data%' OR
-            title = 'Story in Progress...' OR
-            story_content = 'Your story is being generated...'
+        # Delete in bounded batches straight from the predicate, one statement
+        # per batch, so each transaction stays small and concurrent queries can
+        # proceed; ORDER BY keeps the LIMIT deterministic for replication
+        delete_query = (
+            f"DELETE FROM stories WHERE ({INVALID_STORY_PREDICATE}) "
+            f"ORDER BY id LIMIT {CLEANUP_BATCH_SIZE}"
         )
-        """
-        
-        count_result = await db_manager.execute_query(count_query)
-        count_to_delete = count_result[0]['count'] if count_result else 0
+        deleted_rows = 0
+        while True:
+            deleted = await db_manager.execute_update(delete_query)
+            deleted_rows += deleted
+            if deleted < CLEANUP_BATCH_SIZE:
+                break
+            
+            # Yield so other requests can use the pool between batches
+            await asyncio.sleep(0)
         
-        if count_to_delete == 0:
+        if deleted_rows == 0:
             logger.info("No invalid stories found to clean up")
             return {"deleted_count": 0, "message": "No invalid stories found"}
         
-        # Delete invalid stories
-        delete_query = """
-        DELETE FROM stories 
-        WHERE (
-            image_urls = '[]' OR 
-            image_urls = '' OR 
-            image_urls IS NULL OR
-            image_urls LIKE '%placeholder%' OR
-            image_urls LIKE '%Comic+Generation+Failed%' OR
-            image_urls LIKE '%Image+Upload+Disabled%' OR
-            image_urls LIKE '%No+Image+Data%' OR
-            title = 'Story in Progress...' OR
-            story_content = 'Your story is being generated...'
-        )
-        """
-        
-        deleted_rows = await db_manager.execute_update(delete_query)
-        
         logger.info(f"Cleaned up {deleted_rows} invalid stories from database")
         
         return {
@@ -3,9 +3,18 @@ Email service for My Story Buddy
 Handles OTP delivery and other email notifications
 """
 import os
+import re
+import json
+import base64
+import time
+import queue
+import asyncio
 import logging
-from typing import Optional
+from collections import OrderedDict
+from functools import cached_property
+from typing import Optional, List, Tuple
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import smtplib
 from email.mime.text import MIMEText
@@ -13,23 +22,208 @@ from email.mime.multipart import MIMEMultipart
 
 logger = logging.getLogger(__name__)
 
+# Email templates are parsed once at import; each send only substitutes fields
+OTP_EMAIL_SUBJECT = "Your My Story Buddy Login Code"
+WELCOME_EMAIL_SUBJECT = "Welcome to My Story Buddy! 🎉"
+
+# Shared stylesheet for HTML emails; classes replace repeated inline styles
+EMAIL_STYLE = """
+body { margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; background-color: #f8f9fa; }
+.msb-card { max-width: 600px; margin: 0 auto; background: white; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1); }
+.msb-header { background: linear-gradient(135deg, #E8E3FF, #DDD4FF); padding: 40px 30px; text-align: center; }
+.msb-header h1 { margin: 0; color: #1a1a1a; font-size: 28px; font-weight: 700; }
+.msb-header p { margin: 8px 0 0 0; color: #666; font-size: 16px; }
+.msb-content { padding: 40px 30px; }
+.msb-content h2 { margin: 0 0 20px 0; color: #1a1a1a; font-size: 24px; font-weight: 600; }
+.msb-text { margin: 0 0 20px 0; color: #666; font-size: 16px; line-height: 1.6; }
+.msb-text-lead { margin-bottom: 30px; }
+.msb-text-last { margin: 0; }
+.msb-list { margin: 0 0 30px 0; color: #666; font-size: 16px; line-height: 1.8; }
+.msb-center { text-align: center; margin: 40px 0; }
+.msb-otp-box { display: inline-block; background: #f8f9fa; border: 2px solid #E8E3FF; border-radius: 12px; padding: 20px 40px; }
+.msb-otp { font-size: 36px; font-weight: 700; color: #1a1a1a; letter-spacing: 8px; font-family: 'Courier New', monospace; }
+.msb-note { margin: 30px 0 0 0; color: #666; font-size: 14px; line-height: 1.6; }
+.msb-callout { display: inline-block; background: #E8E3FF; border-radius: 12px; padding: 20px 30px; }
+.msb-callout p { margin: 0; color: #1a1a1a; font-size: 18px; font-weight: 600; }
+.msb-footer { background: #f8f9fa; padding: 30px; text-align: center; border-top: 1px solid #f0f0f0; }
+.msb-footer p { margin: 0; color: #999; font-size: 14px; }
+"""
+
+EMAIL_FOOTER_HTML = """
+    <div class="msb-footer">
+        <p>
+            Happy storytelling! 📚✨<br>
+            The My Story Buddy Team
+        </p>
+    </div>
+"""
+
+
+def _minify_css(css: str) -> str:
+    """Drop whitespace around CSS punctuation"""
+    return re.sub(r'\s*([{};:,])\s*', r'\1', css).strip()
+
+
+def _minify_html(html: str) -> str:
+    """Strip comments and collapse whitespace in static email markup"""
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.DOTALL)
+    html = re.sub(r'>\s+<', '><', html)
+    return re.sub(r'\s+', ' ', html).strip()
+
+
+def _build_email_html(title: str, body: str) -> str:
+    """Wrap body markup in the shared document shell, minified once at import.
+
+    The result is used as a str.format template, so stylesheet braces are escaped.
+    """
+    style = _minify_css(EMAIL_STYLE).replace('{', '{{').replace('}', '}}')
+    return _minify_html(
+        '<!DOCTYPE html><html><head><meta charset="UTF-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1.0">'
+        f'<title>{title}</title><style>{style}</style></head>'
+        f'<body><div class="msb-card">{body}{EMAIL_FOOTER_HTML}</div></body></html>'
+    )
+
+
+OTP_EMAIL_HTML = _build_email_html("Your My Story Buddy Login Code", """
+    <div class="msb-header">
+        <h1>My Story Buddy</h1>
+        <p>Your magical storytelling companion</p>
+    </div>
+    <div class="msb-content">
+        <h2>Hi {name}! 👋</h2>
+        <p class="msb-text msb-text-lead">
+            Here's your login code for My Story Buddy. Enter this code to access your account and continue creating magical stories!
+        </p>
+        <div class="msb-center">
+            <div class="msb-otp-box">
+                <div class="msb-otp">{otp}</div>
+            </div>
+        </div>
+        <p class="msb-note">
+            <strong>Important:</strong> This code will expire in 5 minutes for your security. If you didn't request this code, please ignore this email.
+        </p>
+    </div>
+""")
+
+OTP_EMAIL_TEXT = """
+        Hi {name}!
+
+        Here's your login code for My Story Buddy:
+
+        {otp}
+
+        Enter this code to access your account and continue creating magical stories!
+
+        Important: This code will expire in 5 minutes for your security.
+        If you didn't request this code, please ignore this email.
+
+        Happy storytelling! 📚✨
+        The My Story Buddy Team
+        """
+
+WELCOME_EMAIL_HTML = _build_email_html("Welcome to My Story Buddy!", """
+    <div class="msb-header">
+        <h1>Welcome to My Story Buddy! 🎉</h1>
+    </div>
+    <div class="msb-content">
+        <h2>Hi {first_name}! 👋</h2>
+        <p class="msb-text">
+            Welcome to My Story Buddy, where imagination comes to life! We're excited to help you create magical stories that will spark creativity and wonder.
+        </p>
+        <p class="msb-text">
+            With My Story Buddy, you can:
+        </p>
+        <ul class="msb-list">
+            <li>Generate personalized stories based on your ideas</li>
+            <li>Choose from multiple formats: text stories and comic books</li>
+            <li>Enjoy beautiful illustrations that bring your stories to life</li>
+            <li>Learn fun facts while your stories are being created</li>
+        </ul>
+        <div class="msb-center">
+            <div class="msb-callout">
+                <p>Ready to start your storytelling adventure? 📖✨</p>
+            </div>
+        </div>
+        <p class="msb-text msb-text-last">
+            Start by entering any topic or idea that interests you, and watch as we transform it into an engaging story just for you!
+        </p>
+    </div>
+""")
+
+WELCOME_EMAIL_TEXT = """
+        Hi {first_name}!
+
+        Welcome to My Story Buddy, where imagination comes to life! We're excited to help you create magical stories that will spark creativity and wonder.
+
+        With My Story Buddy, you can:
+        • Generate personalized stories based on your ideas
+        • Choose from multiple formats: text stories and comic books
+        • Enjoy beautiful illustrations that bring your stories to life
+        • Learn fun facts while your stories are being created
+
+        Ready to start your storytelling adventure? 📖✨
+
+        Start by entering any topic or idea that interests you, and watch as we transform it into an engaging story just for you!
+
+        Happy storytelling! 📚✨
+        The My Story Buddy Team
+        """
+
+# SES server-side template for welcome emails (SES uses {{var}} placeholders)
+WELCOME_TEMPLATE_NAME = "msb_welcome"
+
+# Welcome emails are not latency critical, so they are buffered and sent
+# with SendBulkTemplatedEmail (max 50 destinations per call)
+SES_BULK_MAX_DESTINATIONS = 50
+SES_BULK_FLUSH_INTERVAL = 0.1  # seconds
+
+# Reuse HTTPS connections to SES across concurrent sends
+SES_CLIENT_CONFIG = Config(max_pool_connections=50)
+
+# Number of idle authenticated SMTP connections kept for reuse
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '4'))
+
+# Repeat OTP requests for the same address inside this window are not re-sent
+OTP_RESEND_INTERVAL = 30  # seconds
+OTP_RECENT_MAX_ENTRIES = 10_000
+
+# Placeholders spliced into the precompiled raw MIME OTP message. Bodies are
+# base64 encoded by the email package, so the body tokens are matched in
+# their encoded form.
+RAW_TO_TOKEN = "msb-raw-recipient@invalid"
+RAW_TEXT_TOKEN = "MSBRAWTEXTBODY"
+RAW_HTML_TOKEN = "MSBRAWHTMLBODY"
+
+
 class EmailService:
     """Email service for sending OTP and notifications"""
     
     def __init__(self):
-        self.ses_client = None
         self.smtp_config = None
-        self._initialize_email_service()
+        self._welcome_template_ready = False
+        self._welcome_queue: Optional[asyncio.Queue] = None
+        self._welcome_flusher: Optional[asyncio.Task] = None
+        self._smtp_pool: queue.Queue = queue.Queue(maxsize=SMTP_POOL_SIZE)
+        self._recent_otp_sends: "OrderedDict[str, float]" = OrderedDict()
+        
+        # Creating the SES client loads botocore service data and resolves
+        # credentials, so it is deferred to the first send unless requested
+        if os.getenv('EAGER_EMAIL_INIT'):
+            self.ses_client
     
-    def _initialize_email_service(self):
-        """Initialize email service (SES or SMTP)"""
+    @cached_property
+    def ses_client(self):
+        """AWS SES client, created on first use (None if SES is unavailable)"""
         try:
             # Try to initialize AWS SES first
-            self.ses_client = boto3.client(
+            ses_client = boto3.client(
                 'ses',
-                region_name=os.getenv('AWS_REGION', 'us-west-2')
+                region_name=os.getenv('AWS_REGION', 'us-west-2'),
+                config=SES_CLIENT_CONFIG
             )
             logger.info("AWS SES client initialized successfully")
+            return ses_client
         except Exception as e:
             logger.warning(f"Failed to initialize AWS SES: {str(e)}")
             
@@ -46,24 +240,43 @@ class EmailService:
                 logger.info("SMTP configuration loaded successfully")
             else:
                 logger.warning("No email service configured. OTP emails will be logged only.")
+            return None
+    
+    def otp_recently_sent(self, email: str) -> bool:
+        """Check whether an OTP email went to this address within OTP_RESEND_INTERVAL"""
+        sent_at = self._recent_otp_sends.get(email)
+        return sent_at is not None and time.monotonic() - sent_at < OTP_RESEND_INTERVAL
+    
+    def _record_otp_send(self, email: str):
+        """Remember when an OTP was sent, evicting the oldest entries past the cap"""
+        self._recent_otp_sends[email] = time.monotonic()
+        self._recent_otp_sends.move_to_end(email)
+        while len(self._recent_otp_sends) > OTP_RECENT_MAX_ENTRIES:
+            self._recent_otp_sends.popitem(last=False)
     
     async def send_otp_email(self, email: str, otp: str, first_name: Optional[str] = None) -> bool:
         """Send OTP email to user"""
         try:
-            subject = "Your My Story Buddy Login Code"
+            name = first_name or "there"
             
             # Create HTML email content
-            html_content = self._create_otp_email_html(otp, first_name)
-            text_content = self._create_otp_email_text(otp, first_name)
+            html_content = self._create_otp_email_html(otp, name)
+            text_content = self._create_otp_email_text(otp, name)
             
-            success = await self._send_email(
-                to_email=email,
-                subject=subject,
-                html_content=html_content,
-                text_content=text_content
-            )
+            if self.ses_client:
+                # Splice into the precompiled MIME message and send it raw
+                raw_message = self._render_raw_otp_email(email, html_content, text_content)
+                success = await self._send_raw_via_ses(email, raw_message)
+            else:
+                success = await self._send_email(
+                    to_email=email,
+                    subject=OTP_EMAIL_SUBJECT,
+                    html_content=html_content,
+                    text_content=text_content
+                )
             
             if success:
+                self._record_otp_send(email)
                 logger.info(f"OTP email sent successfully to {email}")
             else:
                 logger.error(f"Failed to send OTP email to {email}")
@@ -75,16 +288,23 @@ class EmailService:
             return False
     
     async def send_welcome_email(self, email: str, first_name: str) -> bool:
-        """Send welcome email to new user"""
+        """Send welcome email to new user
+        
+        With SES the email is queued for the next bulk send, so True means it
+        was queued rather than delivered; call close() on shutdown to flush it.
+        """
         try:
-            subject = "Welcome to My Story Buddy! 🎉"
+            # With SES, buffer the send and let the flusher batch it
+            if self.ses_client:
+                self._queue_welcome_email(email, first_name)
+                return True
             
             html_content = self._create_welcome_email_html(first_name)
             text_content = self._create_welcome_email_text(first_name)
             
             success = await self._send_email(
                 to_email=email,
-                subject=subject,
+                subject=WELCOME_EMAIL_SUBJECT,
                 html_content=html_content,
                 text_content=text_content
             )
@@ -124,7 +344,9 @@ class EmailService:
         try:
             from_email = os.getenv('FROM_EMAIL', 'noreply@mystorybuddy.com')
             
-            response = self.ses_client.send_email(
+            # boto3 is synchronous; run it off the event loop
+            response = await asyncio.to_thread(
+                self.ses_client.send_email,
                 Source=from_email,
                 Destination={'ToAddresses': [to_email]},
                 Message={
@@ -147,6 +369,162 @@ class EmailService:
             logger.error(f"Unexpected error sending via SES: {str(e)}")
             return False
     
+    @cached_property
+    def _otp_raw_template(self) -> bytes:
+        """OTP email serialized once as raw MIME with placeholder tokens"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = OTP_EMAIL_SUBJECT
+        msg['From'] = os.getenv('FROM_EMAIL', 'noreply@mystorybuddy.com')
+        msg['To'] = RAW_TO_TOKEN
+        msg.attach(MIMEText(RAW_TEXT_TOKEN, 'plain', 'utf-8'))
+        msg.attach(MIMEText(RAW_HTML_TOKEN, 'html', 'utf-8'))
+        return msg.as_bytes()
+    
+    def _render_raw_otp_email(self, to_email: str, html_content: str, text_content: str) -> bytes:
+        """Fill recipient and bodies into the precompiled OTP MIME message"""
+        return (
+            self._otp_raw_template
+            .replace(RAW_TO_TOKEN.encode(), to_email.encode())
+            .replace(base64.b64encode(RAW_TEXT_TOKEN.encode()),
+                     base64.encodebytes(text_content.encode('utf-8')).rstrip(b'\n'))
+            .replace(base64.b64encode(RAW_HTML_TOKEN.encode()),
+                     base64.encodebytes(html_content.encode('utf-8')).rstrip(b'\n'))
+        )
+    
+    async def _send_raw_via_ses(self, to_email: str, raw_message: bytes) -> bool:
+        """Send a prebuilt MIME message via AWS SES"""
+        try:
+            from_email = os.getenv('FROM_EMAIL', 'noreply@mystorybuddy.com')
+            
+            response = await asyncio.to_thread(
+                self.ses_client.send_raw_email,
+                Source=from_email,
+                Destinations=[to_email],
+                RawMessage={'Data': raw_message}
+            )
+            
+            logger.info(f"Email sent via SES. MessageId: {response['MessageId']}")
+            return True
+            
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            logger.error(f"SES error ({error_code}): {str(e)}")
+            return False
+        except Exception as e:
+            logger.error(f"Unexpected error sending via SES: {str(e)}")
+            return False
+    
+    def _queue_welcome_email(self, email: str, first_name: str):
+        """Queue a welcome email for the next SES bulk send"""
+        if self._welcome_queue is None:
+            self._welcome_queue = asyncio.Queue()
+        if self._welcome_flusher is None or self._welcome_flusher.done():
+            self._welcome_flusher = asyncio.create_task(self._flush_welcome_emails())
+        self._welcome_queue.put_nowait((email, first_name))
+    
+    async def _flush_welcome_emails(self):
+        """Drain queued welcome emails in batches of up to 50 recipients
+        
+        A None entry on the queue sends whatever is batched and stops.
+        """
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._welcome_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + SES_BULK_FLUSH_INTERVAL
+            while len(batch) < SES_BULK_MAX_DESTINATIONS:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._welcome_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            try:
+                await self._send_bulk_welcome_via_ses(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error flushing welcome emails: {str(e)}")
+    
+    async def close(self):
+        """Send any queued welcome emails and stop the flusher"""
+        flusher = self._welcome_flusher
+        if flusher is None or flusher.done():
+            return
+        self._welcome_queue.put_nowait(None)
+        await flusher
+        self._welcome_flusher = None
+    
+    def _ensure_welcome_template(self):
+        """Create or refresh the SES welcome template once per process"""
+        if self._welcome_template_ready:
+            return
+        
+        template = {
+            'TemplateName': WELCOME_TEMPLATE_NAME,
+            'SubjectPart': WELCOME_EMAIL_SUBJECT,
+            'HtmlPart': WELCOME_EMAIL_HTML.format(first_name='{{first_name}}'),
+            'TextPart': WELCOME_EMAIL_TEXT.format(first_name='{{first_name}}')
+        }
+        try:
+            self.ses_client.create_template(Template=template)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'AlreadyExists':
+                raise
+            self.ses_client.update_template(Template=template)
+        
+        self._welcome_template_ready = True
+    
+    async def _send_bulk_welcome_via_ses(self, batch: List[Tuple[str, str]]) -> bool:
+        """Send a batch of welcome emails with one SES SendBulkTemplatedEmail call"""
+        try:
+            from_email = os.getenv('FROM_EMAIL', 'noreply@mystorybuddy.com')
+            await asyncio.to_thread(self._ensure_welcome_template)
+            
+            response = await asyncio.to_thread(
+                self.ses_client.send_bulk_templated_email,
+                Source=from_email,
+                Template=WELCOME_TEMPLATE_NAME,
+                DefaultTemplateData=json.dumps({'first_name': 'there'}),
+                Destinations=[
+                    {
+                        'Destination': {'ToAddresses': [email]},
+                        'ReplacementTemplateData': json.dumps({'first_name': first_name})
+                    }
+                    for email, first_name in batch
+                ]
+            )
+            
+            for (email, _), status in zip(batch, response.get('Status', [])):
+                if status.get('Status') == 'Success':
+                    logger.info(f"Welcome email sent successfully to {email}")
+                else:
+                    logger.error(f"SES bulk error for {email} ({status.get('Status')}): {status.get('Error')}")
+            return True
+            
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            logger.error(f"SES bulk error ({error_code}): {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error sending bulk via SES: {str(e)}")
+        
+        # Fall back to one send per recipient so a template problem doesn't drop mail
+        for email, first_name in batch:
+            await self._send_via_ses(
+                email,
+                WELCOME_EMAIL_SUBJECT,
+                self._create_welcome_email_html(first_name),
+                self._create_welcome_email_text(first_name)
+            )
+        return False
+    
     async def _send_via_smtp(self, to_email: str, subject: str, 
                             html_content: str, text_content: str) -> bool:
         """Send email via SMTP"""
@@ -164,11 +542,8 @@ class EmailService:
             msg.attach(text_part)
             msg.attach(html_part)
             
-            # Send email
-            with smtplib.SMTP(self.smtp_config['smtp_server'], self.smtp_config['smtp_port']) as server:
-                server.starttls()
-                server.login(self.smtp_config['smtp_username'], self.smtp_config['smtp_password'])
-                server.send_message(msg)
+            # Send email; smtplib is blocking so run it in a worker thread
+            await asyncio.to_thread(self._smtp_send_message, msg)
             
             logger.info(f"Email sent via SMTP to {to_email}")
             return True
@@ -177,161 +552,55 @@ class EmailService:
             logger.error(f"SMTP error: {str(e)}")
             return False
     
+    def _open_smtp_connection(self) -> smtplib.SMTP:
+        """Open an authenticated SMTP connection (blocking)"""
+        server = smtplib.SMTP(self.smtp_config['smtp_server'], self.smtp_config['smtp_port'])
+        try:
+            server.starttls()
+            server.login(self.smtp_config['smtp_username'], self.smtp_config['smtp_password'])
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    def _smtp_send_message(self, msg: MIMEMultipart):
+        """Deliver a message over a pooled SMTP connection (blocking)"""
+        try:
+            server = self._smtp_pool.get_nowait()
+        except queue.Empty:
+            server = self._open_smtp_connection()
+        
+        try:
+            try:
+                server.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # Idle pooled connection was dropped by the server; reconnect once
+                server = self._open_smtp_connection()
+                server.send_message(msg)
+        except Exception:
+            server.close()
+            raise
+        
+        try:
+            self._smtp_pool.put_nowait(server)
+        except queue.Full:
+            server.quit()
+    
     def _create_otp_email_html(self, otp: str, first_name: Optional[str] = None) -> str:
         """Create HTML content for OTP email"""
-        name = first_name if first_name else "there"
-        
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Your My Story Buddy Login Code</title>
-        </head>
-        <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; background-color: #f8f9fa;">
-            <div style="max-width: 600px; margin: 0 auto; background: white; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);">
-                <!-- Header -->
-                <div style="background: linear-gradient(135deg, #E8E3FF, #DDD4FF); padding: 40px 30px; text-align: center;">
-                    <h1 style="margin: 0; color: #1a1a1a; font-size: 28px; font-weight: 700;">My Story Buddy</h1>
-                    <p style="margin: 8px 0 0 0; color: #666; font-size: 16px;">Your magical storytelling companion</p>
-                </div>
-                
-                <!-- Content -->
-                <div style="padding: 40px 30px;">
-                    <h2 style="margin: 0 0 20px 0; color: #1a1a1a; font-size: 24px; font-weight: 600;">Hi {name}! 👋</h2>
-                    
-                    <p style="margin: 0 0 30px 0; color: #666; font-size: 16px; line-height: 1.6;">
-                        Here's your login code for My Story Buddy. Enter this code to access your account and continue creating magical stories!
-                    </p>
-                    
-                    <!-- OTP Code -->
-                    <div style="text-align: center; margin: 40px 0;">
-                        <div style="display: inline-block; background: #f8f9fa; border: 2px solid #E8E3FF; border-radius: 12px; padding: 20px 40px;">
-                            <div style="font-size: 36px; font-weight: 700; color: #1a1a1a; letter-spacing: 8px; font-family: 'Courier New', monospace;">
-                                {otp}
-                            </div>
-                        </div>
-                    </div>
-                    
-                    <p style="margin: 30px 0 0 0; color: #666; font-size: 14px; line-height: 1.6;">
-                        <strong>Important:</strong> This code will expire in 5 minutes for your security. If you didn't request this code, please ignore this email.
-                    </p>
-                </div>
-                
-                <!-- Footer -->
-                <div style="background: #f8f9fa; padding: 30px; text-align: center; border-top: 1px solid #f0f0f0;">
-                    <p style="margin: 0; color: #999; font-size: 14px;">
-                        Happy storytelling! 📚✨<br>
-                        The My Story Buddy Team
-                    </p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return OTP_EMAIL_HTML.format(name=first_name or "there", otp=otp)
     
     def _create_otp_email_text(self, otp: str, first_name: Optional[str] = None) -> str:
         """Create text content for OTP email"""
-        name = first_name if first_name else "there"
-        
-        return f"""
-        Hi {name}!
-
-        Here's your login code for My Story Buddy:
-
-        {otp}
-
-        Enter this code to access your account and continue creating magical stories!
-
-        Important: This code will expire in 5 minutes for your security.
-        If you didn't request this code, please ignore this email.
-
-        Happy storytelling! 📚✨
-        The My Story Buddy Team
-        """
+        return OTP_EMAIL_TEXT.format(name=first_name or "there", otp=otp)
     
     def _create_welcome_email_html(self, first_name: str) -> str:
         """Create HTML content for welcome email"""
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>Welcome to My Story Buddy!</title>
-        </head>
-        <body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', sans-serif; background-color: #f8f9fa;">
-            <div style="max-width: 600px; margin: 0 auto; background: white; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);">
-                <!-- Header -->
-                <div style="background: linear-gradient(135deg, #E8E3FF, #DDD4FF); padding: 40px 30px; text-align: center;">
-                    <h1 style="margin: 0; color: #1a1a1a; font-size: 28px; font-weight: 700;">Welcome to My Story Buddy! 🎉</h1>
-                </div>
-                
-                <!-- Content -->
-                <div style="padding: 40px 30px;">
-                    <h2 style="margin: 0 0 20px 0; color: #1a1a1a; font-size: 24px; font-weight: 600;">Hi {first_name}! 👋</h2>
-                    
-                    <p style="margin: 0 0 20px 0; color: #666; font-size: 16px; line-height: 1.6;">
-                        Welcome to My Story Buddy, where imagination comes to life! We're excited to help you create magical stories that will spark creativity and wonder.
-                    </p>
-                    
-                    <p style="margin: 0 0 20px 0; color: #666; font-size: 16px; line-height: 1.6;">
-                        With My Story Buddy, you can:
-                    </p>
-                    
-                    <ul style="margin: 0 0 30px 0; color: #666; font-size: 16px; line-height: 1.8;">
-                        <li>Generate personalized stories based on your ideas</li>
-                        <li>Choose from multiple formats: text stories and comic books</li>
-                        <li>Enjoy beautiful illustrations that bring your stories to life</li>
-                        <li>Learn fun facts while your stories are being created</li>
-                    </ul>
-                    
-                    <div style="text-align: center; margin: 40px 0;">
-                        <div style="display: inline-block; background: #E8E3FF; border-radius: 12px; padding: 20px 30px;">
-                            <p style="margin: 0; color: #1a1a1a; font-size: 18px; font-weight: 600;">
-                                Ready to start your storytelling adventure? 📖✨
-                            </p>
-                        </div>
-                    </div>
-                    
-                    <p style="margin: 0; color: #666; font-size: 16px; line-height: 1.6;">
-                        Start by entering any topic or idea that interests you, and watch as we transform it into an engaging story just for you!
-                    </p>
-                </div>
-                
-                <!-- Footer -->
-                <div style="background: #f8f9fa; padding: 30px; text-align: center; border-top: 1px solid #f0f0f0;">
-                    <p style="margin: 0; color: #999; font-size: 14px;">
-                        Happy storytelling! 📚✨<br>
-                        The My Story Buddy Team
-                    </p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return WELCOME_EMAIL_HTML.format(first_name=first_name)
     
     def _create_welcome_email_text(self, first_name: str) -> str:
         """Create text content for welcome email"""
-        return f"""
-        Hi {first_name}!
-
-        Welcome to My Story Buddy, where imagination comes to life! We're excited to help you create magical stories that will spark creativity and wonder.
-
-        With My Story Buddy, you can:
-        • Generate personalized stories based on your ideas
-        • Choose from multiple formats: text stories and comic books
-        • Enjoy beautiful illustrations that bring your stories to life
-        • Learn fun facts while your stories are being created
-
-        Ready to start your storytelling adventure? 📖✨
-
-        Start by entering any topic or idea that interests you, and watch as we transform it into an engaging story just for you!
-
-        Happy storytelling! 📚✨
-        The My Story Buddy Team
-        """
+        return WELCOME_EMAIL_TEXT.format(first_name=first_name)
 
 # Global email service instance
 email_service = EmailService()
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Rate-limited gateway for OpenAI calls in My Story Buddy
+Paces requests and tokens to the account's limits and retries transient failures
+"""
+import time
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import Any, Awaitable, Callable, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+# Transient OpenAI failures worth retrying before giving up
+RETRYABLE_OPENAI_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Rough token accounting without a tokenizer: ~4 characters per token for
+# English text, plus a flat charge for each image sent to a vision model
+CHARS_PER_TOKEN = 4
+IMAGE_INPUT_TOKENS = 800
+
+
+def estimate_chat_tokens(messages: Optional[list], max_tokens: Optional[int] = None) -> int:
+    """Estimate the tokens a chat completion will bill (prompt + completion)"""
+    chars = 0
+    images = 0
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    chars += len(part.get("text", ""))
+                elif part.get("type") == "image_url":
+                    images += 1
+    return chars // CHARS_PER_TOKEN + images * IMAGE_INPUT_TOKENS + (max_tokens or 0)
+
+
+class TokenBucket:
+    """Continuously refilling bucket allowing `per_minute` units per minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        """Wait until `amount` units are available, then take them.
+
+        Waiters queue on the lock, so they are served in arrival order
+        instead of all waking up at once.
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+
+
+class OpenAIGateway:
+    """Paces OpenAI calls through request/token buckets and retries transient errors.
+
+    Calls take the SDK method to invoke (e.g. client.chat.completions.create)
+    so callers keep using their own client instance.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        images_per_minute: int,
+        max_attempts: int = 4,
+        backoff_min: float = 1,
+        backoff_max: float = 20
+    ):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.images = TokenBucket(images_per_minute)
+        self.max_attempts = max_attempts
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+    async def chat_completion(self, create: Callable[..., Awaitable[Any]], **kwargs) -> Any:
+        """Run a chat completion once the request and token budgets allow it"""
+        await self.tokens.acquire(estimate_chat_tokens(kwargs.get("messages"), kwargs.get("max_tokens")))
+        return await self._call(create, self.requests, kwargs)
+
+    async def image_generate(
+        self,
+        generate: Callable[..., Awaitable[Any]],
+        limiter: Optional[asyncio.Semaphore] = None,
+        **kwargs
+    ) -> Any:
+        """Run an image generation once the image budget allows it.
+
+        limiter, if given, is held only while each attempt's call is in
+        flight, not while waiting on the bucket or backing off between retries.
+        """
+        return await self._call(generate, self.images, kwargs, limiter)
+
+    async def _call(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        bucket: TokenBucket,
+        kwargs: dict,
+        limiter: Optional[asyncio.Semaphore] = None
+    ) -> Any:
+        async for attempt in AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_random_exponential(min=self.backoff_min, max=self.backoff_max),
+            retry=retry_if_exception_type(RETRYABLE_OPENAI_ERRORS),
+            reraise=True
+        ):
+            with attempt:
+                attempt_number = attempt.retry_state.attempt_number
+                if attempt_number > 1:
+                    logger.warning("Retrying OpenAI call (attempt %s/%s)", attempt_number, self.max_attempts)
+                await bucket.acquire()
+                async with limiter or nullcontext():
+                    return await func(**kwargs)
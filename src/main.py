@@ -1,36 +1,109 @@
 import os
+import re
 import logging
 import time
 import json
 import asyncio
 import base64
 import uuid
+import secrets
+import zlib
+import hashlib
 import traceback
+import functools
+import importlib.util
+from contextvars import ContextVar
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from io import BytesIO
 
 import httpx
 import boto3
-import botocore
+from botocore.config import Config
 from fastapi import FastAPI, HTTPException, Request, Depends, BackgroundTasks, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 from openai import AsyncOpenAI
-from PIL import Image
+from PIL import Image, ImageOps, UnidentifiedImageError
+from io import BytesIO
+
+# pybase64 (SIMD libbase64) encodes and decodes multi-MB image payloads several
+# times faster than the stdlib; fall back to the stdlib if it isn't installed
+try:
+    import pybase64
+    b64decode_image = functools.partial(pybase64.b64decode, validate=False)
+    b64encode_image = pybase64.b64encode
+except ImportError:
+    b64decode_image = base64.b64decode
+    b64encode_image = base64.b64encode
+
+# orjson serializes responses straight to bytes and parses request bodies much
+# faster than the stdlib json module; ORJSONResponse needs it installed, so
+# fall back without it
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+    
+    class FastJSONResponse(JSONResponse):
+        """Stdlib fallback that renders datetimes the way ORJSONResponse does."""
+        def render(self, content) -> bytes:
+            return json.dumps(
+                content,
+                ensure_ascii=False,
+                allow_nan=False,
+                separators=(",", ":"),
+                default=lambda value: value.isoformat()
+            ).encode("utf-8")
 
 # Import authentication modules (required for proper functionality)
 from auth.auth_routes import auth_router
 from auth.auth_models import UserDatabase
-from auth.auth_utils import get_optional_user, get_current_user
+from auth.auth_utils import get_optional_user, get_current_user, get_current_user_optional, is_bearer_scheme, JWTUtils
+from fastapi.security.utils import get_authorization_scheme_param
+import core.database as core_db
 from core.database import db_manager
+from core.cache import TTLCache
+from core.openai_gateway import OpenAIGateway
+from core.email_service import email_service
+
+# Request ID of the request being handled, stamped onto every log record
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+class RequestIdLogFilter(logging.Filter):
+    """Copy the current request ID onto log records for the formatter."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+# Upstream request IDs are only logged if they look like an ID, so clients
+# can't inject arbitrary text into the logs
+_REQUEST_ID_RE = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+def new_request_id(req: Request | None = None) -> str:
+    """Generate a request ID and bind it to the current logging context.
+    
+    The ID always comes from secrets: it also names S3 objects, so a
+    client-supplied X-Request-Id is only logged alongside it for correlation.
+    """
+    request_id = secrets.token_hex(8)
+    request_id_var.set(request_id)
+    upstream_id = req.headers.get("x-request-id") if req is not None else None
+    if upstream_id and _REQUEST_ID_RE.fullmatch(upstream_id):
+        logger.info("Upstream request ID: %s", upstream_id)
+    return request_id
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
     datefmt='%Y-%m-%d %H:%M:%S'
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(RequestIdLogFilter())
 logger = logging.getLogger(__name__)
 
 # Admin role checking - Add your admin emails here  
@@ -47,9 +120,6 @@ def is_admin_user(user_email: str) -> bool:
 async def get_admin_user(request: Request):
     """Get current user and verify admin status"""
     try:
-        from auth.auth_utils import get_current_user
-        from fastapi.security import HTTPBearer
-        
         security = HTTPBearer()
         credentials = await security(request)
         current_user = await get_current_user(credentials)
@@ -59,7 +129,9 @@ async def get_admin_user(request: Request):
             
         return current_user
     except Exception as e:
-        raise HTTPException(status_code=401, detail="Authentication required")
+        # Same {"error": ...} 401 body the admin routes returned when they were
+        # reached through catch_all
+        raise AuthenticationError("Authentication required")
 
 # Initialize FastAPI
 app = FastAPI(
@@ -67,13 +139,72 @@ app = FastAPI(
     description="API for generating stories and user authentication",
     version="2.0.0",
     docs_url=None,
-    redoc_url=None
+    redoc_url=None,
+    default_response_class=FastJSONResponse
 )
 
 # Include authentication routes
 app.include_router(auth_router)
 logger.info("Authentication routes included")
 
+# Avatar photo uploads
+AVATAR_MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Allowance for the multipart boundaries and the name/traits form fields
+AVATAR_MAX_REQUEST_BYTES = AVATAR_MAX_UPLOAD_BYTES + 64 * 1024
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized avatar uploads before the multipart body is parsed.
+    
+    FastAPI spools the whole form before a handler runs, so the handlers'
+    own size check only fires after the upload has been received. Declared
+    Content-Lengths are checked up front; chunked bodies are cut off as soon
+    as they pass the limit.
+    """
+    
+    def __init__(self, app, path_prefix: str, max_bytes: int):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.max_bytes = max_bytes
+    
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            if not content_length.isdigit() or int(content_length) > self.max_bytes:
+                response = FastJSONResponse(status_code=413, content={"detail": "Image too large"})
+                await response(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing, so FastAPI turns it into the response
+                    raise HTTPException(status_code=413, detail="Image too large")
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    path_prefix="/personalization/avatar",
+    max_bytes=AVATAR_MAX_REQUEST_BYTES
+)
+
 # Configure CORS for production and development
 app.add_middleware(
     CORSMiddleware,
@@ -81,7 +212,8 @@ app.add_middleware(
     allow_credentials=False,  # Must be False when using "*"
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["*"]
+    expose_headers=["*"],
+    max_age=86400  # Let browsers reuse a preflight for a day instead of 10 minutes
 )
 
 # Startup event to initialize database (if available)
@@ -112,8 +244,7 @@ async def startup_event():
         await db_manager.initialize()
         
         # Create all tables
-        from core.database import create_tables
-        await create_tables()
+        await core_db.create_tables()
         
         # Create authentication tables
         await UserDatabase.create_user_tables()
@@ -126,11 +257,23 @@ async def startup_event():
         logger.error(f"Startup error: {str(e)}")
         # Don't fail startup if database is unavailable
         logger.warning("API started without database connectivity")
+    
+    # Skip the bucket probe on Lambda, where it would add to every cold start
+    if not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        await verify_s3_bucket_access()
+    
+    start_story_workers()
+    await start_avatar_workers()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
     try:
+        await stop_story_workers()
+        await stop_avatar_workers()
+        await email_service.close()
+        s3_upload_executor.shutdown(wait=False)
+        await openai_http_client.aclose()
         if current_user and db_manager:
             await db_manager.close()
             logger.info("Database connections closed")
@@ -138,17 +281,22 @@ async def shutdown_event():
         logger.error(f"Shutdown error: {str(e)}")
 
 # Health check endpoint for Lambda testing
+# Static health fields are fixed for the life of the process
+API_VERSION = "2.1.0"
+DEPLOY_ENVIRONMENT = "ec2" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") is None else "lambda"
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify the application is working"""
+    now = datetime.utcnow().isoformat() + "Z"
     return {
         "status": "healthy",
         "message": "My Story Buddy API is running with automated CI/CD",
-        "timestamp": datetime.now().isoformat(),
-        "version": "2.1.0",
-        "environment": "ec2" if os.getenv("AWS_LAMBDA_FUNCTION_NAME") is None else "lambda",
+        "timestamp": now,
+        "version": API_VERSION,
+        "environment": DEPLOY_ENVIRONMENT,
         "deployment": "automated-pipeline",
-        "uptime": datetime.now().isoformat()
+        "uptime": now
     }
 
 @app.get("/ping")
@@ -158,19 +306,55 @@ async def ping():
 
 # Constants
 S3_BUCKET = "mystorybuddy-assets"
+# The bucket is publicly readable, so objects are served by direct URL
+S3_PUBLIC_URL = f"https://{S3_BUCKET}.s3.amazonaws.com"
+AVATAR_KEY_TEMPLATE = "avatars/user_{user_id}_{request_id}.png"
+
+# Character reference cards added to enriched prompts by enrich_prompt_with_avatar_traits
+# (flexible pattern to handle different formatting)
+_CHAR_DETAILS_RE = re.compile(r'CHARACTER DETAILS FOR\s+([^:\n]+):\s*(.*?)(?=CHARACTER DETAILS FOR|$)', re.DOTALL)
 
 # Initialize clients
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Shared HTTP transport for OpenAI with room for 4 image + chat calls per
+# story across many concurrent users, so connections stay warm
+# HTTP/2 lets the parallel image calls multiplex over one connection; it
+# needs the h2 package (httpx[http2]), so fall back to HTTP/1.1 without it
+OPENAI_HTTP2 = importlib.util.find_spec("h2") is not None
+openai_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=512, max_keepalive_connections=256),
+    timeout=httpx.Timeout(120.0),
+    http2=OPENAI_HTTP2
+)
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=openai_http_client, max_retries=0)
+
+# Concurrency limits and rate budgets below are totals for the host; each of
+# the WEB_CONCURRENCY server processes enforces its share.
+WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Cap in-flight image generations across all stories so bursts of users
+# queue here instead of tripping OpenAI rate limits
+IMAGE_CONCURRENCY = max(1, int(os.getenv("IMAGE_CONCURRENCY", "16")) // WEB_WORKERS)
+IMAGE_SEM = asyncio.Semaphore(IMAGE_CONCURRENCY)
+
+# Pace every OpenAI call to the account's rate limits; the gateway also
+# retries rate limits, connection errors and 5xx with jittered backoff,
+# so the SDK's own retries are turned off.
+openai_gateway = OpenAIGateway(
+    requests_per_minute=max(1, int(os.getenv("OPENAI_RPM", "5000")) // WEB_WORKERS),
+    tokens_per_minute=max(1, int(os.getenv("OPENAI_TPM", "450000")) // WEB_WORKERS),
+    images_per_minute=max(1, int(os.getenv("OPENAI_IMAGES_PER_MINUTE", "100")) // WEB_WORKERS)
+)
 
 # Initialize S3 client
+# Pool enough connections for every upload worker plus avatar uploads, keep
+# them alive between stories, and back off adaptively when S3 throttles
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=64,
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": 3}
+)
 try:
-    s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION', 'us-east-1'))
-    try:
-        s3_client.list_objects_v2(Bucket=S3_BUCKET, MaxKeys=1)
-        logger.info(f"Successfully connected to AWS S3 bucket: {S3_BUCKET}")
-    except Exception as e:
-        logger.warning(f"Could not verify bucket access: {str(e)}")
-        logger.warning("Continuing with S3 client initialization...")
+    s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION', 'us-east-1'), config=S3_CLIENT_CONFIG)
 except Exception as e:
     logger.warning(f"Failed to initialize S3 client: {str(e)}")
     logger.warning("S3 functionality will be disabled. Images will not be saved.")
@@ -181,6 +365,33 @@ except Exception as e:
     logger.warning(f"4. Required permissions: s3:PutObject, s3:GetObject on bucket: {S3_BUCKET}")
     s3_client = None
 
+# Bucket access probe runs from startup_event, off the import path
+S3_PROBE_TIMEOUT = 5.0
+
+async def verify_s3_bucket_access():
+    """Check the story bucket is reachable without blocking startup for long."""
+    if s3_client is None:
+        return
+    try:
+        await asyncio.wait_for(
+            asyncio.to_thread(s3_client.list_objects_v2, Bucket=S3_BUCKET, MaxKeys=1),
+            timeout=S3_PROBE_TIMEOUT
+        )
+        logger.info("Successfully connected to AWS S3 bucket: %s", S3_BUCKET)
+    except Exception as e:
+        logger.warning("Could not verify bucket access: %s", str(e) or type(e).__name__)
+        logger.warning("Continuing with S3 client initialization...")
+
+# Dedicated worker pool for blocking S3 uploads, so a burst of story image or
+# avatar uploads doesn't queue behind other to_thread work on the default executor
+S3_UPLOAD_WORKERS = int(os.getenv("S3_UPLOAD_WORKERS", "16"))
+s3_upload_executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS, thread_name_prefix="s3-upload")
+
+async def run_s3_upload(func, **kwargs):
+    """Run a blocking S3 client call on the dedicated upload pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(s3_upload_executor, functools.partial(func, **kwargs))
+
 # Models
 class StoryRequest(BaseModel):
     prompt: str = ""
@@ -234,52 +445,127 @@ class PublicStoriesResponse(BaseModel):
 
 # Helper functions
 def cors_error_response(message: str, status_code: int = 500):
-    return JSONResponse(
-        status_code=status_code,
-        content={"detail": message},
-        headers={
-            "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
+    # CORS headers are added by CORSMiddleware
+    return FastJSONResponse(status_code=status_code, content={"detail": message})
+
+# Header values that must never end up in the logs
+_SENSITIVE_HEADERS = frozenset({"authorization", "cookie", "x-api-key"})
+
+def _redacted_headers(headers) -> dict:
+    return {
+        key: "[REDACTED]" if key.lower() in _SENSITIVE_HEADERS else value
+        for key, value in headers.items()
+    }
 
 def log_request_details(request: Request, request_id: str):
     """Log detailed information about the incoming request."""
-    logger.info(f"Request ID: {request_id}")
-    logger.info(f"Request Method: {request.method}")
-    logger.info(f"Request URL: {request.url}")
-    logger.info(f"Request Headers: {dict(request.headers)}")
-    logger.info(f"Request Client: {request.client.host if request.client else 'Unknown'}")
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info("Request ID: %s", request_id)
+    logger.info("Request Method: %s", request.method)
+    logger.info("Request URL: %s", request.url)
+    logger.info("Request Headers: %s", _redacted_headers(request.headers))
+    logger.info("Request Client: %s", request.client.host if request.client else 'Unknown')
 
 def log_error(error: Exception, request_id: str):
     """Log detailed error information."""
-    logger.error(f"Request ID: {request_id} - Error occurred")
-    logger.error(f"Error Type: {type(error).__name__}")
-    logger.error(f"Error Message: {str(error)}")
-    logger.error(f"Traceback: {traceback.format_exc()}")
+    logger.error("Request ID: %s - Error occurred", request_id)
+    logger.error("Error Type: %s", type(error).__name__)
+    logger.error("Error Message: %s", error)
+    logger.error("Traceback: %s", traceback.format_exc())
+
+# Authenticated users by id, so repeat requests skip the database lookup
+user_cache = TTLCache(maxsize=5000, ttl=60)
+
+# Verified JWT payloads by token digest (raw tokens are never stored); clients
+# reuse one token for a burst of requests, so each burst verifies it once
+token_cache = TTLCache(maxsize=10000, ttl=5)
+
+def verify_token_cached(token: str) -> dict | None:
+    """JWTUtils.verify_token with successful verifications cached briefly."""
+    key = hashlib.sha256(token.encode("utf-8")).digest()[:16]
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+    
+    payload = JWTUtils.verify_token(token)
+    if payload is not None:
+        # Never serve a payload past the token's own expiry
+        exp = payload.get("exp")
+        expires_in = exp - time.time() if exp else token_cache.ttl
+        if expires_in > 0:
+            token_cache.set(key, payload, ttl=min(token_cache.ttl, expires_in))
+    return payload
+
+class AuthenticationError(Exception):
+    """Raised by require_user when a request can't be authenticated."""
+    
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+@app.exception_handler(AuthenticationError)
+async def authentication_error_handler(request: Request, exc: AuthenticationError):
+    return FastJSONResponse(
+        content={"error": exc.message},
+        status_code=401
+    )
+
+async def require_user_id(req: Request) -> int:
+    """Return the user ID from the request's bearer token.
+    
+    Only verifies the token; handlers should depend on require_user, which
+    also rejects deactivated or deleted accounts.
+    """
+    authorization = req.headers.get("Authorization")
+    if not authorization:
+        raise AuthenticationError("Authentication required")
+    
+    scheme, token = get_authorization_scheme_param(authorization)
+    if not is_bearer_scheme(scheme):
+        raise AuthenticationError("Invalid authentication scheme")
+    
+    payload = verify_token_cached(token)
+    if payload is None:
+        raise AuthenticationError("Invalid token")
+    
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise AuthenticationError("Invalid token payload")
+    return user_id
+
+async def require_user(req: Request) -> dict:
+    """Dependency returning the user record for the request's bearer token."""
+    user_id = await require_user_id(req)
+    user = await user_cache.get_or_load(user_id, lambda: UserDatabase.get_user_by_id(user_id))
+    if user is None:
+        raise AuthenticationError("User not found")
+    return user
 
 async def save_image_to_s3(image_bytes: bytes, content_type: str = "image/png", request_id: str = None, image_index: int = None) -> str:
     """Save image bytes to S3 and return the URL."""
     if s3_client is None:
-        logger.warning(f"Request ID: {request_id} - S3 client not initialized, skipping image upload")
+        logger.warning("S3 client not initialized, skipping image upload")
         return "https://via.placeholder.com/400x300?text=Image+Upload+Disabled"
     
     if not image_bytes:
-        logger.error(f"Request ID: {request_id} - No image bytes provided")
+        logger.error("No image bytes provided")
         return "https://via.placeholder.com/400x300?text=No+Image+Data"
         
     try:
         start_time = time.time()
-        logger.info(f"Request ID: {request_id} - Starting S3 upload")
+        logger.info("Starting S3 upload")
         
         if image_index is not None:
-            object_key = f"stories/{request_id}_image_{image_index}.png"
+            # Spread a story's images across S3 partitions with a stable
+            # 2-hex-char prefix while keeping the request_id in the key
+            shard = zlib.crc32(f"{request_id}_{image_index}".encode()) & 0xFF
+            object_key = f"stories/{shard:02x}/{request_id}_image_{image_index}.png"
         else:
             object_key = f"stories/{uuid.uuid4()}.png"
-        logger.info(f"Request ID: {request_id} - Generated object key: {object_key}")
+        logger.info("Generated object key: %s", object_key)
         
-        await asyncio.to_thread(
+        await run_s3_upload(
             s3_client.put_object,
             Bucket=S3_BUCKET,
             Key=object_key,
@@ -287,22 +573,23 @@ async def save_image_to_s3(image_bytes: bytes, content_type: str = "image/png",
             ContentType=content_type
         )
         
-        # Use direct S3 URL since bucket is publicly readable for stories
-        image_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{object_key}"
+        image_url = f"{S3_PUBLIC_URL}/{object_key}"
         
         upload_time = time.time() - start_time
-        logger.info(f"Request ID: {request_id} - Image saved to S3: {image_url}")
-        logger.info(f"Request ID: {request_id} - S3 upload completed in {upload_time:.2f} seconds")
+        logger.info("Image saved to S3: %s", image_url)
+        logger.info("S3 upload completed in %.2f seconds", upload_time)
         return image_url
         
     except Exception as e:
         log_error(e, request_id)
-        if isinstance(e, botocore.exceptions.NoCredentialsError):
+        # Only needed on the error path, so keep it out of cold start
+        import botocore.exceptions as bce
+        if isinstance(e, bce.NoCredentialsError):
             raise HTTPException(
                 status_code=500,
                 detail="AWS credentials not configured. Please check the server logs for setup instructions."
             )
-        elif isinstance(e, botocore.exceptions.ClientError):
+        elif isinstance(e, bce.ClientError):
             raise HTTPException(
                 status_code=500,
                 detail=f"AWS S3 error: {str(e)}"
@@ -313,166 +600,193 @@ async def save_image_to_s3(image_bytes: bytes, content_type: str = "image/png",
                 detail=f"Failed to save image: {str(e)}"
             )
 
+# System prompts for story generation and comic planning, built once at import
+_DEFAULT_STORY_SYS_PROMPT = (
+    "You are a friendly and imaginative storyteller who creates elaborate, exciting, "
+    "and engaging stories for children aged 3 to 5 years. "
+    "Create a completely original and creative adventure story with fun elements, "
+    "twists and turns that would delight and excite young children. "
+    "Use simple words that a 3-5 year old can understand. "
+    "Keep sentences short and clear but create an exciting narrative arc. "
+    "Include characters that go on adventures, face challenges, and discover wonderful things. "
+    "Make the story fun and interesting, with animals, toys, magical creatures, or fantasy elements. "
+    "Add gentle humor, surprises, and exciting moments to keep children engaged throughout. "
+    "The story should be approximately 200-250 words and feel like an exciting adventure "
+    "meant to be read aloud to young children. "
+    "Include multiple scenes and story progression with clear beginning, middle, and end. "
+    "Always end the story with 'The End! (Created By - MyStoryBuddy)' on a new line. "
+    "Format your response exactly like this:\n"
+    "Title: [Your Title]\n\n"
+    "[Story content with multiple paragraphs]\n\n"
+    "The End! (Created By - MyStoryBuddy)\n\n"
+    "Use double line breaks between paragraphs. Create 8-12 paragraphs to tell the full adventure."
+)
+
+_ENRICHED_STORY_SYS_PROMPT = (
+    "You are a friendly and imaginative storyteller who creates elaborate, exciting, "
+    "and engaging stories for children aged 3 to 5 years. "
+    "Use simple words that a 3-5 year old can understand. "
+    "Keep sentences short and clear but create an exciting narrative arc. "
+    "Include characters that go on adventures, face challenges, and discover wonderful things. "
+    "If the story is based on a concept (like kindness, sharing, or friendship), "
+    "weave it into an exciting adventure story, not like a lesson. "
+    "Make the story fun and interesting, with animals, toys, magical creatures, or fantasy elements. "
+    "Add gentle humor, surprises, and exciting moments to keep children engaged throughout. "
+    "The story should be approximately 200-250 words and feel like an exciting adventure "
+    "meant to be read aloud to young children. "
+    "Include multiple scenes and story progression with clear beginning, middle, and end. "
+    "Always end the story with 'The End! (Created By - MyStoryBuddy)' on a new line. "
+    "Format your response exactly like this:\n"
+    "Title: [Your Title]\n\n"
+    "[Story content with multiple paragraphs]\n\n"
+    "The End! (Created By - MyStoryBuddy)\n\n"
+    "Use double line breaks between paragraphs. Create 8-12 paragraphs to tell the full adventure."
+)
+
+_PLANNING_SYS_PROMPT = (
+    "You are an expert in comic storytelling, visual narrative structure, and character consistency. "
+    "You will do two things for the given story and return them as a strict JSON object.\n"
+    "\n"
+    "1. Break down the story into exactly 4 meaningful parts for a 4-panel comic series. "
+    "Each part should represent a clear story beat that works well visually. "
+    "Follow classic story structure: Setup, Development, Climax, Resolution.\n"
+    "- Part 1: Introduction and setup (characters, setting, initial situation)\n"
+    "- Part 2: Development and adventure beginning (action starts, journey begins)\n"
+    "- Part 3: Challenge or climax (main conflict, problem to solve, exciting moment)\n"
+    "- Part 4: Resolution and conclusion (problem solved, happy ending)\n"
+    "- Each part should be visually interesting and work well as a comic panel\n"
+    "- Maintain the story's flow and key plot points\n"
+    "- Keep the language and tone appropriate for children aged 3-5\n"
+    "\n"
+    "2. Create a comprehensive visual style guide that ensures PERFECT consistency across all comic panels. "
+    "If character references are provided, use them EXACTLY as the definitive character descriptions.\n"
+    "- Create consistent art style notes for all characters and scenes\n"
+    "- Specify color palettes that must remain identical across all panels\n"
+    "- Note distinctive features that must appear in every panel featuring each character\n"
+    "- Ensure the comic style is cute, child-friendly, and visually consistent\n"
+    "\n"
+    'Respond with JSON only, in this shape: {"parts": ["part 1", "part 2", "part 3", "part 4"], "style_guide": "..."}'
+)
+
+# Static comic pages returned for "(dev)" prompts so testing skips image generation
+_DEV_IMAGE_URLS: tuple[str, ...] = (
+    "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_1.png",
+    "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_2.png",
+    "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_3.png",
+    "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_4.png",
+)
+
 async def generate_story_images(story: str, title: str, request_id: str, original_prompt: str = "") -> list[str]:
     """Generate 4 separate 4-panel comic images for the story and return list of URLs."""
     image_urls = []
     
     # Check if this is a dev/testing request
     if "(dev)" in original_prompt.lower():
-        logger.info(f"Request ID: {request_id} - Dev mode detected, returning static test images")
-        dev_image_urls = [
-            "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_1.png",
-            "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_2.png",
-            "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_3.png",
-            "https://mystorybuddy-assets.s3.us-east-1.amazonaws.com/stories/f5ef3161-7410-4770-a7d3-6cdadeb21437_image_4.png"
-        ]
-        logger.info(f"Request ID: {request_id} - Returning {len(dev_image_urls)} static dev images")
-        return dev_image_urls
-    
-    # Use LLM to intelligently break down the story into 4 comic parts
-    logger.info(f"Request ID: {request_id} - Breaking down story into 4 comic parts...")
-    breakdown_start_time = time.time()
-    
-    breakdown_system_prompt = (
-        "You are an expert in comic storytelling and visual narrative structure. "
-        "Break down the given story into exactly 4 meaningful parts for a 4-panel comic series. "
-        "Each part should represent a clear story beat that works well visually. "
-        "Follow classic story structure: Setup, Development, Climax, Resolution. "
-        "\n\n"
-        "Format your response as exactly 4 parts separated by '---PART BREAK---' like this:\n"
-        "Part 1 content here\n"
-        "---PART BREAK---\n"
-        "Part 2 content here\n"
-        "---PART BREAK---\n" 
-        "Part 3 content here\n"
-        "---PART BREAK---\n"
-        "Part 4 content here\n"
-        "\n"
-        "Guidelines:\n"
-        "- Part 1: Introduction and setup (characters, setting, initial situation)\n"
-        "- Part 2: Development and adventure beginning (action starts, journey begins)\n"
-        "- Part 3: Challenge or climax (main conflict, problem to solve, exciting moment)\n"
-        "- Part 4: Resolution and conclusion (problem solved, happy ending)\n"
-        "- Each part should be visually interesting and work well as a comic panel\n"
-        "- Maintain the story's flow and key plot points\n"
-        "- Keep the language and tone appropriate for children aged 3-5"
-    )
-    
-    breakdown_response = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": breakdown_system_prompt},
-            {"role": "user", "content": f"Break down this story into 4 comic parts:\n\n{story}"}
-        ],
-        max_tokens=800,
-        temperature=0.3
-    )
-    
-    breakdown_content = breakdown_response.choices[0].message.content
-    breakdown_time = time.time() - breakdown_start_time
-    logger.info(f"Request ID: {request_id} - Story breakdown completed in {breakdown_time:.2f} seconds")
-    
-    # Parse the breakdown response
-    story_parts = breakdown_content.split('---PART BREAK---')
-    story_parts = [part.strip() for part in story_parts if part.strip()]
-    
-    # Ensure we have exactly 4 parts
-    if len(story_parts) != 4:
-        logger.warning(f"Request ID: {request_id} - Expected 4 story parts, got {len(story_parts)}. Using fallback breakdown.")
-        # Fallback to simple paragraph-based breakdown
-        story_paragraphs = [p.strip() for p in story.split('\n\n') if p.strip() and not p.strip().startswith('The End!')]
-        paragraphs_per_part = max(1, len(story_paragraphs) // 4)
-        story_parts = []
-        for i in range(4):
-            start_idx = i * paragraphs_per_part
-            end_idx = min(start_idx + paragraphs_per_part, len(story_paragraphs))
-            if i == 3:  # Last part gets remaining paragraphs
-                end_idx = len(story_paragraphs)
-            story_part = '\n\n'.join(story_paragraphs[start_idx:end_idx])
-            story_parts.append(story_part)
-    
-    logger.info(f"Request ID: {request_id} - Successfully created {len(story_parts)} story parts for comic generation")
-    
-    # Use the same title for all comic pages for consistency
-    image_titles = [title, title, title, title]
-    
-    # Generate character consistency guide using stored avatar references
-    logger.info(f"Request ID: {request_id} - Generating character consistency guide...")
-    consistency_start_time = time.time()
+        logger.info("Dev mode detected, returning static test images")
+        logger.info("Returning %s static dev images", len(_DEV_IMAGE_URLS))
+        return list(_DEV_IMAGE_URLS)
     
     # Extract character references from the enriched prompt
     character_references = ""
     if "CHARACTER DETAILS FOR" in original_prompt:
         try:
-            logger.info(f"Request ID: {request_id} - Found CHARACTER DETAILS in prompt, extracting references...")
+            logger.info("Found CHARACTER DETAILS in prompt, extracting references...")
             # Log a snippet of the prompt for debugging
             char_detail_start = original_prompt.find("CHARACTER DETAILS FOR")
             prompt_snippet = original_prompt[char_detail_start:char_detail_start+200] if char_detail_start != -1 else "Not found"
-            logger.info(f"Request ID: {request_id} - Prompt snippet: {prompt_snippet}")
+            logger.info("Prompt snippet: %s", prompt_snippet)
             
             # Extract all character reference cards from the enriched prompt
-            import re
-            # More flexible pattern to handle different formatting
-            character_sections = re.findall(r'CHARACTER DETAILS FOR\s+([^:\n]+):\s*(.*?)(?=CHARACTER DETAILS FOR|$)', original_prompt, re.DOTALL)
+            character_sections = _CHAR_DETAILS_RE.findall(original_prompt)
             
             if character_sections:
                 character_references = "\n\n=== STORED CHARACTER REFERENCES ===\n"
                 for char_name, char_details in character_sections:
                     character_references += f"\nCHARACTER: {char_name.strip()}\n{char_details.strip()}\n"
                 character_references += "\n=== END CHARACTER REFERENCES ===\n"
-                logger.info(f"Request ID: {request_id} - Found {len(character_sections)} character reference(s) for consistency")
+                logger.info("Found %s character reference(s) for consistency", len(character_sections))
             else:
-                logger.info(f"Request ID: {request_id} - No character sections matched the pattern, using fallback")
+                logger.info("No character sections matched the pattern, using fallback")
                 # Fall back to including the entire character section
                 if "Personality:" in original_prompt or "Appearance:" in original_prompt:
                     character_references = f"\n\n=== CHARACTER INFORMATION ===\n{original_prompt[char_detail_start:]}\n=== END CHARACTER INFO ===\n"
         except Exception as e:
-            logger.error(f"Request ID: {request_id} - Error extracting character references: {str(e)}")
+            logger.error("Error extracting character references: %s", e)
             # Fall back to simple character detection
             if "Personality:" in original_prompt or "Appearance:" in original_prompt:
                 character_references = f"\n\n=== CHARACTER INFORMATION ===\n{original_prompt}\n=== END CHARACTER INFO ===\n"
     
-    consistency_system_prompt = (
-        "You are an expert comic book artist specializing in character consistency. "
-        "Create a comprehensive visual style guide that ensures PERFECT consistency across multiple comic panels. "
-        "If character references are provided, use them EXACTLY as the definitive character descriptions. "
-        "Focus on maintaining identical character appearances, color palettes, and art style throughout all panels."
-    )
+    # Use a single LLM call to break the story into 4 comic parts and write
+    # the character consistency guide, saving a full round-trip
+    logger.info("Planning comic parts and character consistency guide...")
+    planning_start_time = time.time()
     
-    consistency_response = await client.chat.completions.create(
+    planning_response = await openai_gateway.chat_completion(
+        client.chat.completions.create,
         model="gpt-4o",
         messages=[
-            {"role": "system", "content": consistency_system_prompt},
-            {"role": "user", "content": f"""Create a detailed visual consistency guide for this story:
+            {"role": "system", "content": _PLANNING_SYS_PROMPT},
+            {"role": "user", "content": f"""Break down this story into 4 comic parts and create its visual consistency guide.
 
 STORY:
 {story}
 
-{character_references}
-
-REQUIREMENTS:
-- If character references are provided above, use them EXACTLY for character appearances
-- Create consistent art style notes for all characters and scenes
-- Specify color palettes that must remain identical across all panels
-- Note distinctive features that must appear in every panel featuring each character
-- Ensure the comic style is cute, child-friendly, and visually consistent"""}
+{character_references}"""}
         ],
-        max_tokens=600,
-        temperature=0.1
+        response_format={"type": "json_object"},
+        max_tokens=1400,
+        temperature=0.2
     )
     
-    character_guide = consistency_response.choices[0].message.content
-    consistency_time = time.time() - consistency_start_time
-    logger.info(f"Request ID: {request_id} - Character guide generated in {consistency_time:.2f} seconds")
+    planning_time = time.time() - planning_start_time
+    logger.info("Story breakdown and character guide completed in %.2f seconds", planning_time)
+    
+    # Parse the planning response
+    try:
+        plan = json.loads(planning_response.choices[0].message.content)
+    except (TypeError, ValueError):
+        logger.warning("Could not parse story plan as JSON")
+        plan = {}
+    if not isinstance(plan, dict):
+        plan = {}
+    
+    story_parts = plan.get("parts")
+    if not isinstance(story_parts, list):
+        story_parts = []
+    story_parts = [str(part).strip() for part in story_parts if str(part).strip()]
+    
+    character_guide = plan.get("style_guide")
+    if not isinstance(character_guide, str):
+        character_guide = ""
+    
+    # Ensure we have exactly 4 parts
+    if len(story_parts) != 4:
+        logger.warning("Expected 4 story parts, got %s. Using fallback breakdown.", len(story_parts))
+        # Fallback to simple paragraph-based breakdown
+        story_paragraphs = [p.strip() for p in story.split('\n\n') if p.strip() and not p.strip().startswith('The End!')]
+        paragraphs_per_part = max(1, len(story_paragraphs) // 4)
+        story_parts = []
+        for i in range(4):
+            start_idx = i * paragraphs_per_part
+            end_idx = min(start_idx + paragraphs_per_part, len(story_paragraphs))
+            if i == 3:  # Last part gets remaining paragraphs
+                end_idx = len(story_paragraphs)
+            story_part = '\n\n'.join(story_paragraphs[start_idx:end_idx])
+            story_parts.append(story_part)
+    
+    logger.info("Successfully created %s story parts for comic generation", len(story_parts))
+    
+    # Use the same title for all comic pages for consistency
+    image_titles = [title, title, title, title]
 
     # Generate all 4 images in parallel with consistency guide
-    logger.info(f"Request ID: {request_id} - Generating 4 comic images in parallel...")
+    logger.info("Generating 4 comic images in parallel...")
     parallel_start_time = time.time()
     
     async def generate_single_image(index: int, story_part: str, image_title: str) -> tuple[int, str]:
         """Generate a single 4-panel comic image."""
         try:
-            logger.info(f"Request ID: {request_id} - Starting generation for image {index+1}/4...")
+            logger.info("Starting generation for image %s/4...", index + 1)
             
             visual_prompt = f'''
 Create a 4-panel comic-style illustration for "{title}".
@@ -519,54 +833,52 @@ STORY PROGRESSION:
 CONSISTENCY REMINDER: This is image {index+1} of 4 in the story series - characters must look IDENTICAL to the consistency guide and other images.
 '''
             
-            image_response = await client.images.generate(
+            image_response = await openai_gateway.image_generate(
+                client.images.generate,
+                limiter=IMAGE_SEM,
                 model="gpt-image-1",
                 prompt=visual_prompt,
                 n=1
             )
             
+            # Decode in a worker thread so the multi-MB payload doesn't stall the loop
             image_base64 = image_response.data[0].b64_json
-            image_bytes = base64.b64decode(image_base64)
+            image_bytes = await asyncio.to_thread(b64decode_image, image_base64)
             
             # Save to S3
             image_url = await save_image_to_s3(image_bytes, request_id=request_id, image_index=index+1)
             
-            logger.info(f"Request ID: {request_id} - Image {index+1}/4 generated and saved successfully")
+            logger.info("Image %s/4 generated and saved successfully", index + 1)
             return index, image_url
             
         except Exception as e:
-            logger.error(f"Request ID: {request_id} - Error generating image {index+1}: {str(e)}")
-            logger.error(f"Request ID: {request_id} - Error type: {type(e).__name__}")
-            logger.error(f"Request ID: {request_id} - Full traceback: {traceback.format_exc()}")
+            logger.error("Error generating image %s: %s", index + 1, e)
+            logger.error("Error type: %s", type(e).__name__)
+            logger.error("Full traceback: %s", traceback.format_exc())
             
             # Check if it's an OpenAI API error
             if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
-                logger.error(f"Request ID: {request_id} - OpenAI API status code: {e.response.status_code}")
+                logger.error("OpenAI API status code: %s", e.response.status_code)
             
             return index, "https://via.placeholder.com/400x300?text=Comic+Generation+Failed"
 
-    # Create tasks for all 4 images
-    tasks = [
-        generate_single_image(i, story_part, image_title) 
-        for i, (story_part, image_title) in enumerate(zip(story_parts, image_titles))
-    ]
-    
-    # Wait for all images to complete
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    # Create tasks for all 4 images; each task falls back to a placeholder on
+    # its own, so anything escaping the group is fatal and cancels the rest
+    async with asyncio.TaskGroup() as tg:
+        tasks = [
+            tg.create_task(generate_single_image(i, story_part, image_title))
+            for i, (story_part, image_title) in enumerate(zip(story_parts, image_titles))
+        ]
+    results = [task.result() for task in tasks]
     
     parallel_time = time.time() - parallel_start_time
-    logger.info(f"Request ID: {request_id} - All 4 images generated in parallel in {parallel_time:.2f} seconds")
+    logger.info("All 4 images generated in parallel in %.2f seconds", parallel_time)
     
     # Sort results by index and extract URLs
     image_urls = [""] * 4
     successful_images = 0
     
-    for result in results:
-        if isinstance(result, Exception):
-            logger.error(f"Request ID: {request_id} - Image generation task failed: {str(result)}")
-            continue
-            
-        index, url = result
+    for index, url in results:
         image_urls[index] = url
         if not url.startswith("https://via.placeholder.com"):
             successful_images += 1
@@ -576,10 +888,39 @@ CONSISTENCY REMINDER: This is image {index+1} of 4 in the story series - charact
         if not url:
             image_urls[i] = "https://via.placeholder.com/400x300?text=Comic+Generation+Failed"
     
-    logger.info(f"Request ID: {request_id} - Successfully generated {successful_images}/4 images")
+    logger.info("Successfully generated %s/4 images", successful_images)
     
     return image_urls
 
+# Compiled avatar-name matcher per user; invalidated whenever the user's avatar changes
+avatar_cache = TTLCache(maxsize=10000, ttl=300)
+
+def invalidate_avatar_cache(user_id):
+    """Drop the cached avatar so the next story sees the latest traits."""
+    avatar_cache.invalidate(str(user_id))
+
+async def load_avatar_matcher(user_id) -> tuple | None:
+    """
+    Fetch the user's avatars and compile one pattern matching any of their names.
+    Returns (pattern, {casefolded name: (name, avatar data)}) or None if there is nothing to match.
+    """
+    avatar_data = await core_db.get_user_avatar(user_id)
+    avatars = [avatar_data] if avatar_data else []
+    
+    avatars_by_name = {}
+    for avatar in avatars:
+        avatar_name = (avatar.get('avatar_name') or '').strip()
+        if avatar_name:
+            avatars_by_name[avatar_name.casefold()] = (avatar_name, avatar)
+    
+    if not avatars_by_name:
+        return None
+    
+    # Longest names first so the most specific name wins where names overlap
+    names = sorted(avatars_by_name, key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(name) for name in names))
+    return pattern, avatars_by_name
+
 async def detect_avatar_names_in_prompt(prompt: str, user_id: int) -> dict:
     """
     Detect avatar names mentioned in the story prompt and fetch their traits.
@@ -589,29 +930,25 @@ async def detect_avatar_names_in_prompt(prompt: str, user_id: int) -> dict:
         return {}
     
     try:
-        # Get user's avatar to check if their name is mentioned
-        from core.database import get_user_avatar
-        avatar_data = await get_user_avatar(user_id)
-        
-        if not avatar_data:
-            return {}
-        
-        avatar_name = avatar_data.get('avatar_name', '').strip()
-        if not avatar_name:
+        matcher = await avatar_cache.get_or_load(str(user_id), lambda: load_avatar_matcher(user_id))
+        if not matcher:
             return {}
         
-        # Simple name detection - check if avatar name appears in prompt (case-insensitive)
-        prompt_lower = prompt.lower()
-        avatar_name_lower = avatar_name.lower()
-        
-        if avatar_name_lower in prompt_lower:
-            logger.info(f"Detected avatar '{avatar_name}' mentioned in story prompt")
-            return {avatar_name: avatar_data}
+        # Casefold once (handles non-ASCII names better than lower()) and scan
+        # the prompt a single time for all of the user's avatar names
+        pattern, avatars_by_name = matcher
+        prompt_casefolded = prompt.casefold()
+        detected_avatars = {}
+        for match in pattern.finditer(prompt_casefolded):
+            avatar_name, avatar_data = avatars_by_name[match.group(0)]
+            if avatar_name not in detected_avatars:
+                logger.info("Detected avatar '%s' mentioned in story prompt", avatar_name)
+                detected_avatars[avatar_name] = avatar_data
         
-        return {}
+        return detected_avatars
         
     except Exception as e:
-        logger.error(f"Error detecting avatar names in prompt: {str(e)}")
+        logger.error("Error detecting avatar names in prompt: %s", e)
         return {}
 
 async def enrich_prompt_with_avatar_traits(prompt: str, detected_avatars: dict) -> str:
@@ -642,17 +979,17 @@ async def enrich_prompt_with_avatar_traits(prompt: str, detected_avatars: dict)
         # Combine original prompt with enrichment
         enriched_prompt = prompt + "\n".join(enrichment_parts)
         
-        logger.info(f"Enriched prompt with {len(detected_avatars)} avatar(s): {list(detected_avatars.keys())}")
+        logger.info("Enriched prompt with %s avatar(s): %s", len(detected_avatars), list(detected_avatars.keys()))
         return enriched_prompt
         
     except Exception as e:
-        logger.error(f"Error enriching prompt with avatar traits: {str(e)}")
+        logger.error("Error enriching prompt with avatar traits: %s", e)
         return prompt
 
 async def generate_story_background_task(story_id: int, prompt: str, formats: list, request_id: str, user_id: str = None):
     """Background task to generate story content and update database."""
     try:
-        logger.info(f"Request ID: {request_id} - Starting background story generation for story_id: {story_id}")
+        logger.info("Starting background story generation for story_id: %s", story_id)
         
         # Detect avatars mentioned in the prompt and enrich with their traits
         detected_avatars = {}
@@ -662,62 +999,25 @@ async def generate_story_background_task(story_id: int, prompt: str, formats: li
             detected_avatars = await detect_avatar_names_in_prompt(prompt, user_id)
             if detected_avatars:
                 enriched_prompt = await enrich_prompt_with_avatar_traits(prompt, detected_avatars)
-                logger.info(f"Request ID: {request_id} - Using enriched prompt with avatar details")
+                logger.info("Using enriched prompt with avatar details")
             else:
-                logger.info(f"Request ID: {request_id} - No avatars detected in prompt")
+                logger.info("No avatars detected in prompt")
         
         # Generate story content with enriched prompt
         if not enriched_prompt.strip():
-            logger.info(f"Request ID: {request_id} - Using default prompt")
-            system_prompt = (
-                "You are a friendly and imaginative storyteller who creates elaborate, exciting, "
-                "and engaging stories for children aged 3 to 5 years. "
-                "Create a completely original and creative adventure story with fun elements, "
-                "twists and turns that would delight and excite young children. "
-                "Use simple words that a 3-5 year old can understand. "
-                "Keep sentences short and clear but create an exciting narrative arc. "
-                "Include characters that go on adventures, face challenges, and discover wonderful things. "
-                "Make the story fun and interesting, with animals, toys, magical creatures, or fantasy elements. "
-                "Add gentle humor, surprises, and exciting moments to keep children engaged throughout. "
-                "The story should be approximately 200-250 words and feel like an exciting adventure "
-                "meant to be read aloud to young children. "
-                "Include multiple scenes and story progression with clear beginning, middle, and end. "
-                "Always end the story with 'The End! (Created By - MyStoryBuddy)' on a new line. "
-                "Format your response exactly like this:\n"
-                "Title: [Your Title]\n\n"
-                "[Story content with multiple paragraphs]\n\n"
-                "The End! (Created By - MyStoryBuddy)\n\n"
-                "Use double line breaks between paragraphs. Create 8-12 paragraphs to tell the full adventure."
-            )
+            logger.info("Using default prompt")
+            system_prompt = _DEFAULT_STORY_SYS_PROMPT
             user_prompt = "Create a delightful story for young children"
         else:
-            logger.info(f"Request ID: {request_id} - Using enriched prompt with avatar integration")
+            logger.info("Using enriched prompt with avatar integration")
             
-            system_prompt = (
-                "You are a friendly and imaginative storyteller who creates elaborate, exciting, "
-                "and engaging stories for children aged 3 to 5 years. "
-                "Use simple words that a 3-5 year old can understand. "
-                "Keep sentences short and clear but create an exciting narrative arc. "
-                "Include characters that go on adventures, face challenges, and discover wonderful things. "
-                "If the story is based on a concept (like kindness, sharing, or friendship), "
-                "weave it into an exciting adventure story, not like a lesson. "
-                "Make the story fun and interesting, with animals, toys, magical creatures, or fantasy elements. "
-                "Add gentle humor, surprises, and exciting moments to keep children engaged throughout. "
-                "The story should be approximately 200-250 words and feel like an exciting adventure "
-                "meant to be read aloud to young children. "
-                "Include multiple scenes and story progression with clear beginning, middle, and end. "
-                "Always end the story with 'The End! (Created By - MyStoryBuddy)' on a new line. "
-                "Format your response exactly like this:\n"
-                "Title: [Your Title]\n\n"
-                "[Story content with multiple paragraphs]\n\n"
-                "The End! (Created By - MyStoryBuddy)\n\n"
-                "Use double line breaks between paragraphs. Create 8-12 paragraphs to tell the full adventure."
-            )
+            system_prompt = _ENRICHED_STORY_SYS_PROMPT
             user_prompt = enriched_prompt
 
         # Generate story with OpenAI
-        logger.info(f"Request ID: {request_id} - Generating story with GPT-4o...")
-        story_response = await client.chat.completions.create(
+        logger.info("Generating story with GPT-4o...")
+        story_response = await openai_gateway.chat_completion(
+            client.chat.completions.create,
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -728,7 +1028,7 @@ async def generate_story_background_task(story_id: int, prompt: str, formats: li
         )
         
         content = story_response.choices[0].message.content
-        logger.info(f"Request ID: {request_id} - Story generated successfully")
+        logger.info("Story generated successfully")
         
         # Parse story response
         parts = content.split('\n\n', 1)
@@ -736,7 +1036,7 @@ async def generate_story_background_task(story_id: int, prompt: str, formats: li
             title = parts[0].replace('Title:', '').strip()
             story = parts[1].strip()
         else:
-            logger.warning(f"Request ID: {request_id} - Unexpected story format, using fallback")
+            logger.warning("Unexpected story format, using fallback")
             title = "A Magical Story"
             story = content.strip()
         
@@ -748,45 +1048,95 @@ async def generate_story_background_task(story_id: int, prompt: str, formats: li
                 story = story.replace("The End!", "").strip()
             story += "\n\nThe End! (Created By - MyStoryBuddy)"
         
-        logger.info(f"Request ID: {request_id} - Title: {title}")
+        logger.info("Title: %s", title)
 
         # Generate images if Comic Book format is requested
         image_urls = []
         if "Comic Book" in formats:
-            logger.info(f"Request ID: {request_id} - Generating 4 comic images...")
+            logger.info("Generating 4 comic images...")
             image_urls = await generate_story_images(story, title, request_id, enriched_prompt)
-            logger.info(f"Request ID: {request_id} - Images generated successfully")
+            logger.info("Images generated successfully")
         
         # Update story in database
-        from core.database import update_story_content
-        success = await update_story_content(story_id, title, story, image_urls, status='NEW')
+        success = await core_db.update_story_content(story_id, title, story, image_urls, status='NEW')
         
         if success:
-            logger.info(f"Request ID: {request_id} - Story {story_id} completed successfully")
+            logger.info("Story %s completed successfully", story_id)
         else:
-            logger.error(f"Request ID: {request_id} - Failed to update story {story_id}")
+            logger.error("Failed to update story %s", story_id)
             
     except Exception as e:
-        logger.error(f"Request ID: {request_id} - Background task failed for story_id: {story_id}")
-        logger.error(f"Error: {str(e)}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error("Background task failed for story_id: %s", story_id)
+        logger.error("Error: %s", e)
+        logger.error("Traceback: %s", traceback.format_exc())
         
         # Mark story as failed or keep as IN_PROGRESS for retry
         try:
-            from core.database import update_story_content
-            await update_story_content(story_id, "Story Generation Failed", 
+            await core_db.update_story_content(story_id, "Story Generation Failed", 
                                      "We encountered an error while generating your story. Please try again.", 
                                      [], status='NEW')
         except Exception as db_error:
-            logger.error(f"Failed to update story status after error: {str(db_error)}")
+            logger.error("Failed to update story status after error: %s", db_error)
+    finally:
+        recent_requests.invalidate(story_request_key(user_id, prompt))
+        invalidate_my_stories_cache(user_id)
+
+# Story generation runs on a fixed pool of worker coroutines fed by a queue,
+# so a burst of requests can't fan out into unbounded concurrent OpenAI calls
+STORY_WORKERS = max(1, int(os.getenv("STORY_WORKERS", "25")) // WEB_WORKERS)
+STORY_DRAIN_TIMEOUT = 30
+story_queue: asyncio.Queue | None = None
+story_worker_tasks: list[asyncio.Task] = []
+
+async def story_worker():
+    """Consume queued story jobs one at a time."""
+    while True:
+        job = await story_queue.get()
+        request_id_var.set(job["request_id"])
+        try:
+            await generate_story_background_task(**job)
+        except Exception as e:
+            logger.error("Story worker error for story_id %s: %s", job.get("story_id"), e)
+        finally:
+            story_queue.task_done()
+
+def start_story_workers():
+    """Create the story queue and its workers on the running loop."""
+    global story_queue
+    story_queue = asyncio.Queue()
+    story_worker_tasks.extend(
+        asyncio.create_task(story_worker(), name=f"story-worker-{i}")
+        for i in range(STORY_WORKERS)
+    )
+    logger.info("Started %s story workers", STORY_WORKERS)
 
-# Cache to prevent duplicate story requests
-recent_requests = {}
+async def stop_story_workers():
+    """Give queued stories a chance to finish, then cancel the workers."""
+    if story_queue is None:
+        return
+    try:
+        await asyncio.wait_for(story_queue.join(), timeout=STORY_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Story queue not drained after %ss, %s job(s) dropped", STORY_DRAIN_TIMEOUT, story_queue.qsize())
+    for task in story_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*story_worker_tasks, return_exceptions=True)
+    story_worker_tasks.clear()
+
+# In-flight stories by (user, prompt digest), so a repeated request tracks the
+# story already being generated; entries are dropped when the story finishes,
+# and the TTL only cleans up after jobs that never do
+STORY_INFLIGHT_TTL = 600
+recent_requests = TTLCache(maxsize=10000, ttl=STORY_INFLIGHT_TTL)
+
+def story_request_key(user_id, prompt: str) -> tuple:
+    """Key on a fixed-size digest so long prompts aren't held in the cache."""
+    return (user_id, hashlib.blake2b(prompt.strip().encode("utf-8"), digest_size=16).digest())
 
 # Routes
 @app.post("/generateStory", response_model=AsyncStoryResponse)
 async def generate_story_async(request: StoryRequest, req: Request, background_tasks: BackgroundTasks):
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id(req)
     
     # Get current user if authenticated (optional)
     current_user = None
@@ -797,58 +1147,70 @@ async def generate_story_async(request: StoryRequest, req: Request, background_t
     
     try:
         log_request_details(req, request_id)
-        logger.info(f"Request ID: {request_id} - Starting async story generation")
-        logger.info(f"Request ID: {request_id} - Prompt: {request.prompt[:100]}...")
+        logger.info("Starting async story generation")
+        logger.info("Prompt: %s...", request.prompt[:100])
         
-        # Check for duplicate requests (same user + prompt within 10 seconds)
+        # The same user + prompt is already being generated: hand back that
+        # story instead of starting a second generation. Anonymous callers
+        # can't be told apart, so their requests are never coalesced.
         user_id = current_user["id"] if current_user else None
-        request_key = f"{user_id}:{request.prompt.strip()}"
-        current_time = time.time()
-        
-        global recent_requests
-        if request_key in recent_requests:
-            time_diff = current_time - recent_requests[request_key]
-            if time_diff < 10:  # 10 seconds cooldown
-                logger.warning(f"Request ID: {request_id} - Duplicate request detected, ignoring")
-                raise HTTPException(
-                    status_code=429, 
-                    detail="Please wait a moment before generating another story with the same prompt"
-                )
-        
-        recent_requests[request_key] = current_time
+        request_key = story_request_key(user_id, request.prompt) if user_id is not None else None
+        
+        pending_story = recent_requests.get(request_key) if request_key is not None else None
+        if pending_story is not None:
+            story_id = await asyncio.shield(pending_story)
+            logger.info("Duplicate request, tracking in-flight story %s", story_id)
+            return FastJSONResponse(
+                content={
+                    "story_id": story_id,
+                    "status": "IN_PROGRESS",
+                    "message": "Generation already in progress, tracking existing request."
+                }
+            )
         
-        # Clean up old entries (older than 1 hour)
-        cutoff_time = current_time - 3600
-        keys_to_remove = [k for k, v in recent_requests.items() if v <= cutoff_time]
-        for key in keys_to_remove:
-            del recent_requests[key]
+        # Register before the first await so concurrent duplicates find it
+        if request_key is not None:
+            pending_story = asyncio.get_running_loop().create_future()
+            recent_requests.set(request_key, pending_story)
         
         # Create story placeholder in database
-        from core.database import create_story_placeholder
-        user_id = current_user["id"] if current_user else None
-        story_id = await create_story_placeholder(
-            prompt=request.prompt,
-            formats=request.formats,
-            request_id=request_id,
-            user_id=user_id
-        )
-        
-        if not story_id:
-            raise Exception("Failed to create story placeholder")
-        
-        logger.info(f"Request ID: {request_id} - Created story placeholder with ID: {story_id}")
-        
-        # Start background task for story generation
-        background_tasks.add_task(
-            generate_story_background_task,
-            story_id=story_id,
-            prompt=request.prompt,
-            formats=request.formats,
-            request_id=request_id,
-            user_id=user_id
-        )
+        try:
+            story_id = await core_db.create_story_placeholder(
+                prompt=request.prompt,
+                formats=request.formats,
+                request_id=request_id,
+                user_id=user_id
+            )
+            
+            if not story_id:
+                raise Exception("Failed to create story placeholder")
+        except Exception as e:
+            if pending_story is not None:
+                recent_requests.invalidate(request_key)
+                pending_story.set_exception(e)
+                pending_story.exception()  # waiting duplicates re-raise it themselves
+            raise
+        if pending_story is not None:
+            pending_story.set_result(story_id)
+        
+        logger.info("Created story placeholder with ID: %s", story_id)
+        invalidate_my_stories_cache(user_id)
+        
+        # Hand the story to the worker pool (or run it after the response if
+        # the workers weren't started, e.g. outside the app lifespan)
+        job = {
+            "story_id": story_id,
+            "prompt": request.prompt,
+            "formats": request.formats,
+            "request_id": request_id,
+            "user_id": user_id
+        }
+        if story_queue is not None:
+            story_queue.put_nowait(job)
+        else:
+            background_tasks.add_task(generate_story_background_task, **job)
         
-        logger.info(f"Request ID: {request_id} - Background task started for story generation")
+        logger.info("Background task started for story generation")
         
         response_data = {
             "story_id": story_id,
@@ -856,15 +1218,12 @@ async def generate_story_async(request: StoryRequest, req: Request, background_t
             "message": "Story generation started! Check My Stories for updates."
         }
         
-        return JSONResponse(
-            content=response_data,
-            headers={
-                "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=response_data
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         log_error(e, request_id)
         return cors_error_response(str(e))
@@ -872,23 +1231,17 @@ async def generate_story_async(request: StoryRequest, req: Request, background_t
 @app.get("/story/{story_id}/status", response_model=StoryStatusResponse)
 async def get_story_status(story_id: int, req: Request):
     """Get the status of a story by its ID."""
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id(req)
     
     try:
-        logger.info(f"Request ID: {request_id} - Getting status for story_id: {story_id}")
+        logger.info("Getting status for story_id: %s", story_id)
         
-        from core.database import get_story_by_id
-        story = await get_story_by_id(story_id)
+        story = await core_db.get_story_by_id(story_id)
         
         if not story:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=404,
-                content={"detail": "Story not found"},
-                headers={
-                    "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                content={"detail": "Story not found"}
             )
         
         response_data = {
@@ -901,13 +1254,8 @@ async def get_story_status(story_id: int, req: Request):
             "updated_at": story["updated_at"].isoformat() if story["updated_at"] else ""
         }
         
-        return JSONResponse(
-            content=response_data,
-            headers={
-                "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=response_data
         )
         
     except Exception as e:
@@ -917,41 +1265,91 @@ async def get_story_status(story_id: int, req: Request):
 @app.put("/story/{story_id}/viewed")
 async def mark_story_viewed(story_id: int, req: Request):
     """Mark a story as viewed."""
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id(req)
     
     try:
-        logger.info(f"Request ID: {request_id} - Marking story_id: {story_id} as viewed")
+        logger.info("Marking story_id: %s as viewed", story_id)
         
-        from core.database import update_story_status
-        success = await update_story_status(story_id, 'VIEWED')
+        success = await core_db.update_story_status(story_id, 'VIEWED')
         
         if not success:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=404,
-                content={"detail": "Story not found"},
-                headers={
-                    "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                content={"detail": "Story not found"}
             )
         
-        return JSONResponse(
-            content={"message": "Story marked as viewed"},
-            headers={
-                "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        invalidate_my_stories_cache(await core_db.get_story_owner(story_id))
+        
+        return FastJSONResponse(
+            content={"message": "Story marked as viewed"}
         )
         
     except Exception as e:
         log_error(e, request_id)
         return cors_error_response(str(e))
 
+# Fun facts generation
+FUN_FACTS_SYSTEM_PROMPT = (
+    "You are a friendly educator who creates fascinating fun facts for children aged 3-5. "
+    "Generate exactly 10 fun facts in question-answer format. "
+    "Each fact should be: "
+    "- Simple and easy to understand for young children "
+    "- Educational but entertaining "
+    "- Related to the given context when possible "
+    "- Formatted as a question followed by a simple answer "
+    "- Keep questions starting with 'Did you know...' "
+    "- Keep answers friendly, short, and exciting "
+    
+    "Format your response as exactly 10 Q&A pairs like this: "
+    "Q: Did you know cats can sleep for 16 hours a day? "
+    "A: Yes! Cats love to nap and dream just like us. "
+    
+    "Q: Did you know butterflies taste with their feet? "
+    "A: Amazing! They step on flowers to see if they taste good. "
+    
+    "Make each fact delightful and wonder-filled for curious young minds."
+)
+
+FUN_FACTS_CONTEXT_TEMPLATE = "Create 10 fun facts related to the theme or characters from this story idea: '{}'"
+FUN_FACTS_CONTEXT_DEFAULT = "Create 10 fun facts about animals, nature, friendship, and adventures that would interest children"
+
+def fun_facts_context_prompt(prompt: str) -> str:
+    """Build the user prompt for one fun-facts request."""
+    return FUN_FACTS_CONTEXT_TEMPLATE.format(prompt) if prompt.strip() else FUN_FACTS_CONTEXT_DEFAULT
+
+# One Q:/A: pair per match; blank lines may separate the two, but the answer
+# ends with its line so trailing prose from the model isn't sent to children
+_QA_RE = re.compile(r"^[ \t]*Q:[ \t]*(.+?)[ \t]*\n\s*A:[ \t]*([^\n]+)", re.M)
+
+def parse_fun_facts(content: str) -> list[FunFact]:
+    """Parse Q:/A: pairs from a fun facts response."""
+    return [
+        FunFact(question=question.strip(), answer=answer.strip())
+        for question, answer in _QA_RE.findall(content.strip())
+    ][:10]
+
+async def generate_fun_facts_for_prompt(prompt: str) -> list[FunFact]:
+    """Generate fun facts for one prompt with GPT-4o.
+    
+    Requests aren't batched into shared calls: every prompt in a call can
+    steer the facts generated for the others, so only one user's prompts
+    could share a call, and one user rarely has several in flight.
+    """
+    response = await openai_gateway.chat_completion(
+        client.chat.completions.create,
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": FUN_FACTS_SYSTEM_PROMPT},
+            {"role": "user", "content": fun_facts_context_prompt(prompt)}
+        ],
+        max_tokens=800,
+        temperature=0.8
+    )
+    return parse_fun_facts(response.choices[0].message.content)
+
 @app.post("/generateFunFacts", response_model=FunFactsResponse)
 async def generate_fun_facts(request: FunFactRequest, req: Request):
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id(req)
     start_time = time.time()
     
     # Get current user if authenticated (optional)
@@ -963,64 +1361,13 @@ async def generate_fun_facts(request: FunFactRequest, req: Request):
     
     try:
         log_request_details(req, request_id)
-        logger.info(f"Request ID: {request_id} - Starting fun facts generation")
-        logger.info(f"Request ID: {request_id} - Prompt: {request.prompt[:100]}...")
+        logger.info("Starting fun facts generation")
+        logger.info("Prompt: %s...", request.prompt[:100])
         
-        # Create context-based fun facts prompt
-        if request.prompt.strip():
-            context_prompt = f"Create 10 fun facts related to the theme or characters from this story idea: '{request.prompt}'"
-        else:
-            context_prompt = "Create 10 fun facts about animals, nature, friendship, and adventures that would interest children"
-        
-        system_prompt = (
-            "You are a friendly educator who creates fascinating fun facts for children aged 3-5. "
-            "Generate exactly 10 fun facts in question-answer format. "
-            "Each fact should be: "
-            "- Simple and easy to understand for young children "
-            "- Educational but entertaining "
-            "- Related to the given context when possible "
-            "- Formatted as a question followed by a simple answer "
-            "- Keep questions starting with 'Did you know...' "
-            "- Keep answers friendly, short, and exciting "
-            
-            "Format your response as exactly 10 Q&A pairs like this: "
-            "Q: Did you know cats can sleep for 16 hours a day? "
-            "A: Yes! Cats love to nap and dream just like us. "
-            
-            "Q: Did you know butterflies taste with their feet? "
-            "A: Amazing! They step on flowers to see if they taste good. "
-            
-            "Make each fact delightful and wonder-filled for curious young minds."
-        )
-        
-        logger.info(f"Request ID: {request_id} - Generating fun facts with GPT-4o...")
-        fun_facts_response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": context_prompt}
-            ],
-            max_tokens=800,
-            temperature=0.8
-        )
-        
-        content = fun_facts_response.choices[0].message.content
+        logger.info("Generating fun facts with GPT-4o...")
+        facts = await generate_fun_facts_for_prompt(request.prompt)
         generation_time = time.time() - start_time
-        logger.info(f"Request ID: {request_id} - Fun facts generated successfully in {generation_time:.2f} seconds")
-        
-        # Parse the Q&A pairs
-        facts = []
-        lines = content.strip().split('\n')
-        current_question = ""
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Q:'):
-                current_question = line[2:].strip()
-            elif line.startswith('A:') and current_question:
-                answer = line[2:].strip()
-                facts.append(FunFact(question=current_question, answer=answer))
-                current_question = ""
+        logger.info("Fun facts generated successfully in %.2f seconds", generation_time)
         
         # Ensure we have exactly 10 facts, pad if needed
         while len(facts) < 10:
@@ -1032,132 +1379,49 @@ async def generate_fun_facts(request: FunFactRequest, req: Request):
         # Limit to 10 facts
         facts = facts[:10]
         
-        logger.info(f"Request ID: {request_id} - Parsed {len(facts)} fun facts successfully")
+        logger.info("Parsed %s fun facts successfully", len(facts))
         
         # Save fun facts to database (if available)
         if current_user and db_manager:
             try:
-                from core.database import save_fun_facts
                 facts_data = [{"question": fact.question, "answer": fact.answer} for fact in facts]
-                fun_facts_id = await save_fun_facts(
+                fun_facts_id = await core_db.save_fun_facts(
                     prompt=request.prompt,
                     facts=facts_data,
                     request_id=request_id
                 )
-                logger.info(f"Request ID: {request_id} - Fun facts saved to database with ID: {fun_facts_id}")
+                logger.info("Fun facts saved to database with ID: %s", fun_facts_id)
             except Exception as e:
-                logger.error(f"Request ID: {request_id} - Failed to save fun facts to database: {str(e)}")
+                logger.error("Failed to save fun facts to database: %s", e)
                 # Don't fail the request if database save fails
         
-        return JSONResponse(
-            content={"facts": [{"question": fact.question, "answer": fact.answer} for fact in facts]},
-            headers={
-                "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content={"facts": [{"question": fact.question, "answer": fact.answer} for fact in facts]}
         )
         
     except Exception as e:
         log_error(e, request_id)
         return cors_error_response(str(e))
 
-@app.options("/generateStory")
-async def preflight_generateStory():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
+# Rendered /my-stories bodies per user, for clients polling for new stories;
+# invalidated whenever one of the user's stories is created or changes
+my_stories_cache = TTLCache(maxsize=10000, ttl=10)
 
-@app.options("/generateFunFacts")
-async def preflight_generateFunFacts():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
+def invalidate_my_stories_cache(user_id):
+    """Drop the user's cached story list so the next poll sees the change."""
+    if user_id is not None:
+        my_stories_cache.invalidate(str(user_id))
 
 @app.get("/my-stories")
-async def get_user_stories(req: Request):
+async def get_user_stories(req: Request, current_user: dict = Depends(require_user)):
     """Get all stories created by the current user."""
+    user_id = str(current_user["id"])
+    cached_body = my_stories_cache.get(user_id)
+    if cached_body is not None:
+        return Response(content=cached_body, media_type="application/json")
+    
     try:
-        # Get current user using manual header parsing
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Get user from database
-        from auth.auth_models import UserDatabase
-        current_user = await UserDatabase.get_user_by_id(user_id)
-        if current_user is None:
-            return JSONResponse(
-                content={"error": "User not found"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        from core.database import get_stories_with_status, get_new_stories_count
-        stories = await get_stories_with_status(user_id=str(current_user["id"]), limit=50)
-        new_stories_count = await get_new_stories_count(user_id=str(current_user["id"]))
+        stories, new_stories_count = await core_db.get_stories_with_new_count(user_id=user_id, limit=50)
         
         # Format the response
         formatted_stories = []
@@ -1169,83 +1433,132 @@ async def get_user_stories(req: Request):
                 "prompt": story["prompt"],
                 "image_urls": story["image_urls"] or [],
                 "formats": story["formats"] or [],
-                "created_at": story["created_at"].isoformat() if story["created_at"] else None,
-                "updated_at": story["updated_at"].isoformat() if story["updated_at"] else None,
+                "created_at": story["created_at"],
+                "updated_at": story["updated_at"],
                 "status": story["status"]
             })
         
-        return JSONResponse(
+        response = FastJSONResponse(
             content={
                 "stories": formatted_stories,
                 "new_stories_count": new_stories_count
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
+        my_stories_cache.set(user_id, response.body)
+        return response
         
     except Exception as e:
         logger.error(f"Error fetching user stories: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": "Failed to fetch stories"},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
-@app.options("/my-stories")
-async def preflight_my_stories():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
+def sniff_image_type(header: bytes | memoryview) -> str | None:
+    """Return the MIME type of a supported image from its magic bytes, or None."""
+    header = bytes(header[:12])
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return None
+
+async def read_image_upload(image: UploadFile) -> memoryview:
+    """Read an uploaded image into one buffer without intermediate copies.
+    
+    Rejects the upload as soon as it passes AVATAR_MAX_UPLOAD_BYTES, or once
+    the first chunk shows it isn't a JPEG/PNG/WebP/GIF (content_type is
+    client-declared), instead of reading the rest of it first.
+    """
+    # The multipart parser already spooled the file and knows its size
+    if image.size is not None and image.size > AVATAR_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
+    
+    buffer = bytearray()
+    while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+        if not buffer and sniff_image_type(chunk) is None:
+            raise HTTPException(status_code=400, detail="File must be a JPEG, PNG, WebP or GIF image")
+        buffer.extend(chunk)
+        if len(buffer) > AVATAR_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
+    return memoryview(buffer)
 
-async def create_comic_avatar_and_extract_traits(uploaded_image_bytes: bytes, avatar_name: str, traits_description: str, request_id: str) -> tuple[bytes, str]:
-    """Process uploaded image into comic-style avatar and extract visual traits from the processed version."""
+# Vision "high" detail bills per 512px tile, so anything past this is wasted upload
+VISION_MAX_DIMENSION = 1024
+VISION_JPEG_QUALITY = 85
+
+def downscale_for_vision(image_bytes: bytes | memoryview) -> bytes | memoryview:
+    """Shrink a photo to fit VISION_MAX_DIMENSION and re-encode it as JPEG.
+    
+    Small JPEGs and data Pillow can't read are returned untouched.
+    """
     try:
-        logger.info(f"Request ID: {request_id} - Starting comic avatar creation and visual traits extraction")
+        with Image.open(BytesIO(image_bytes)) as img:
+            if img.format == "JPEG" and max(img.size) <= VISION_MAX_DIMENSION:
+                return image_bytes
+            # Let the JPEG decoder scale down while decoding instead of after
+            img.draft("RGB", (VISION_MAX_DIMENSION, VISION_MAX_DIMENSION))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((VISION_MAX_DIMENSION, VISION_MAX_DIMENSION), Image.LANCZOS)
+            out = BytesIO()
+            img.convert("RGB").save(out, "JPEG", quality=VISION_JPEG_QUALITY)
+            return out.getvalue()
+    except (UnidentifiedImageError, OSError):
+        return image_bytes
+
+async def create_comic_avatar_and_extract_traits(uploaded_image_bytes: bytes | memoryview, avatar_name: str, traits_description: str, request_id: str) -> tuple[bytes, str]:
+    """Process uploaded image into comic-style avatar and extract visual traits in the same analysis call."""
+    try:
+        logger.info("Starting comic avatar creation and visual traits extraction")
         
         # Add validation to ensure image bytes exist
-        logger.info(f"Request ID: {request_id} - Image bytes type: {type(uploaded_image_bytes)}")
-        logger.info(f"Request ID: {request_id} - Image bytes length: {len(uploaded_image_bytes) if uploaded_image_bytes else 'None'}")
+        logger.info("Image bytes type: %s", type(uploaded_image_bytes))
+        logger.info("Image bytes length: %s", len(uploaded_image_bytes) if uploaded_image_bytes else 'None')
         
         if not uploaded_image_bytes:
             raise HTTPException(status_code=400, detail="No image data provided")
         
-        # Encode the uploaded image to base64 for GPT-4 Vision
-        import base64
+        # Downscale and encode the uploaded image to base64 for GPT-4 Vision
+        vision_image_bytes = await asyncio.to_thread(downscale_for_vision, uploaded_image_bytes)
         try:
-            image_base64 = base64.b64encode(uploaded_image_bytes).decode('utf-8')
-            logger.info(f"Request ID: {request_id} - Successfully encoded image to base64")
+            image_base64 = b64encode_image(vision_image_bytes).decode('ascii')
+            logger.info("Successfully encoded image to base64")
         except Exception as e:
-            logger.error(f"Request ID: {request_id} - Error encoding image to base64: {str(e)}")
+            logger.error("Error encoding image to base64: %s", e)
             raise HTTPException(status_code=500, detail=f"Failed to encode image: {str(e)}")
         
-        # Step 1: Analyze uploaded image to create detailed character description
-        logger.info(f"Request ID: {request_id} - Analyzing uploaded image to create character description...")
+        # Step 1: Analyze uploaded image once for both the character description
+        # that drives image generation and the visual traits stored on the avatar
+        logger.info("Analyzing uploaded image to create character description and visual traits...")
         
-        description_response = await client.chat.completions.create(
+        description_response = await openai_gateway.chat_completion(
+            client.chat.completions.create,
             model="gpt-4o",
             messages=[
                 {
                     "role": "system",
-                    "content": "You are a character designer who creates detailed descriptions for comic book characters based on reference photos. Focus on distinctive features that would make the character recognizable in cartoon/comic form."
+                    "content": (
+                        "You are a character designer who creates detailed descriptions for comic book characters based on reference photos. "
+                        "Focus on distinctive features that would make the character recognizable in cartoon/comic form. "
+                        'Respond with JSON only, in this shape: {"character_description": "...", "visual_traits_spec": "..."}'
+                    )
                 },
                 {
                     "role": "user",
                     "content": [
                         {
                             "type": "text",
-                            "text": f"Analyze this image and create a detailed description for a comic book character named '{avatar_name}' with personality: {traits_description}. Focus on distinctive facial features, hair style, clothing, and any unique characteristics that would make this character recognizable when drawn in cartoon/comic style. Be specific about colors, shapes, and proportions."
+                            "text": (
+                                f"Analyze this image and create a detailed description for a comic book character named '{avatar_name}' with personality: {traits_description}. "
+                                "Focus on distinctive facial features, hair style, clothing, and any unique characteristics that would make this character recognizable when drawn in cartoon/comic style. "
+                                "Be specific about colors, shapes, and proportions.\n\n"
+                                "Return it as character_description. Also return visual_traits_spec: a character design specification for this character "
+                                "as it should look in the comic, covering facial structure, hair style, clothing, and distinctive features."
+                            )
                         },
                         {
                             "type": "image_url",
@@ -1257,15 +1570,26 @@ async def create_comic_avatar_and_extract_traits(uploaded_image_bytes: bytes, av
                     ]
                 }
             ],
-            max_tokens=500,
+            response_format={"type": "json_object"},
+            max_tokens=1300,
             temperature=0.3
         )
         
-        character_description = description_response.choices[0].message.content
-        logger.info(f"Request ID: {request_id} - Character description created")
+        # Parse the analysis, falling back to the raw text for both fields
+        analysis_content = description_response.choices[0].message.content
+        try:
+            analysis = json.loads(analysis_content)
+        except (TypeError, ValueError):
+            logger.warning("Could not parse character analysis as JSON")
+            analysis = {}
+        if not isinstance(analysis, dict):
+            analysis = {}
+        character_description = analysis.get("character_description") or analysis_content
+        visual_traits = analysis.get("visual_traits_spec") or character_description
+        logger.info("Character description and visual traits created")
         
         # Step 2: Generate comic-style avatar based on the character description
-        logger.info(f"Request ID: {request_id} - Creating comic-style avatar from character description...")
+        logger.info("Creating comic-style avatar from character description...")
         
         style_prompt = f"""
 Create a cute comic book/cartoon character avatar for a children's story app based on this description:
@@ -1289,7 +1613,8 @@ Transform the described features into a delightful animated character that child
 """
         
         # Generate comic-style avatar using DALL-E
-        avatar_response = await client.images.generate(
+        avatar_response = await openai_gateway.image_generate(
+            client.images.generate,
             model="gpt-image-1",
             prompt=style_prompt,
             n=1
@@ -1300,61 +1625,34 @@ Transform the described features into a delightful animated character that child
         if not avatar_base64:
             raise HTTPException(status_code=500, detail="OpenAI did not return avatar image data")
             
-        import base64
-        comic_avatar_bytes = base64.b64decode(avatar_base64)
-        logger.info(f"Request ID: {request_id} - Comic-style avatar created successfully")
-        
-        # Step 2: Extract visual traits from the processed comic-style avatar
-        logger.info(f"Request ID: {request_id} - Extracting visual traits from comic-style avatar...")
-        
-        # Encode the comic avatar for analysis
-        comic_avatar_base64 = base64.b64encode(comic_avatar_bytes).decode('utf-8')
-        
-        # Extract visual traits using the exact same approach as the working test script
-        traits_response = await client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a concept artist creating character designs for comic books. Analyze artwork and create character specifications."
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Describe the visual elements in this image as if creating a character design specification for a comic book character. Focus on artistic details like facial structure, hair style, clothing, and distinctive features."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/png;base64,{comic_avatar_base64}",
-                                "detail": "high"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=800,
-            temperature=0.1
-        )
-        
-        visual_traits = traits_response.choices[0].message.content
-        logger.info(f"Request ID: {request_id} - Visual traits extracted successfully from comic-style avatar")
+        comic_avatar_bytes = b64decode_image(avatar_base64)
+        logger.info("Comic-style avatar created successfully")
         
         return comic_avatar_bytes, visual_traits
         
     except Exception as e:
-        logger.error(f"Request ID: {request_id} - Error creating comic avatar and extracting traits: {str(e)}")
+        logger.error("Error creating comic avatar and extracting traits: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create comic avatar and extract traits: {str(e)}"
         )
 
-async def generate_avatar_background_task(avatar_id: int, image_bytes: bytes, avatar_name: str, traits_description: str, request_id: str, user_id: int):
+# Wakes /personalization/avatar/events streams when a job on this worker
+# finishes; streams also re-check the database in case it ran elsewhere
+AVATAR_EVENTS_RECHECK_SECONDS = 5
+AVATAR_EVENTS_MAX_SECONDS = 600
+avatar_status_events: dict[int, asyncio.Event] = {}
+
+def notify_avatar_status(avatar_id: int):
+    """Wake any status streams waiting on this avatar."""
+    event = avatar_status_events.pop(avatar_id, None)
+    if event is not None:
+        event.set()
+
+async def generate_avatar_background_task(avatar_id: int, image_bytes: bytes | memoryview, avatar_name: str, traits_description: str, request_id: str, user_id: int):
     """Background task to generate avatar and update status."""
     try:
-        logger.info(f"Request ID: {request_id} - Starting background avatar generation for avatar_id: {avatar_id}")
+        logger.info("Starting background avatar generation for avatar_id: %s", avatar_id)
         
         # Create comic-style avatar and extract visual traits
         avatar_image_bytes, visual_traits = await create_comic_avatar_and_extract_traits(
@@ -1365,130 +1663,107 @@ async def generate_avatar_background_task(avatar_id: int, image_bytes: bytes, av
         avatar_s3_url = await save_avatar_to_s3(avatar_image_bytes, user_id, request_id)
         
         # Update avatar status to completed with S3 URL and visual traits
-        from core.database import update_avatar_status_with_traits
-        await update_avatar_status_with_traits(avatar_id, "COMPLETED", avatar_s3_url, visual_traits)
+        await core_db.update_avatar_status_with_traits(avatar_id, "COMPLETED", avatar_s3_url, visual_traits)
+        invalidate_avatar_cache(user_id)
         
-        logger.info(f"Request ID: {request_id} - Avatar generation completed successfully for avatar_id: {avatar_id}")
+        logger.info("Avatar generation completed successfully for avatar_id: %s", avatar_id)
         
     except Exception as e:
-        logger.error(f"Request ID: {request_id} - Error in background avatar generation: {str(e)}")
+        logger.error("Error in background avatar generation: %s", e)
         # Update avatar status to failed
         try:
-            from core.database import update_avatar_status
-            await update_avatar_status(avatar_id, "FAILED")
+            await core_db.update_avatar_status(avatar_id, "FAILED")
+            invalidate_avatar_cache(user_id)
         except Exception as update_e:
-            logger.error(f"Request ID: {request_id} - Failed to update avatar status to FAILED: {str(update_e)}")
+            logger.error("Failed to update avatar status to FAILED: %s", update_e)
+    finally:
+        notify_avatar_status(avatar_id)
+
+# Avatar generation runs on its own small worker pool, like stories, so a burst
+# of uploads can't crowd out request handling with concurrent image jobs
+AVATAR_WORKERS = max(1, int(os.getenv("AVATAR_WORKERS", "4")) // WEB_WORKERS)
+avatar_queue: asyncio.Queue | None = None
+avatar_worker_tasks: list[asyncio.Task] = []
+
+async def avatar_worker():
+    """Consume queued avatar jobs one at a time."""
+    while True:
+        job = await avatar_queue.get()
+        request_id_var.set(job["request_id"])
+        try:
+            await generate_avatar_background_task(**job)
+        except Exception as e:
+            logger.error("Avatar worker error for avatar_id %s: %s", job.get("avatar_id"), e)
+        finally:
+            avatar_queue.task_done()
+
+async def start_avatar_workers():
+    """Fail avatars orphaned by a previous process, then start the avatar workers.
+    
+    Under gunicorn the master runs the sweep once before forking (see
+    config/gunicorn.conf.py), so the workers skip it.
+    """
+    global avatar_queue
+    if os.getenv("STALE_AVATARS_SWEPT") != "1":
+        try:
+            failed = await core_db.fail_stale_avatars(core_db.AVATAR_STALE_MINUTES)
+            if failed:
+                logger.warning("Marked %s stale IN_PROGRESS avatar(s) as FAILED", failed)
+        except Exception as e:
+            logger.error("Could not clean up stale avatars: %s", e)
+    
+    avatar_queue = asyncio.Queue()
+    avatar_worker_tasks.extend(
+        asyncio.create_task(avatar_worker(), name=f"avatar-worker-{i}")
+        for i in range(AVATAR_WORKERS)
+    )
+    logger.info("Started %s avatar workers", AVATAR_WORKERS)
+
+async def stop_avatar_workers():
+    """Give queued avatars a chance to finish, then cancel the workers."""
+    if avatar_queue is None:
+        return
+    try:
+        await asyncio.wait_for(avatar_queue.join(), timeout=STORY_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Avatar queue not drained after %ss, %s job(s) dropped", STORY_DRAIN_TIMEOUT, avatar_queue.qsize())
+    for task in avatar_worker_tasks:
+        task.cancel()
+    await asyncio.gather(*avatar_worker_tasks, return_exceptions=True)
+    avatar_worker_tasks.clear()
 
 @app.post("/personalization/avatar")
 async def create_avatar(
     req: Request,
     avatar_name: str = Form(...),
     traits_description: str = Form(...),
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    current_user: dict = Depends(require_user)
 ):
     """Upload an image and generate a comic-style avatar for the authenticated user."""
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id(req)
+    user_id = current_user["id"]
     
     try:
-        # Get current authenticated user using manual header parsing
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Get user from database
-        from auth.auth_models import UserDatabase
-        current_user = await UserDatabase.get_user_by_id(user_id)
-        if current_user is None:
-            return JSONResponse(
-                content={"error": "User not found"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = current_user["id"]
-        
         log_request_details(req, request_id)
-        logger.info(f"Request ID: {request_id} - Creating avatar for user_id: {user_id}")
-        logger.info(f"Request ID: {request_id} - Avatar name: {avatar_name}")
-        logger.info(f"Request ID: {request_id} - Traits: {traits_description}")
+        logger.info("Creating avatar for user_id: %s, name: %s", user_id, avatar_name)
         
         # Check if image parameter was received
         if image is None:
-            logger.error(f"Request ID: {request_id} - Image parameter is None")
+            logger.error("Image parameter is None")
             raise HTTPException(status_code=400, detail="No image file provided")
         
-        # Log image details for debugging
-        logger.info(f"Request ID: {request_id} - Image object: {image}")
-        logger.info(f"Request ID: {request_id} - Image filename: {getattr(image, 'filename', 'No filename')}")
-        logger.info(f"Request ID: {request_id} - Image content_type: {getattr(image, 'content_type', 'No content_type')}")
-        logger.info(f"Request ID: {request_id} - Image size: {getattr(image, 'size', 'No size')}")
-        
         # Validate image file
         if not hasattr(image, 'content_type') or not image.content_type or not image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
-        # Check file size (max 10MB)
-        image_bytes = await image.read()
-        logger.info(f"Request ID: {request_id} - Image bytes read: {len(image_bytes) if image_bytes else 0} bytes")
+        # Read the image in chunks, stopping as soon as it passes the size cap
+        image_bytes = await read_image_upload(image)
         
         if not image_bytes:
             raise HTTPException(status_code=400, detail="Image file is empty or corrupted")
-        if len(image_bytes) > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
         
-        logger.info(f"Request ID: {request_id} - Image validation passed: {len(image_bytes)} bytes")
+        logger.info("Image validation passed: %s bytes", len(image_bytes))
         
         # Create comic-style avatar and extract visual traits
         avatar_image_bytes, visual_traits = await create_comic_avatar_and_extract_traits(
@@ -1499,40 +1774,29 @@ async def create_avatar(
         avatar_s3_url = await save_avatar_to_s3(avatar_image_bytes, user_id, request_id)
         
         # Save avatar to database with extracted visual traits
-        from core.database import create_user_avatar
-        avatar_id = await create_user_avatar(
+        avatar_data = await core_db.create_user_avatar(
             user_id=user_id,
             avatar_name=avatar_name,
             traits_description=traits_description,
             s3_image_url=avatar_s3_url,
-            visual_traits=visual_traits
+            visual_traits=visual_traits,
+            with_timestamps=True
         )
-        
-        # Get the created avatar for response
-        from core.database import get_user_avatar
-        avatar_data = await get_user_avatar(user_id)
-        
-        if not avatar_data:
-            raise HTTPException(status_code=500, detail="Failed to retrieve created avatar")
+        invalidate_avatar_cache(user_id)
         
         response_data = {
             "id": avatar_data["id"],
             "avatar_name": avatar_data["avatar_name"],
             "traits_description": avatar_data["traits_description"],
             "s3_image_url": avatar_data["s3_image_url"],
-            "created_at": avatar_data["created_at"].isoformat(),
-            "updated_at": avatar_data["updated_at"].isoformat()
+            "created_at": avatar_data["created_at"],
+            "updated_at": avatar_data["updated_at"]
         }
         
-        logger.info(f"Request ID: {request_id} - Avatar created successfully with ID: {avatar_id}")
+        logger.info("Avatar created successfully with ID: %s", avatar_data["id"])
         
-        return JSONResponse(
-            content=response_data,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=response_data
         )
         
     except HTTPException:
@@ -1544,18 +1808,17 @@ async def create_avatar(
 async def save_avatar_to_s3(image_bytes: bytes, user_id: int, request_id: str) -> str:
     """Save avatar image to S3 in the avatars directory."""
     if s3_client is None:
-        logger.warning(f"Request ID: {request_id} - S3 client not initialized, skipping avatar upload")
+        logger.warning("S3 client not initialized, skipping avatar upload")
         raise HTTPException(status_code=500, detail="Image storage not available")
         
     try:
         start_time = time.time()
-        logger.info(f"Request ID: {request_id} - Starting avatar S3 upload")
+        logger.info("Starting avatar S3 upload")
         
-        # Use avatars directory with user_id for organization
-        object_key = f"avatars/user_{user_id}_{request_id}.png"
-        logger.info(f"Request ID: {request_id} - Generated object key: {object_key}")
+        object_key = AVATAR_KEY_TEMPLATE.format(user_id=user_id, request_id=request_id)
+        logger.info("Generated object key: %s", object_key)
         
-        await asyncio.to_thread(
+        await run_s3_upload(
             s3_client.put_object,
             Bucket=S3_BUCKET,
             Key=object_key,
@@ -1563,12 +1826,11 @@ async def save_avatar_to_s3(image_bytes: bytes, user_id: int, request_id: str) -
             ContentType="image/png"
         )
         
-        # Use direct S3 URL since bucket is publicly readable
-        image_url = f"https://{S3_BUCKET}.s3.amazonaws.com/{object_key}"
+        image_url = f"{S3_PUBLIC_URL}/{object_key}"
         
         upload_time = time.time() - start_time
-        logger.info(f"Request ID: {request_id} - Avatar saved to S3: {image_url}")
-        logger.info(f"Request ID: {request_id} - S3 upload completed in {upload_time:.2f} seconds")
+        logger.info("Avatar saved to S3: %s", image_url)
+        logger.info("S3 upload completed in %.2f seconds", upload_time)
         return image_url
         
     except Exception as e:
@@ -1579,94 +1841,20 @@ async def save_avatar_to_s3(image_bytes: bytes, user_id: int, request_id: str) -
         )
 
 @app.get("/personalization/avatar", response_model=AvatarResponse)
-async def get_avatar(req: Request):
+async def get_avatar(req: Request, current_user: dict = Depends(require_user)):
     """Get the current user's avatar."""
-    request_id = str(uuid.uuid4())
+    user_id = current_user["id"]
+    request_id = new_request_id(req)
     
     try:
-        # Get current authenticated user using manual header parsing
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
+        logger.info("Getting avatar for user_id: %s", user_id)
         
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Get user from database
-        from auth.auth_models import UserDatabase
-        current_user = await UserDatabase.get_user_by_id(user_id)
-        if current_user is None:
-            return JSONResponse(
-                content={"error": "User not found"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = current_user["id"]
-        
-        logger.info(f"Request ID: {request_id} - Getting avatar for user_id: {user_id}")
-        
-        from core.database import get_user_avatar
-        avatar_data = await get_user_avatar(user_id)
+        avatar_data = await core_db.get_user_avatar(user_id)
         
         if not avatar_data:
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=404,
-                content={"detail": "No avatar found for user"},
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                content={"detail": "No avatar found for user"}
             )
         
         response_data = {
@@ -1674,17 +1862,12 @@ async def get_avatar(req: Request):
             "avatar_name": avatar_data["avatar_name"],
             "traits_description": avatar_data["traits_description"],
             "s3_image_url": avatar_data["s3_image_url"],
-            "created_at": avatar_data["created_at"].isoformat(),
-            "updated_at": avatar_data["updated_at"].isoformat()
+            "created_at": avatar_data["created_at"],
+            "updated_at": avatar_data["updated_at"]
         }
         
-        return JSONResponse(
-            content=response_data,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=response_data
         )
         
     except HTTPException:
@@ -1694,120 +1877,38 @@ async def get_avatar(req: Request):
         return cors_error_response(f"Failed to get avatar: {str(e)}")
 
 @app.put("/personalization/avatar")
-async def update_avatar(req: Request, update_data: AvatarUpdateRequest):
+async def update_avatar(req: Request, update_data: AvatarUpdateRequest, current_user: dict = Depends(require_user)):
     """Update avatar name and/or traits (not the image)."""
-    request_id = str(uuid.uuid4())
+    user_id = current_user["id"]
+    request_id = new_request_id(req)
     
     try:
-        # Get current authenticated user using manual header parsing
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
+        logger.info("Updating avatar for user_id: %s", user_id)
         
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Get user from database
-        from auth.auth_models import UserDatabase
-        current_user = await UserDatabase.get_user_by_id(user_id)
-        if current_user is None:
-            return JSONResponse(
-                content={"error": "User not found"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = current_user["id"]
-        
-        logger.info(f"Request ID: {request_id} - Updating avatar for user_id: {user_id}")
-        
-        from core.database import update_user_avatar
-        success = await update_user_avatar(
+        avatar_data = await core_db.update_user_avatar(
             user_id=user_id,
             avatar_name=update_data.avatar_name,
             traits_description=update_data.traits_description
         )
+        invalidate_avatar_cache(user_id)
         
-        if not success:
-            return JSONResponse(
+        if not avatar_data:
+            return FastJSONResponse(
                 status_code=404,
-                content={"detail": "No avatar found for user"},
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                content={"detail": "No avatar found for user"}
             )
         
-        # Get updated avatar data
-        from core.database import get_user_avatar
-        avatar_data = await get_user_avatar(user_id)
-        
         response_data = {
             "id": avatar_data["id"],
             "avatar_name": avatar_data["avatar_name"],
             "traits_description": avatar_data["traits_description"],
             "s3_image_url": avatar_data["s3_image_url"],
-            "created_at": avatar_data["created_at"].isoformat(),
-            "updated_at": avatar_data["updated_at"].isoformat()
+            "created_at": avatar_data["created_at"],
+            "updated_at": avatar_data["updated_at"]
         }
         
-        return JSONResponse(
-            content=response_data,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "PUT, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=response_data
         )
         
     except HTTPException:
@@ -1816,163 +1917,80 @@ async def update_avatar(req: Request, update_data: AvatarUpdateRequest):
         log_error(e, request_id)
         return cors_error_response(f"Failed to update avatar: {str(e)}")
 
-@app.options("/personalization/avatar")
-async def preflight_avatar():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, POST, PUT, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
-
 @app.post("/personalization/avatar/async")
 async def create_avatar_async(
     req: Request,
     background_tasks: BackgroundTasks,
     avatar_name: str = Form(...),
     traits_description: str = Form(...),
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    current_user: dict = Depends(require_user)
 ):
     """Start async avatar generation and return immediately."""
-    request_id = str(uuid.uuid4())
+    user_id = current_user["id"]
+    request_id = new_request_id(req)
     
     try:
-        # Get current authenticated user
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Get user from database
-        from auth.auth_models import UserDatabase
-        current_user = await UserDatabase.get_user_by_id(user_id)
-        if current_user is None:
-            return JSONResponse(
-                content={"error": "User not found"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = current_user["id"]
-        
         log_request_details(req, request_id)
-        logger.info(f"Request ID: {request_id} - Starting async avatar generation for user_id: {user_id}")
-        logger.info(f"Request ID: {request_id} - Avatar name: {avatar_name}")
-        logger.info(f"Request ID: {request_id} - Traits: {traits_description}")
+        logger.info("Starting async avatar generation for user_id: %s, name: %s", user_id, avatar_name)
         
         # Validate image file
         if image is None:
-            logger.error(f"Request ID: {request_id} - Image parameter is None")
+            logger.error("Image parameter is None")
             raise HTTPException(status_code=400, detail="No image file provided")
         
         if not hasattr(image, 'content_type') or not image.content_type or not image.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
         
         # Read and validate image
-        image_bytes = await image.read()
+        image_bytes = await read_image_upload(image)
         if not image_bytes:
             raise HTTPException(status_code=400, detail="Image file is empty or corrupted")
-        if len(image_bytes) > 10 * 1024 * 1024:  # 10MB
-            raise HTTPException(status_code=400, detail="Image file too large (max 10MB)")
         
-        logger.info(f"Request ID: {request_id} - Image validation passed: {len(image_bytes)} bytes")
+        logger.info("Image validation passed: %s bytes", len(image_bytes))
         
         # Create avatar placeholder in database with IN_PROGRESS status
-        from core.database import create_user_avatar
         try:
-            avatar_id = await create_user_avatar(
+            avatar = await core_db.create_user_avatar(
                 user_id=user_id,
                 avatar_name=avatar_name,
                 traits_description=traits_description,
                 s3_image_url="",  # Will be filled when generation completes
                 status="IN_PROGRESS"
             )
+            invalidate_avatar_cache(user_id)
             
-            if not avatar_id:
-                logger.error(f"Request ID: {request_id} - create_user_avatar returned None for user_id: {user_id}")
+            if not avatar:
+                logger.error("create_user_avatar returned None for user_id: %s", user_id)
                 raise HTTPException(status_code=500, detail="Failed to create avatar placeholder")
+            avatar_id = avatar["id"]
                 
         except Exception as e:
-            logger.error(f"Request ID: {request_id} - Database error creating avatar placeholder: {str(e)}")
-            logger.error(f"Request ID: {request_id} - User ID: {user_id}, Avatar name: {avatar_name}")
+            logger.error("Database error creating avatar placeholder for user_id: %s: %s", user_id, e)
             raise HTTPException(status_code=500, detail=f"Failed to create avatar placeholder: {str(e)}")
         
-        # Start background task
-        background_tasks.add_task(
-            generate_avatar_background_task,
-            avatar_id,
-            image_bytes,
-            avatar_name,
-            traits_description,
-            request_id,
-            user_id
-        )
+        # Hand the avatar to the worker pool (or run it after the response if
+        # the workers weren't started, e.g. outside the app lifespan)
+        job = {
+            "avatar_id": avatar_id,
+            "image_bytes": image_bytes,
+            "avatar_name": avatar_name,
+            "traits_description": traits_description,
+            "request_id": request_id,
+            "user_id": user_id
+        }
+        if avatar_queue is not None:
+            avatar_queue.put_nowait(job)
+        else:
+            background_tasks.add_task(generate_avatar_background_task, **job)
         
-        logger.info(f"Request ID: {request_id} - Avatar generation started in background, avatar_id: {avatar_id}")
+        logger.info("Avatar generation started in background, avatar_id: %s", avatar_id)
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "avatar_id": avatar_id,
                 "status": "IN_PROGRESS",
                 "message": "Avatar generation started. Check back in a few minutes!"
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
@@ -1983,186 +2001,114 @@ async def create_avatar_async(
         return cors_error_response(f"Failed to start avatar generation: {str(e)}")
 
 @app.get("/personalization/avatar/status/{avatar_id}")
-async def get_avatar_status(avatar_id: int, req: Request):
+async def get_avatar_status(avatar_id: int, req: Request, current_user: dict = Depends(require_user)):
     """Check the status of avatar generation."""
+    user_id = current_user["id"]
+    
     try:
-        # Get current authenticated user
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
         # Get avatar from database
-        from core.database import get_user_avatar
-        avatar_data = await get_user_avatar(user_id)
+        avatar_data = await core_db.get_user_avatar(user_id)
         
         if not avatar_data:
-            return JSONResponse(
+            return FastJSONResponse(
                 content={"error": "Avatar not found"},
-                status_code=404,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                status_code=404
             )
         
         # Check if the requested avatar_id matches the user's avatar
         if avatar_data["id"] != avatar_id:
-            return JSONResponse(
+            return FastJSONResponse(
                 content={"error": "Avatar not found"},
-                status_code=404,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                status_code=404
             )
         
-        response_data = {
-            "avatar_id": avatar_data["id"],
-            "status": avatar_data.get("status", "COMPLETED"),
-            "avatar_name": avatar_data["avatar_name"],
-            "traits_description": avatar_data["traits_description"],
-            "s3_image_url": avatar_data.get("s3_image_url", ""),
-            "created_at": avatar_data["created_at"].isoformat(),
-            "updated_at": avatar_data["updated_at"].isoformat()
-        }
-        
-        return JSONResponse(
-            content=response_data,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=avatar_status_payload(avatar_data)
         )
         
     except Exception as e:
-        logger.error(f"Error getting avatar status: {str(e)}")
+        logger.error("Error getting avatar status: %s", e)
         return cors_error_response(f"Failed to get avatar status: {str(e)}")
 
+@app.get("/personalization/avatar/events/{avatar_id}")
+async def stream_avatar_status(avatar_id: int, req: Request, current_user: dict = Depends(require_user)):
+    """Stream avatar generation status as Server-Sent Events until it finishes.
+    
+    Replaces polling the status endpoint: the client authenticates once and
+    gets a "status" event whenever the status changes.
+    """
+    user_id = current_user["id"]
+    
+    async def event_stream():
+        deadline = time.monotonic() + AVATAR_EVENTS_MAX_SECONDS
+        last_status = None
+        event = None
+        try:
+            while True:
+                # Registered before the read so a notify in between isn't missed.
+                # notify_avatar_status pops the event it sets, so every wait
+                # gets a fresh one instead of returning straight away.
+                event = avatar_status_events.setdefault(avatar_id, asyncio.Event())
+                avatar_data = await core_db.get_user_avatar(user_id)
+                if not avatar_data or avatar_data["id"] != avatar_id:
+                    yield sse_message("error", {"error": "Avatar not found"})
+                    return
+                
+                status = avatar_data.get("status", "COMPLETED")
+                if status != last_status:
+                    last_status = status
+                    yield sse_message("status", avatar_status_payload(avatar_data))
+                if status != "IN_PROGRESS" or time.monotonic() >= deadline or await req.is_disconnected():
+                    return
+                
+                try:
+                    await asyncio.wait_for(event.wait(), AVATAR_EVENTS_RECHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+        finally:
+            if event is not None and avatar_status_events.get(avatar_id) is event:
+                del avatar_status_events[avatar_id]
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def avatar_status_payload(avatar_data: dict) -> dict:
+    """Shape an avatar row for the status endpoint and event stream."""
+    return {
+        "avatar_id": avatar_data["id"],
+        "status": avatar_data.get("status", "COMPLETED"),
+        "avatar_name": avatar_data["avatar_name"],
+        "traits_description": avatar_data["traits_description"],
+        "s3_image_url": avatar_data.get("s3_image_url", ""),
+        "created_at": avatar_data["created_at"],
+        "updated_at": avatar_data["updated_at"]
+    }
+
+def sse_message(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=lambda value: value.isoformat())}\n\n"
+
 @app.get("/personalization/completed-count")
-async def get_completed_avatars_count(req: Request):
+async def get_completed_avatars_count(req: Request, current_user: dict = Depends(require_user)):
     """Get count of completed avatars for notification badge."""
+    user_id = current_user["id"]
+    
     try:
-        # Get current authenticated user
-        from fastapi.security.utils import get_authorization_scheme_param
-        
-        authorization = req.headers.get("Authorization")
-        if not authorization:
-            return JSONResponse(
-                content={"error": "Authentication required"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        scheme, token = get_authorization_scheme_param(authorization)
-        if scheme.lower() != "bearer":
-            return JSONResponse(
-                content={"error": "Invalid authentication scheme"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        # Verify JWT token
-        from auth.auth_utils import JWTUtils
-        payload = JWTUtils.verify_token(token)
-        if payload is None:
-            return JSONResponse(
-                content={"error": "Invalid token"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, Options",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
-        user_id = payload.get("user_id")
-        if user_id is None:
-            return JSONResponse(
-                content={"error": "Invalid token payload"},
-                status_code=401,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-        
         # Get completed avatars count
-        from core.database import get_completed_avatars_count
-        completed_count = await get_completed_avatars_count(user_id)
+        completed_count = await core_db.get_completed_avatars_count(user_id)
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "completed_avatars_count": completed_count
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
-        logger.error(f"Error getting completed avatars count: {str(e)}")
+        logger.error("Error getting completed avatars count: %s", e)
         return cors_error_response(f"Failed to get completed avatars count: {str(e)}")
 
 @app.get("/public-stories", response_model=PublicStoriesResponse)
@@ -2180,21 +2126,20 @@ async def get_public_stories(
         offset = (page - 1) * limit
         
         # Get stories from database
-        from core.database import get_public_stories, get_public_stories_count, get_public_story_categories
         
-        stories = await get_public_stories(
+        stories = await core_db.get_public_stories(
             limit=limit, 
             offset=offset, 
             category=category, 
             featured_only=featured_only
         )
         
-        total_count = await get_public_stories_count(
+        total_count = await core_db.get_public_stories_count(
             category=category, 
             featured_only=featured_only
         )
         
-        categories = await get_public_story_categories()
+        categories = await core_db.get_public_story_categories()
         
         # Format stories for response
         formatted_stories = []
@@ -2216,29 +2161,19 @@ async def get_public_stories(
         
         logger.info(f"Retrieved {len(formatted_stories)} public stories")
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "stories": formatted_stories,
                 "total_count": total_count,
                 "categories": categories
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
         logger.error(f"Error fetching public stories: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": "Failed to fetch public stories"},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
 @app.get("/public-stories/{story_id}")
@@ -2247,18 +2182,12 @@ async def get_public_story(story_id: int):
     try:
         logger.info(f"Fetching public story with ID: {story_id}")
         
-        from core.database import get_public_story_by_id
-        story = await get_public_story_by_id(story_id)
+        story = await core_db.get_public_story_by_id(story_id)
         
         if not story:
-            return JSONResponse(
+            return FastJSONResponse(
                 content={"error": "Story not found"},
-                status_code=404,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+                status_code=404
             )
         
         formatted_story = {
@@ -2276,122 +2205,42 @@ async def get_public_story(story_id: int):
             "updated_at": story["updated_at"].isoformat() if story["updated_at"] else None
         }
         
-        return JSONResponse(
-            content=formatted_story,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content=formatted_story
         )
         
     except Exception as e:
         logger.error(f"Error fetching public story {story_id}: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": "Failed to fetch story"},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
-@app.options("/public-stories")
-async def preflight_public_stories():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
+# Database cleanup endpoint
+@app.post("/admin/cleanup-stories", status_code=202)
+async def cleanup_invalid_stories_endpoint(req: Request, background_tasks: BackgroundTasks):
+    """Admin endpoint to clean up invalid stories from the database.
+    
+    The batched delete can take a while, so it runs after the response;
+    cleanup_invalid_stories logs how many stories it removed.
+    """
+    # Optional: Add admin authentication here
+    # current_user = await get_current_user(req)
+    # if not current_user.get("is_admin"):
+    #     raise HTTPException(status_code=403, detail="Admin access required")
+    
+    background_tasks.add_task(run_story_cleanup)
+    return FastJSONResponse(
+        content={"status": "scheduled"},
+        status_code=202
     )
 
-@app.api_route("/{path:path}", methods=["GET", "POST", "OPTIONS"])
-async def catch_all(path: str, request: Request):
-    # Handle OPTIONS preflight for any path
-    if request.method == "OPTIONS":
-        return JSONResponse(
-            content={},
-            headers={
-                "Access-Control-Allow-Origin": "https://www.mystorybuddy.com",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
-        )
-    
+async def run_story_cleanup():
+    """Run cleanup_invalid_stories as a background task."""
     try:
-        body = await request.json()
-        prompt = body.get("prompt", "")
-    except (json.JSONDecodeError, UnicodeDecodeError, ValueError):
-        # Handle multipart/form-data or other non-JSON content
-        prompt = ""
-
-    # Route to appropriate function based on path
-    if path == "generateFunFacts":
-        return await generate_fun_facts(FunFactRequest(prompt=prompt), request)
-    elif path == "admin/populate-public-stories":
-        return await populate_public_stories_endpoint(request)
-    elif path == "admin/cleanup-stories":
-        return await cleanup_invalid_stories_endpoint(request)
-    elif path == "admin/copy-stories-simple":
-        return await copy_stories_simple_endpoint(request)
-    elif path == "admin/copy-one-story":
-        return await copy_one_story_endpoint(request)
-    elif path == "admin/create-public-story":
-        try:
-            admin_user = await get_admin_user(request)
-            return await create_public_story_endpoint(request, admin_user)
-        except HTTPException as e:
-            return JSONResponse(content={"error": e.detail}, status_code=e.status_code)
-    elif path == "upload-image":
-        try:
-            admin_user = await get_admin_user(request)
-            return await upload_image_endpoint(request, admin_user)
-        except HTTPException as e:
-            return JSONResponse(content={"error": e.detail}, status_code=e.status_code)
-    elif path == "auth/is-admin":
-        return await check_admin_status_endpoint(request)
-    else:
-        # Default to story generation for backward compatibility
-        from fastapi import BackgroundTasks
-        background_tasks = BackgroundTasks()
-        return await generate_story_async(StoryRequest(prompt=prompt), request, background_tasks)
-
-# Database cleanup endpoint
-@app.post("/admin/cleanup-stories")
-async def cleanup_invalid_stories_endpoint(req: Request):
-    """Admin endpoint to clean up invalid stories from the database."""
-    try:
-        # Optional: Add admin authentication here
-        # current_user = await get_current_user(req)
-        # if not current_user.get("is_admin"):
-        #     raise HTTPException(status_code=403, detail="Admin access required")
-        
-        from core.database import cleanup_invalid_stories
-        result = await cleanup_invalid_stories()
-        
-        return JSONResponse(
-            content=result,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
-        )
-        
-    except Exception as e:
-        logger.error(f"Error in cleanup endpoint: {str(e)}")
-        return JSONResponse(
-            content={"error": str(e)},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS", 
-                "Access-Control-Allow-Headers": "*"
-            }
-        )
+        await core_db.cleanup_invalid_stories()
+    except Exception:
+        logger.exception("Background story cleanup failed")
 
 @app.post("/admin/populate-public-stories")
 async def populate_public_stories_endpoint(req: Request):
@@ -2419,13 +2268,8 @@ async def populate_public_stories_endpoint(req: Request):
         logger.info(f"Found {len(sample_stories)} sample stories with valid S3 URLs")
         
         if not sample_stories:
-            return JSONResponse(
-                content={"message": "No suitable user stories found to convert to public stories", "created_count": 0},
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+            return FastJSONResponse(
+                content={"message": "No suitable user stories found to convert to public stories", "created_count": 0}
             )
         
         # Sample categories and tags for variety
@@ -2443,14 +2287,12 @@ async def populate_public_stories_endpoint(req: Request):
         ]
         
         # Import create_public_story function
-        from core.database import create_public_story
         
         # Convert sample stories to public stories
         created_count = 0
         for i, story in enumerate(sample_stories):
             try:
                 # Parse image URLs (they're stored as JSON strings)
-                import json
                 image_urls = json.loads(story['image_urls']) if story['image_urls'] else []
                 formats = json.loads(story['formats']) if story['formats'] else ["Text Story"]
                 
@@ -2467,7 +2309,7 @@ async def populate_public_stories_endpoint(req: Request):
                 featured = i < 3  # Make first 3 stories featured
                 
                 # Create public story
-                public_story_id = await create_public_story(
+                public_story_id = await core_db.create_public_story(
                     title=story['title'],
                     story_content=story['story_content'],
                     prompt=story['prompt'],
@@ -2496,31 +2338,21 @@ async def populate_public_stories_endpoint(req: Request):
         sample_results = await db_manager.execute_query(sample_query)
         sample_titles = [(s['title'], s['category'], s['featured']) for s in sample_results]
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "message": f"Successfully created {created_count} public stories from user stories",
                 "created_count": created_count,
                 "total_public_stories": total_count,
                 "sample_stories": sample_titles
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
         logger.error(f"Error populating public stories: {str(e)}")
         logger.error(f"Error details: {traceback.format_exc()}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": str(e)},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS", 
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
 @app.post("/admin/copy-stories-simple")
@@ -2583,29 +2415,19 @@ async def copy_stories_simple_endpoint(req: Request):
         result = await db_manager.execute_query(count_query)
         total_count = result[0]['count'] if result else 0
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "message": f"Successfully copied {copied_rows} stories to public_stories",
                 "copied_count": copied_rows,
                 "total_public_stories": total_count
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
         logger.error(f"Error copying stories: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": str(e)},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS", 
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
 @app.post("/admin/copy-one-story")
@@ -2632,13 +2454,8 @@ async def copy_one_story_endpoint(req: Request):
         stories = await db_manager.execute_query(select_query)
         
         if not stories:
-            return JSONResponse(
-                content={"message": "No suitable stories found", "copied_count": 0},
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "POST, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
+            return FastJSONResponse(
+                content={"message": "No suitable stories found", "copied_count": 0}
             )
         
         story = stories[0]
@@ -2663,29 +2480,19 @@ async def copy_one_story_endpoint(req: Request):
         
         await db_manager.execute_update(insert_query, params)
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "message": f"Successfully copied story: {story['title']}",
                 "copied_count": 1,
                 "story_title": story['title']
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
         logger.error(f"Error copying one story: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": str(e)},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS", 
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
 @app.post("/admin/create-public-story")
@@ -2702,10 +2509,9 @@ async def create_public_story_endpoint(req: Request, admin_user: dict = Depends(
                 raise ValueError(f"Missing required field: {field}")
         
         # Import create_public_story function
-        from core.database import create_public_story
         
         # Create the public story
-        story_id = await create_public_story(
+        story_id = await core_db.create_public_story(
             title=data['title'],
             story_content=data['story_content'],
             prompt=data.get('prompt', ''),
@@ -2717,29 +2523,19 @@ async def create_public_story_endpoint(req: Request, admin_user: dict = Depends(
             tags=data.get('tags', [])
         )
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "message": f"Successfully created public story: {data['title']}",
                 "story_id": story_id,
                 "title": data['title']
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
         logger.error(f"Error creating public story: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": str(e)},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS", 
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
 @app.post("/upload-image")
@@ -2762,7 +2558,6 @@ async def upload_image_endpoint(req: Request, admin_user: dict = Depends(get_adm
             raise ValueError("Empty image file")
         
         # Generate unique filename
-        import uuid
         file_extension = image_file.filename.split('.')[-1] if '.' in image_file.filename else 'png'
         unique_filename = f"{story_id}_{uuid.uuid4().hex[:8]}.{file_extension}"
         
@@ -2774,111 +2569,90 @@ async def upload_image_endpoint(req: Request, admin_user: dict = Depends(get_adm
         
         logger.info(f"Image uploaded successfully: {unique_filename}")
         
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "message": "Image uploaded successfully",
                 "image_url": s3_url,
                 "filename": unique_filename
-            },
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
             }
         )
         
     except Exception as e:
         logger.error(f"Error uploading image: {str(e)}")
-        return JSONResponse(
+        return FastJSONResponse(
             content={"error": str(e)},
-            status_code=500,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS", 
-                "Access-Control-Allow-Headers": "*"
-            }
+            status_code=500
         )
 
-@app.options("/admin/create-public-story")
-async def preflight_create_public_story():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
-
-@app.options("/upload-image")
-async def preflight_upload_image():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
-
 @app.get("/auth/is-admin")
 async def check_admin_status_endpoint(req: Request):
     """Check if current user has admin privileges."""
     try:
-        from auth.auth_utils import get_current_user_optional
-        from fastapi.security import HTTPBearer
-        
         security = HTTPBearer()
         try:
             credentials = await security(req)
             current_user = await get_current_user_optional(credentials)
             
             if current_user and is_admin_user(current_user.get('email', '')):
-                return JSONResponse(
+                return FastJSONResponse(
                     content={
                         "is_admin": True,
                         "user_email": current_user['email'],
                         "user_name": f"{current_user.get('first_name', '')} {current_user.get('last_name', '')}".strip()
-                    },
-                    headers={
-                        "Access-Control-Allow-Origin": "*",
-                        "Access-Control-Allow-Methods": "GET, OPTIONS",
-                        "Access-Control-Allow-Headers": "*"
                     }
                 )
         except:
             pass  # User not authenticated or error occurred
         
         # Return false if not admin or not authenticated
-        return JSONResponse(
-            content={"is_admin": False},
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content={"is_admin": False}
         )
         
     except Exception as e:
         logger.error(f"Error checking admin status: {str(e)}")
-        return JSONResponse(
-            content={"is_admin": False},
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "GET, OPTIONS",
-                "Access-Control-Allow-Headers": "*"
-            }
+        return FastJSONResponse(
+            content={"is_admin": False}
         )
 
-@app.options("/auth/is-admin")
-async def preflight_is_admin():
-    return JSONResponse(
-        content={},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET, OPTIONS",
-            "Access-Control-Allow-Headers": "*"
-        }
-    )
+FORM_CONTENT_TYPES = ("multipart/form-data", "application/x-www-form-urlencoded")
+# A legacy story request is a short JSON object; anything this big isn't one
+LEGACY_MAX_BODY_BYTES = 1024 * 1024
 
- 
\ No newline at end of file
+async def read_capped_body(request: Request, max_bytes: int) -> bytes:
+    """Read the request body, rejecting it with a 413 once it passes max_bytes.
+    
+    Declared Content-Lengths are checked before reading; chunked bodies are
+    cut off as soon as they pass the limit instead of being buffered whole.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length is not None and (not content_length.isdigit() or int(content_length) > max_bytes):
+        raise HTTPException(status_code=413, detail="Request body too large")
+    
+    buffer = bytearray()
+    async for chunk in request.stream():
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail="Request body too large")
+    return bytes(buffer)
+
+# Legacy fallback: POSTs to any other path generate a story. Registered last so
+# every explicit route matches first; GETs to unknown paths get Starlette's 405
+# instead of running this, and CORSMiddleware answers preflights before routing.
+@app.post("/{path:path}")
+async def catch_all(path: str, request: Request, background_tasks: BackgroundTasks):
+    # Empty and form-encoded bodies can't carry a JSON prompt, so don't read
+    # them; anything else is parsed even without a JSON content type, since
+    # legacy clients post JSON as text/plain to avoid a preflight
+    prompt = ""
+    content_type = request.headers.get("content-type", "")
+    if request.headers.get("content-length") != "0" and not content_type.startswith(FORM_CONTENT_TYPES):
+        try:
+            body = json_loads(await read_capped_body(request, LEGACY_MAX_BODY_BYTES))
+            prompt = body.get("prompt", "")
+        except (ValueError, AttributeError):
+            # Not JSON, or JSON that isn't an object
+            prompt = ""
+
+    # Default to story generation for backward compatibility
+    return await generate_story_async(StoryRequest(prompt=prompt), request, background_tasks)
@@ -167,77 +167,98 @@ def mock_email_service():
     mock_service = AsyncMock()
     mock_service.send_welcome_email = AsyncMock(return_value=True)
     mock_service.send_otp_email = AsyncMock(return_value=True)
+    mock_service.otp_recently_sent = Mock(return_value=False)
     return mock_service
 
 
-@pytest.fixture
-def test_client_base(mock_openai_client, mock_s3_client, mock_db_manager):
-    """Create test client with mocked dependencies."""
-    from fastapi.testclient import TestClient
-    
-    # Comprehensive database mocking at all import levels
-    patches = [
-        # Mock the main application dependencies
+# UserDatabase methods import db_manager internally, so patch them directly
+_AUTH_TARGETS = (
+    'auth.auth_models.UserDatabase.create_user',
+    'auth.auth_models.UserDatabase.get_user_by_email',
+    'auth.auth_models.UserDatabase.get_user_by_id',
+    'auth.auth_models.UserDatabase.store_otp',
+    'auth.auth_models.UserDatabase.verify_otp',
+    'auth.auth_models.UserDatabase.invalidate_auth_session',
+    'auth.auth_models.UserDatabase.create_auth_session',
+    'auth.auth_models.UserDatabase.verify_auth_session',
+    'auth.auth_models.UserDatabase.update_last_login',
+)
+
+# Database functions called through core.database
+_DB_TARGETS = (
+    'core.database.save_story',
+    'core.database.save_fun_facts',
+    'core.database.get_recent_stories',
+    'core.database.create_story_placeholder',
+    'core.database.update_story_content',
+    'core.database.update_story_status',
+    'core.database.get_story_by_id',
+    'core.database.get_new_stories_count',
+    'core.database.create_user_avatar',
+    'core.database.get_user_avatar',
+    'core.database.update_user_avatar',
+    'core.database.update_avatar_status_with_traits',
+    'core.database.get_completed_avatars_count',
+    'core.database.cleanup_invalid_stories',
+)
+
+_EMAIL_TARGETS = (
+    'core.email_service.email_service.send_welcome_email',
+    'core.email_service.email_service.send_otp_email',
+)
+
+
+def _build_patches(mock_openai_client, mock_s3_client, mock_db_manager):
+    """Build the patch list shared by the test client fixtures."""
+    return [
         patch('main.client', mock_openai_client),
         patch('main.s3_client', mock_s3_client),
         patch('main.db_manager', mock_db_manager),
-        
-        # Mock database manager at core level
         patch('core.database.db_manager', mock_db_manager),
-        
-        # Mock all UserDatabase methods that import db_manager internally
-        patch('auth.auth_models.UserDatabase.create_user', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.get_user_by_email', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.get_user_by_id', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.store_otp', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.verify_otp', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.invalidate_auth_session', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.create_auth_session', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.verify_auth_session', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.update_last_login', new_callable=AsyncMock),
-        
-        # Mock database functions that import db_manager internally
-        patch('core.database.save_story', new_callable=AsyncMock),
-        patch('core.database.save_fun_facts', new_callable=AsyncMock),
-        patch('core.database.get_recent_stories', new_callable=AsyncMock),
-        patch('core.database.create_story_placeholder', new_callable=AsyncMock),
-        patch('core.database.update_story_content', new_callable=AsyncMock),
-        patch('core.database.update_story_status', new_callable=AsyncMock),
-        patch('core.database.get_story_by_id', new_callable=AsyncMock),
-        patch('core.database.get_new_stories_count', new_callable=AsyncMock),
-        patch('core.database.create_user_avatar', new_callable=AsyncMock),
-        patch('core.database.get_user_avatar', new_callable=AsyncMock),
-        patch('core.database.update_user_avatar', new_callable=AsyncMock),
-        patch('core.database.update_avatar_status_with_traits', new_callable=AsyncMock),
-        patch('core.database.get_completed_avatars_count', new_callable=AsyncMock),
-        patch('core.database.cleanup_invalid_stories', new_callable=AsyncMock),
-        
-        # Mock email service
-        patch('core.email_service.email_service.send_welcome_email', new_callable=AsyncMock),
-        patch('core.email_service.email_service.send_otp_email', new_callable=AsyncMock),
+    ] + [
+        patch(target, new_callable=AsyncMock)
+        for target in (*_AUTH_TARGETS, *_DB_TARGETS, *_EMAIL_TARGETS)
     ]
+
+
+def _apply_patches(stack, patches):
+    """Enter each patch on the stack and return its mock keyed by attribute name."""
+    mocked_functions = {}
+    for patch_obj in patches:
+        mock_obj = stack.enter_context(patch_obj)
+        # Store reference to mock for configuration
+        if hasattr(patch_obj, 'attribute'):
+            attr_name = patch_obj.attribute.split('.')[-1]
+            mocked_functions[attr_name] = mock_obj
+    return mocked_functions
+
+
+@pytest.fixture(scope="session")
+def app():
+    """Import the FastAPI app once for the whole test session."""
+    from main import app
+    return app
+
+
+def _configure_auth_mocks(mocked_functions):
+    """Default the auth and email mocks to successful operations."""
+    mocked_functions['create_user'].return_value = 1  # Return user ID
+    mocked_functions['verify_otp'].return_value = True
+    mocked_functions['store_otp'].return_value = None
+    mocked_functions['send_welcome_email'].return_value = True
+    mocked_functions['send_otp_email'].return_value = True
+
+
+@pytest.fixture
+def test_client_base(app, mock_openai_client, mock_s3_client, mock_db_manager):
+    """Create test client with mocked dependencies."""
+    from fastapi.testclient import TestClient
+    
+    patches = _build_patches(mock_openai_client, mock_s3_client, mock_db_manager)
     
     with ExitStack() as stack:
-        # Apply all patches
-        mocked_functions = {}
-        for patch_obj in patches:
-            mock_obj = stack.enter_context(patch_obj)
-            # Store reference to mock for configuration
-            if hasattr(patch_obj, 'attribute'):
-                attr_name = patch_obj.attribute.split('.')[-1]
-                mocked_functions[attr_name] = mock_obj
-        
-        # Configure auth model mocks for successful operations
-        mock_create_user = mocked_functions.get('create_user')
-        mock_get_user_by_email = mocked_functions.get('get_user_by_email')
-        mock_get_user_by_id = mocked_functions.get('get_user_by_id')
-        mock_verify_otp = mocked_functions.get('verify_otp')
-        mock_store_otp = mocked_functions.get('store_otp')
-        mock_send_welcome_email = mocked_functions.get('send_welcome_email')
-        mock_send_otp_email = mocked_functions.get('send_otp_email')
-        
-        if mock_create_user:
-            mock_create_user.return_value = 1  # Return user ID
+        mocked_functions = _apply_patches(stack, patches)
+        _configure_auth_mocks(mocked_functions)
         
         # Store this for tests to customize behavior per test
         default_user = {
@@ -251,57 +272,36 @@ def test_client_base(mock_openai_client, mock_s3_client, mock_db_manager):
             "password_hash": "$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewKyNiGpO6EsjO7y"  # 'password123'
         }
         
-        if mock_get_user_by_email:
-            # Default to None for signup tests, but tests can override this
-            mock_get_user_by_email.return_value = None
-        if mock_get_user_by_id:
-            mock_get_user_by_id.return_value = default_user
-        if mock_verify_otp:
-            mock_verify_otp.return_value = True
-        if mock_store_otp:
-            mock_store_otp.return_value = None
-        if mock_send_welcome_email:
-            mock_send_welcome_email.return_value = True
-        if mock_send_otp_email:
-            mock_send_otp_email.return_value = True
+        # Default to None for signup tests, but tests can override this
+        mocked_functions['get_user_by_email'].return_value = None
+        mocked_functions['get_user_by_id'].return_value = default_user
         
         # Configure story/database operation mocks
-        mock_save_story = mocked_functions.get('save_story')
-        mock_create_story_placeholder = mocked_functions.get('create_story_placeholder')
-        mock_update_story_content = mocked_functions.get('update_story_content')
-        mock_get_story_by_id = mocked_functions.get('get_story_by_id')
-        mock_create_user_avatar = mocked_functions.get('create_user_avatar')
-        mock_get_user_avatar = mocked_functions.get('get_user_avatar')
-        
-        if mock_save_story:
-            mock_save_story.return_value = 1
-        if mock_create_story_placeholder:
-            mock_create_story_placeholder.return_value = 1
-        if mock_update_story_content:
-            mock_update_story_content.return_value = True
-        if mock_get_story_by_id:
-            mock_get_story_by_id.return_value = {
-                "id": 1,
-                "title": "Test Story",
-                "story_content": "This is a test story",
-                "status": "NEW",
-                "image_urls": ["https://test.com/image.png"]
-            }
-        if mock_create_user_avatar:
-            mock_create_user_avatar.return_value = 1
-        if mock_get_user_avatar:
-            mock_get_user_avatar.return_value = {
-                "id": 1,
-                "avatar_name": "Test Avatar",
-                "traits_description": "A test avatar",
-                "s3_image_url": "https://test.com/avatar.png",
-                "status": "COMPLETED"
-            }
-        
-        # Import app after all patching is complete
-        from main import app
+        mocked_functions['save_story'].return_value = 1
+        mocked_functions['create_story_placeholder'].return_value = 1
+        mocked_functions['update_story_content'].return_value = True
+        mocked_functions['get_story_by_id'].return_value = {
+            "id": 1,
+            "title": "Test Story",
+            "story_content": "This is a test story",
+            "status": "NEW",
+            "image_urls": ["https://test.com/image.png"]
+        }
+        test_avatar = {
+            "id": 1,
+            "avatar_name": "Test Avatar",
+            "traits_description": "A test avatar",
+            "s3_image_url": "https://test.com/avatar.png",
+            "status": "COMPLETED",
+            "created_at": datetime.now(),
+            "updated_at": datetime.now()
+        }
+        mocked_functions['create_user_avatar'].return_value = dict(test_avatar)
+        mocked_functions['get_user_avatar'].return_value = dict(test_avatar)
+        mocked_functions['update_user_avatar'].return_value = dict(test_avatar)
         
-        # Create test client
+        # Handlers resolve the patched module globals at call time, so the
+        # session-wide app sees this test's mocks
         client = TestClient(app)
         yield client
 
@@ -313,90 +313,23 @@ def test_client(test_client_base):
 
 
 @pytest.fixture  
-def test_client_with_user(mock_openai_client, mock_s3_client, mock_db_manager, sample_user):
+def test_client_with_user(app, mock_openai_client, mock_s3_client, mock_db_manager, sample_user):
     """Test client with existing user mocked for login tests."""
     from fastapi.testclient import TestClient
     
     # Same patches as base but with user existing
-    patches = [
-        # Mock the main application dependencies
-        patch('main.client', mock_openai_client),
-        patch('main.s3_client', mock_s3_client),
-        patch('main.db_manager', mock_db_manager),
-        
-        # Mock database manager at core level
-        patch('core.database.db_manager', mock_db_manager),
-        
-        # Mock all UserDatabase methods that import db_manager internally
-        patch('auth.auth_models.UserDatabase.create_user', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.get_user_by_email', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.get_user_by_id', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.store_otp', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.verify_otp', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.invalidate_auth_session', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.create_auth_session', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.verify_auth_session', new_callable=AsyncMock),
-        patch('auth.auth_models.UserDatabase.update_last_login', new_callable=AsyncMock),
-        
-        # Mock database functions that import db_manager internally
-        patch('core.database.save_story', new_callable=AsyncMock),
-        patch('core.database.save_fun_facts', new_callable=AsyncMock),
-        patch('core.database.get_recent_stories', new_callable=AsyncMock),
-        patch('core.database.create_story_placeholder', new_callable=AsyncMock),
-        patch('core.database.update_story_content', new_callable=AsyncMock),
-        patch('core.database.update_story_status', new_callable=AsyncMock),
-        patch('core.database.get_story_by_id', new_callable=AsyncMock),
-        patch('core.database.get_new_stories_count', new_callable=AsyncMock),
-        patch('core.database.create_user_avatar', new_callable=AsyncMock),
-        patch('core.database.get_user_avatar', new_callable=AsyncMock),
-        patch('core.database.update_user_avatar', new_callable=AsyncMock),
-        patch('core.database.update_avatar_status_with_traits', new_callable=AsyncMock),
-        patch('core.database.get_completed_avatars_count', new_callable=AsyncMock),
-        patch('core.database.cleanup_invalid_stories', new_callable=AsyncMock),
-        
-        # Mock email service
-        patch('core.email_service.email_service.send_welcome_email', new_callable=AsyncMock),
-        patch('core.email_service.email_service.send_otp_email', new_callable=AsyncMock),
-    ]
+    patches = _build_patches(mock_openai_client, mock_s3_client, mock_db_manager)
     
     with ExitStack() as stack:
-        # Apply all patches
-        mocked_functions = {}
-        for patch_obj in patches:
-            mock_obj = stack.enter_context(patch_obj)
-            # Store reference to mock for configuration
-            if hasattr(patch_obj, 'attribute'):
-                attr_name = patch_obj.attribute.split('.')[-1]
-                mocked_functions[attr_name] = mock_obj
-        
-        # Configure auth model mocks for existing user (login scenario)
-        mock_create_user = mocked_functions.get('create_user')
-        mock_get_user_by_email = mocked_functions.get('get_user_by_email')
-        mock_get_user_by_id = mocked_functions.get('get_user_by_id')
-        mock_verify_otp = mocked_functions.get('verify_otp')
-        mock_store_otp = mocked_functions.get('store_otp')
-        mock_send_welcome_email = mocked_functions.get('send_welcome_email')
-        mock_send_otp_email = mocked_functions.get('send_otp_email')
+        mocked_functions = _apply_patches(stack, patches)
+        _configure_auth_mocks(mocked_functions)
         
-        if mock_create_user:
-            mock_create_user.return_value = 1  # Return user ID
-        if mock_get_user_by_email:
-            mock_get_user_by_email.return_value = sample_user  # Return existing user for login
-        if mock_get_user_by_id:
-            mock_get_user_by_id.return_value = sample_user
-        if mock_verify_otp:
-            mock_verify_otp.return_value = True
-        if mock_store_otp:
-            mock_store_otp.return_value = None
-        if mock_send_welcome_email:
-            mock_send_welcome_email.return_value = True
-        if mock_send_otp_email:
-            mock_send_otp_email.return_value = True
+        # Return existing user for login
+        mocked_functions['get_user_by_email'].return_value = sample_user
+        mocked_functions['get_user_by_id'].return_value = sample_user
         
-        # Import app after all patching is complete
-        from main import app
-        
-        # Create test client
+        # Handlers resolve the patched module globals at call time, so the
+        # session-wide app sees this test's mocks
         client = TestClient(app)
         yield client
 
@@ -409,4 +342,17 @@ def mock_request():
     request.client = Mock(host="127.0.0.1")
     request.method = "POST"
     request.url = Mock(path="/generateStory")
-    return request
\ No newline at end of file
+    return request
+
+@pytest.fixture(autouse=True)
+def reset_in_process_caches():
+    """Clear module-level caches so cached lookups don't leak between tests."""
+    yield
+    main_module = sys.modules.get('main')
+    if main_module is not None:
+        main_module.avatar_cache.clear()
+        main_module.my_stories_cache.clear()
+        main_module.recent_requests.clear()
+        main_module.user_cache.clear()
+        main_module.token_cache.clear()
+        main_module.avatar_status_events.clear()
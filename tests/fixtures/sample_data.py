@@ -2,215 +2,277 @@
 Sample data and fixtures for testing.
 """
 from datetime import datetime
+import functools
+from types import SimpleNamespace
 import json
 
 
+def _jsoncache(obj):
+    """Pair a value with its JSON encoding, computed once."""
+    return SimpleNamespace(raw=obj, json=json.dumps(obj))
+
+
+# Columns the database stores as JSON strings, kept decoded as well so tests
+# don't have to json.loads the fixture rows back. Built on first use.
+@functools.cache
+def _story_image_urls():
+    return [
+        _jsoncache([
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_1.png',
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_2.png',
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_3.png',
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_4.png'
+        ]),
+        _jsoncache([
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_1.png',
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_2.png',
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_3.png',
+            'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_4.png'
+        ]),
+        _jsoncache([])
+    ]
+
+
+@functools.cache
+def _story_formats():
+    return [
+        _jsoncache(['Comic Book', 'Text Story']),
+        _jsoncache(['Comic Book']),
+        _jsoncache(['Comic Book'])
+    ]
+
+
+@functools.cache
+def _fun_facts():
+    return [
+        _jsoncache([
+            {
+                'question': 'Did you know that elephants can recognize themselves in mirrors?',
+                'answer': 'Yes! Elephants are one of the few animals that can pass the mirror test, showing they understand the reflection is themselves.'
+            },
+            {
+                'question': 'Did you know that octopuses have three hearts?',
+                'answer': 'Amazing! Two hearts pump blood to the gills, and one pumps blood to the rest of the body.'
+            },
+            {
+                'question': 'Did you know that honeybees communicate through dancing?',
+                'answer': 'They do! Bees perform a "waggle dance" to tell other bees where to find the best flowers.'
+            }
+        ]),
+        _jsoncache([
+            {
+                'question': 'Did you know that the Sun is a star?',
+                'answer': 'Yes! The Sun is actually a giant star that gives us light and warmth every day.'
+            },
+            {
+                'question': 'Did you know that there are billions of stars in the sky?',
+                'answer': 'There are so many stars that we could never count them all, even if we tried our whole lives!'
+            }
+        ])
+    ]
+
+
+class _lazy_rows:
+    """Class attribute built on first access and cached on the class."""
+    
+    def __init__(self, build):
+        self.build = build
+    
+    def __set_name__(self, owner, name):
+        self.name = name
+    
+    def __get__(self, obj, owner):
+        rows = self.build()
+        setattr(owner, self.name, rows)
+        return rows
+
+
 class SampleData:
     """Sample data for testing purposes."""
     
-    SAMPLE_USERS = [
-        {
-            'id': 1,
-            'email': 'john.doe@example.com',
-            'first_name': 'John',
-            'last_name': 'Doe',
-            'password_hash': '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewKyNiGpO6EsjO7y',  # 'password123'
-            'auth_type': 'email_password',
-            'is_active': True,
-            'created_at': datetime(2024, 1, 1, 12, 0, 0),
-            'updated_at': datetime(2024, 1, 1, 12, 0, 0)
-        },
-        {
-            'id': 2,
-            'email': 'jane.smith@example.com',
-            'first_name': 'Jane',
-            'last_name': 'Smith',
-            'password_hash': None,  # OTP-only user
-            'auth_type': 'otp',
-            'is_active': True,
-            'created_at': datetime(2024, 1, 2, 12, 0, 0),
-            'updated_at': datetime(2024, 1, 2, 12, 0, 0)
-        },
-        {
-            'id': 3,
-            'email': 'bob.wilson@gmail.com',
-            'first_name': 'Bob',
-            'last_name': 'Wilson',
-            'password_hash': None,
-            'auth_type': 'google',
-            'is_active': True,
-            'created_at': datetime(2024, 1, 3, 12, 0, 0),
-            'updated_at': datetime(2024, 1, 3, 12, 0, 0)
-        }
-    ]
+    @_lazy_rows
+    def SAMPLE_USERS():
+        return [
+            {
+                'id': 1,
+                'email': 'john.doe@example.com',
+                'first_name': 'John',
+                'last_name': 'Doe',
+                'password_hash': '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewKyNiGpO6EsjO7y',  # 'password123'
+                'auth_type': 'email_password',
+                'is_active': True,
+                'created_at': datetime(2024, 1, 1, 12, 0, 0),
+                'updated_at': datetime(2024, 1, 1, 12, 0, 0)
+            },
+            {
+                'id': 2,
+                'email': 'jane.smith@example.com',
+                'first_name': 'Jane',
+                'last_name': 'Smith',
+                'password_hash': None,  # OTP-only user
+                'auth_type': 'otp',
+                'is_active': True,
+                'created_at': datetime(2024, 1, 2, 12, 0, 0),
+                'updated_at': datetime(2024, 1, 2, 12, 0, 0)
+            },
+            {
+                'id': 3,
+                'email': 'bob.wilson@gmail.com',
+                'first_name': 'Bob',
+                'last_name': 'Wilson',
+                'password_hash': None,
+                'auth_type': 'google',
+                'is_active': True,
+                'created_at': datetime(2024, 1, 3, 12, 0, 0),
+                'updated_at': datetime(2024, 1, 3, 12, 0, 0)
+            }
+        ]
     
-    SAMPLE_STORIES = [
-        {
-            'id': 1,
-            'title': 'The Brave Little Mouse',
-            'story_content': 'Once upon a time, there was a brave little mouse named Benny. He lived in a cozy hole under the old oak tree. One day, Benny decided to explore the big garden.\n\nBenny discovered a beautiful flower garden with colorful butterflies dancing around. He made friends with a friendly ladybug named Lucy who showed him around.\n\nSudenly, dark clouds gathered and it started to rain. Benny and Lucy found shelter under a big mushroom. They waited together until the sun came out again.\n\nWhen the rain stopped, a beautiful rainbow appeared in the sky. Benny realized that adventures are even better when shared with friends.\n\nThe End! (Created By - MyStoryBuddy)',
-            'prompt': 'Tell me a story about a brave little mouse',
-            'image_urls': json.dumps([
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_1.png',
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_2.png',
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_3.png',
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test1_image_4.png'
-            ]),
-            'formats': json.dumps(['Comic Book', 'Text Story']),
-            'created_at': datetime(2024, 1, 1, 14, 0, 0),
-            'updated_at': datetime(2024, 1, 1, 14, 30, 0),
-            'user_id': '1',
-            'request_id': 'test-request-1',
-            'status': 'NEW'
-        },
-        {
-            'id': 2,
-            'title': 'The Magic Forest Adventure',
-            'story_content': 'In a magical forest far away, lived a curious rabbit named Ruby. She had soft white fur and bright pink eyes that sparkled with wonder.\n\nOne morning, Ruby discovered a hidden path covered with glowing flowers. She followed the path deeper into the forest, where she met a wise old owl named Oliver.\n\nOliver told Ruby about a secret waterfall that granted one wish to kind-hearted creatures. Ruby wanted to wish for happiness for all forest animals.\n\nTogether, they found the magical waterfall. Ruby made her wish, and suddenly, all the forest animals appeared, laughing and playing together in harmony.\n\nThe End! (Created By - MyStoryBuddy)',
-            'prompt': 'A magical forest story',
-            'image_urls': json.dumps([
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_1.png',
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_2.png',
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_3.png',
-                'https://mystorybuddy-assets.s3.amazonaws.com/stories/test2_image_4.png'
-            ]),
-            'formats': json.dumps(['Comic Book']),
-            'created_at': datetime(2024, 1, 2, 10, 0, 0),
-            'updated_at': datetime(2024, 1, 2, 10, 25, 0),
-            'user_id': '2',
-            'request_id': 'test-request-2',
-            'status': 'VIEWED'
-        },
-        {
-            'id': 3,
-            'title': 'Story in Progress...',
-            'story_content': 'Your story is being generated...',
-            'prompt': 'A story about dinosaurs',
-            'image_urls': json.dumps([]),
-            'formats': json.dumps(['Comic Book']),
-            'created_at': datetime(2024, 1, 3, 16, 0, 0),
-            'updated_at': datetime(2024, 1, 3, 16, 0, 0),
-            'user_id': '1',
-            'request_id': 'test-request-3',
-            'status': 'IN_PROGRESS'
-        }
-    ]
+    @_lazy_rows
+    def SAMPLE_STORIES():
+        return [
+            {
+                'id': 1,
+                'title': 'The Brave Little Mouse',
+                'story_content': 'Once upon a time, there was a brave little mouse named Benny. He lived in a cozy hole under the old oak tree. One day, Benny decided to explore the big garden.\n\nBenny discovered a beautiful flower garden with colorful butterflies dancing around. He made friends with a friendly ladybug named Lucy who showed him around.\n\nSudenly, dark clouds gathered and it started to rain. Benny and Lucy found shelter under a big mushroom. They waited together until the sun came out again.\n\nWhen the rain stopped, a beautiful rainbow appeared in the sky. Benny realized that adventures are even better when shared with friends.\n\nThe End! (Created By - MyStoryBuddy)',
+                'prompt': 'Tell me a story about a brave little mouse',
+                'image_urls': _story_image_urls()[0].json,
+                'formats': _story_formats()[0].json,
+                'created_at': datetime(2024, 1, 1, 14, 0, 0),
+                'updated_at': datetime(2024, 1, 1, 14, 30, 0),
+                'user_id': '1',
+                'request_id': 'test-request-1',
+                'status': 'NEW'
+            },
+            {
+                'id': 2,
+                'title': 'The Magic Forest Adventure',
+                'story_content': 'In a magical forest far away, lived a curious rabbit named Ruby. She had soft white fur and bright pink eyes that sparkled with wonder.\n\nOne morning, Ruby discovered a hidden path covered with glowing flowers. She followed the path deeper into the forest, where she met a wise old owl named Oliver.\n\nOliver told Ruby about a secret waterfall that granted one wish to kind-hearted creatures. Ruby wanted to wish for happiness for all forest animals.\n\nTogether, they found the magical waterfall. Ruby made her wish, and suddenly, all the forest animals appeared, laughing and playing together in harmony.\n\nThe End! (Created By - MyStoryBuddy)',
+                'prompt': 'A magical forest story',
+                'image_urls': _story_image_urls()[1].json,
+                'formats': _story_formats()[1].json,
+                'created_at': datetime(2024, 1, 2, 10, 0, 0),
+                'updated_at': datetime(2024, 1, 2, 10, 25, 0),
+                'user_id': '2',
+                'request_id': 'test-request-2',
+                'status': 'VIEWED'
+            },
+            {
+                'id': 3,
+                'title': 'Story in Progress...',
+                'story_content': 'Your story is being generated...',
+                'prompt': 'A story about dinosaurs',
+                'image_urls': _story_image_urls()[2].json,
+                'formats': _story_formats()[2].json,
+                'created_at': datetime(2024, 1, 3, 16, 0, 0),
+                'updated_at': datetime(2024, 1, 3, 16, 0, 0),
+                'user_id': '1',
+                'request_id': 'test-request-3',
+                'status': 'IN_PROGRESS'
+            }
+        ]
     
-    SAMPLE_AVATARS = [
-        {
-            'id': 1,
-            'user_id': 1,
-            'avatar_name': 'Benny',
-            'traits_description': 'A brave and curious mouse who loves exploring new places and making friends. He is kind, helpful, and always ready for adventure.',
-            's3_image_url': 'https://mystorybuddy-assets.s3.amazonaws.com/avatars/user_1_benny.png',
-            'visual_traits': 'Small brown mouse with big round ears, bright black eyes, wearing a tiny blue vest with golden buttons. Has a friendly smile and an adventurous spirit.',
-            'status': 'COMPLETED',
-            'is_active': True,
-            'created_at': datetime(2024, 1, 1, 15, 0, 0),
-            'updated_at': datetime(2024, 1, 1, 15, 30, 0)
-        },
-        {
-            'id': 2,
-            'user_id': 2,
-            'avatar_name': 'Ruby',
-            'traits_description': 'A gentle and wise rabbit who loves nature and helping others. She is patient, caring, and has a deep connection with the forest.',
-            's3_image_url': 'https://mystorybuddy-assets.s3.amazonaws.com/avatars/user_2_ruby.png',
-            'visual_traits': 'Soft white rabbit with pink eyes and long floppy ears. Wears a flower crown made of daisies and has a peaceful, serene expression.',
-            'status': 'COMPLETED',
-            'is_active': True,
-            'created_at': datetime(2024, 1, 2, 11, 0, 0),
-            'updated_at': datetime(2024, 1, 2, 11, 20, 0)
-        },
-        {
-            'id': 3,
-            'user_id': 3,
-            'avatar_name': 'Max',
-            'traits_description': 'A playful and energetic puppy who loves to run, jump, and play fetch. He is loyal, friendly, and always excited to meet new friends.',
-            's3_image_url': '',
-            'visual_traits': None,
-            'status': 'IN_PROGRESS',
-            'is_active': True,
-            'created_at': datetime(2024, 1, 3, 14, 0, 0),
-            'updated_at': datetime(2024, 1, 3, 14, 0, 0)
-        }
-    ]
+    @_lazy_rows
+    def SAMPLE_AVATARS():
+        return [
+            {
+                'id': 1,
+                'user_id': 1,
+                'avatar_name': 'Benny',
+                'traits_description': 'A brave and curious mouse who loves exploring new places and making friends. He is kind, helpful, and always ready for adventure.',
+                's3_image_url': 'https://mystorybuddy-assets.s3.amazonaws.com/avatars/user_1_benny.png',
+                'visual_traits': 'Small brown mouse with big round ears, bright black eyes, wearing a tiny blue vest with golden buttons. Has a friendly smile and an adventurous spirit.',
+                'status': 'COMPLETED',
+                'is_active': True,
+                'created_at': datetime(2024, 1, 1, 15, 0, 0),
+                'updated_at': datetime(2024, 1, 1, 15, 30, 0)
+            },
+            {
+                'id': 2,
+                'user_id': 2,
+                'avatar_name': 'Ruby',
+                'traits_description': 'A gentle and wise rabbit who loves nature and helping others. She is patient, caring, and has a deep connection with the forest.',
+                's3_image_url': 'https://mystorybuddy-assets.s3.amazonaws.com/avatars/user_2_ruby.png',
+                'visual_traits': 'Soft white rabbit with pink eyes and long floppy ears. Wears a flower crown made of daisies and has a peaceful, serene expression.',
+                'status': 'COMPLETED',
+                'is_active': True,
+                'created_at': datetime(2024, 1, 2, 11, 0, 0),
+                'updated_at': datetime(2024, 1, 2, 11, 20, 0)
+            },
+            {
+                'id': 3,
+                'user_id': 3,
+                'avatar_name': 'Max',
+                'traits_description': 'A playful and energetic puppy who loves to run, jump, and play fetch. He is loyal, friendly, and always excited to meet new friends.',
+                's3_image_url': '',
+                'visual_traits': None,
+                'status': 'IN_PROGRESS',
+                'is_active': True,
+                'created_at': datetime(2024, 1, 3, 14, 0, 0),
+                'updated_at': datetime(2024, 1, 3, 14, 0, 0)
+            }
+        ]
     
-    SAMPLE_FUN_FACTS = [
-        {
-            'id': 1,
-            'prompt': 'Tell me about animals',
-            'facts': json.dumps([
-                {
-                    'question': 'Did you know that elephants can recognize themselves in mirrors?',
-                    'answer': 'Yes! Elephants are one of the few animals that can pass the mirror test, showing they understand the reflection is themselves.'
-                },
-                {
-                    'question': 'Did you know that octopuses have three hearts?',
-                    'answer': 'Amazing! Two hearts pump blood to the gills, and one pumps blood to the rest of the body.'
-                },
-                {
-                    'question': 'Did you know that honeybees communicate through dancing?',
-                    'answer': 'They do! Bees perform a "waggle dance" to tell other bees where to find the best flowers.'
-                }
-            ]),
-            'created_at': datetime(2024, 1, 1, 16, 0, 0),
-            'request_id': 'test-facts-1'
-        },
-        {
-            'id': 2,
-            'prompt': 'Space facts for kids',
-            'facts': json.dumps([
-                {
-                    'question': 'Did you know that the Sun is a star?',
-                    'answer': 'Yes! The Sun is actually a giant star that gives us light and warmth every day.'
-                },
-                {
-                    'question': 'Did you know that there are billions of stars in the sky?',
-                    'answer': 'There are so many stars that we could never count them all, even if we tried our whole lives!'
-                }
-            ]),
-            'created_at': datetime(2024, 1, 2, 17, 0, 0),
-            'request_id': 'test-facts-2'
-        }
-    ]
+    @_lazy_rows
+    def SAMPLE_FUN_FACTS():
+        return [
+            {
+                'id': 1,
+                'prompt': 'Tell me about animals',
+                'facts': _fun_facts()[0].json,
+                'created_at': datetime(2024, 1, 1, 16, 0, 0),
+                'request_id': 'test-facts-1'
+            },
+            {
+                'id': 2,
+                'prompt': 'Space facts for kids',
+                'facts': _fun_facts()[1].json,
+                'created_at': datetime(2024, 1, 2, 17, 0, 0),
+                'request_id': 'test-facts-2'
+            }
+        ]
     
-    SAMPLE_AUTH_SESSIONS = [
-        {
-            'id': 1,
-            'user_id': 1,
-            'access_token': 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.sample.token',
-            'expires_at': datetime(2024, 12, 31, 23, 59, 59),
-            'created_at': datetime(2024, 1, 1, 12, 0, 0),
-            'is_active': True
-        },
-        {
-            'id': 2,
-            'user_id': 2,
-            'access_token': 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.another.token',
-            'expires_at': datetime(2024, 12, 31, 23, 59, 59),
-            'created_at': datetime(2024, 1, 2, 12, 0, 0),
-            'is_active': True
-        }
-    ]
+    @_lazy_rows
+    def SAMPLE_AUTH_SESSIONS():
+        return [
+            {
+                'id': 1,
+                'user_id': 1,
+                'access_token': 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.sample.token',
+                'expires_at': datetime(2024, 12, 31, 23, 59, 59),
+                'created_at': datetime(2024, 1, 1, 12, 0, 0),
+                'is_active': True
+            },
+            {
+                'id': 2,
+                'user_id': 2,
+                'access_token': 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.another.token',
+                'expires_at': datetime(2024, 12, 31, 23, 59, 59),
+                'created_at': datetime(2024, 1, 2, 12, 0, 0),
+                'is_active': True
+            }
+        ]
     
-    SAMPLE_OTP_CODES = [
-        {
-            'id': 1,
-            'email': 'test@example.com',
-            'otp': '123456',
-            'created_at': datetime(2024, 1, 1, 12, 0, 0),
-            'expires_at': datetime(2024, 1, 1, 12, 5, 0),
-            'used': False
-        },
-        {
-            'id': 2,
-            'email': 'jane.smith@example.com',
-            'otp': '654321',
-            'created_at': datetime(2024, 1, 2, 10, 0, 0),
-            'expires_at': datetime(2024, 1, 2, 10, 5, 0),
-            'used': True
-        }
-    ]
+    @_lazy_rows
+    def SAMPLE_OTP_CODES():
+        return [
+            {
+                'id': 1,
+                'email': 'test@example.com',
+                'otp': '123456',
+                'created_at': datetime(2024, 1, 1, 12, 0, 0),
+                'expires_at': datetime(2024, 1, 1, 12, 5, 0),
+                'used': False
+            },
+            {
+                'id': 2,
+                'email': 'jane.smith@example.com',
+                'otp': '654321',
+                'created_at': datetime(2024, 1, 2, 10, 0, 0),
+                'expires_at': datetime(2024, 1, 2, 10, 5, 0),
+                'used': True
+            }
+        ]
     
     OPENAI_RESPONSES = {
         'story_generation': {
@@ -294,6 +356,26 @@ class SampleData:
             }
         ]
     }
+    
+    @staticmethod
+    def story_image_urls_raw(index: int) -> list:
+        """Decoded image_urls of SAMPLE_STORIES[index]."""
+        return _story_image_urls()[index].raw
+    
+    @staticmethod
+    def story_image_urls_json(index: int) -> str:
+        """image_urls of SAMPLE_STORIES[index] as stored in the database."""
+        return _story_image_urls()[index].json
+    
+    @staticmethod
+    def story_formats_raw(index: int) -> list:
+        """Decoded formats of SAMPLE_STORIES[index]."""
+        return _story_formats()[index].raw
+    
+    @staticmethod
+    def fun_facts_raw(index: int) -> list:
+        """Decoded facts of SAMPLE_FUN_FACTS[index]."""
+        return _fun_facts()[index].raw
 
 
 class MockResponses:
@@ -341,44 +423,44 @@ class TestDataBuilder:
     @staticmethod
     def create_user(user_id: int = 1, email: str = None, first_name: str = None):
         """Create a test user with optional overrides."""
-        base_user = SampleData.SAMPLE_USERS[0].copy()
+        overrides = {}
         
         if user_id:
-            base_user['id'] = user_id
+            overrides['id'] = user_id
         if email:
-            base_user['email'] = email
+            overrides['email'] = email
         if first_name:
-            base_user['first_name'] = first_name
+            overrides['first_name'] = first_name
             
-        return base_user
+        return {**SampleData.SAMPLE_USERS[0], **overrides}
     
     @staticmethod
     def create_story(story_id: int = 1, user_id: str = None, status: str = None):
         """Create a test story with optional overrides."""
-        base_story = SampleData.SAMPLE_STORIES[0].copy()
+        overrides = {}
         
         if story_id:
-            base_story['id'] = story_id
+            overrides['id'] = story_id
         if user_id:
-            base_story['user_id'] = user_id
+            overrides['user_id'] = user_id
         if status:
-            base_story['status'] = status
+            overrides['status'] = status
             
-        return base_story
+        return {**SampleData.SAMPLE_STORIES[0], **overrides}
     
     @staticmethod
     def create_avatar(avatar_id: int = 1, user_id: int = None, status: str = None):
         """Create a test avatar with optional overrides."""
-        base_avatar = SampleData.SAMPLE_AVATARS[0].copy()
+        overrides = {}
         
         if avatar_id:
-            base_avatar['id'] = avatar_id
+            overrides['id'] = avatar_id
         if user_id:
-            base_avatar['user_id'] = user_id
+            overrides['user_id'] = user_id
         if status:
-            base_avatar['status'] = status
+            overrides['status'] = status
             
-        return base_avatar
+        return {**SampleData.SAMPLE_AVATARS[0], **overrides}
     
     @staticmethod
     def create_auth_token(user_id: int = 1, expires_hours: int = 24):
@@ -1,6 +1,7 @@
 """
 Unit tests for image generation and avatar functionality.
 """
+import os
 import pytest
 from unittest.mock import patch, Mock, AsyncMock, MagicMock
 import base64
@@ -21,7 +22,7 @@ class TestImageGeneration:
         mock_s3_client.put_object = Mock(return_value={'ETag': '"test-etag"'})
         
         with patch('main.s3_client', mock_s3_client):
-            with patch('asyncio.to_thread', AsyncMock(return_value=None)):
+            with patch('main.run_s3_upload', AsyncMock(return_value=None)) as mock_upload:
                 result = await save_image_to_s3(
                     image_bytes=b"fake-image-data",
                     content_type="image/png",
@@ -31,6 +32,8 @@ class TestImageGeneration:
         
         assert result.startswith("https://mystorybuddy-assets.s3.amazonaws.com/")
         assert "test-request-id_image_1.png" in result
+        mock_upload.assert_awaited_once()
+        assert mock_upload.call_args[0][0] is mock_s3_client.put_object
     
     @pytest.mark.asyncio
     async def test_save_image_to_s3_no_client(self):
@@ -69,7 +72,7 @@ class TestImageGeneration:
         mock_s3_client.put_object = Mock(side_effect=NoCredentialsError())
         
         with patch('main.s3_client', mock_s3_client):
-            with patch('asyncio.to_thread', AsyncMock(side_effect=NoCredentialsError())):
+            with patch('main.run_s3_upload', AsyncMock(side_effect=NoCredentialsError())):
                 with pytest.raises(HTTPException) as exc_info:
                     await save_image_to_s3(
                         image_bytes=b"fake-image-data",
@@ -87,7 +90,7 @@ class TestImageGeneration:
         mock_s3_client.put_object = Mock(return_value={'ETag': '"test-etag"'})
         
         with patch('main.s3_client', mock_s3_client):
-            with patch('asyncio.to_thread', AsyncMock(return_value=None)):
+            with patch('main.run_s3_upload', AsyncMock(return_value=None)) as mock_upload:
                 result = await save_avatar_to_s3(
                     image_bytes=b"avatar-image-data",
                     user_id=123,
@@ -96,6 +99,8 @@ class TestImageGeneration:
         
         assert result.startswith("https://mystorybuddy-assets.s3.amazonaws.com/avatars/")
         assert "user_123_test-request-id.png" in result
+        mock_upload.assert_awaited_once()
+        assert mock_upload.call_args[0][0] is mock_s3_client.put_object
     
     @pytest.mark.asyncio
     async def test_save_avatar_to_s3_no_client(self):
@@ -124,10 +129,10 @@ class TestAvatarGeneration:
         from main import create_comic_avatar_and_extract_traits
         
         # Mock OpenAI responses
-        mock_openai_client.chat.completions.create.side_effect = [
-            Mock(choices=[Mock(message=Mock(content="Detailed character description from photo"))]),  # Description
-            Mock(choices=[Mock(message=Mock(content="Visual traits: Brown mouse with big ears"))])  # Traits
-        ]
+        mock_openai_client.chat.completions.create.return_value = Mock(choices=[Mock(message=Mock(content=json.dumps({
+            "character_description": "Detailed character description from photo",
+            "visual_traits_spec": "Visual traits: Brown mouse with big ears"
+        })))])
         
         mock_openai_client.images.generate.return_value = Mock(
             data=[Mock(b64_json="base64comicavatar")]
@@ -142,8 +147,35 @@ class TestAvatarGeneration:
         
         assert avatar_bytes == base64.b64decode("base64comicavatar")
         assert "Brown mouse with big ears" in visual_traits
-        assert mock_openai_client.chat.completions.create.call_count == 2
+        assert mock_openai_client.chat.completions.create.call_count == 1
         assert mock_openai_client.images.generate.call_count == 1
+        
+        # The image is generated from the description, not the traits spec
+        image_prompt = mock_openai_client.images.generate.call_args[1]["prompt"]
+        assert "Detailed character description from photo" in image_prompt
+        assert mock_openai_client.chat.completions.create.call_args[1]["response_format"] == {"type": "json_object"}
+    
+    @pytest.mark.asyncio
+    async def test_create_comic_avatar_non_json_analysis(self, mock_openai_client):
+        """Test a plain-text analysis is used for both the description and the traits."""
+        from main import create_comic_avatar_and_extract_traits
+        
+        mock_openai_client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content="Brown mouse with big ears"))]
+        )
+        mock_openai_client.images.generate.return_value = Mock(
+            data=[Mock(b64_json="base64comicavatar")]
+        )
+        
+        _, visual_traits = await create_comic_avatar_and_extract_traits(
+            uploaded_image_bytes=b"fake-photo-data",
+            avatar_name="Benny",
+            traits_description="Brave mouse",
+            request_id="test-request-id"
+        )
+        
+        assert visual_traits == "Brown mouse with big ears"
+        assert "Brown mouse with big ears" in mock_openai_client.images.generate.call_args[1]["prompt"]
     
     @pytest.mark.asyncio
     async def test_create_comic_avatar_no_image_data(self):
@@ -162,16 +194,155 @@ class TestAvatarGeneration:
         assert exc_info.value.status_code == 400
         assert "No image data provided" in str(exc_info.value.detail)
     
+    def test_downscale_for_vision_large_photo(self):
+        """Test large photos are shrunk to the vision size cap as JPEG."""
+        from main import downscale_for_vision, VISION_MAX_DIMENSION
+        from PIL import Image
+        
+        photo = BytesIO()
+        Image.new("RGB", (3000, 2000), "red").save(photo, "PNG")
+        
+        resized = downscale_for_vision(photo.getvalue())
+        
+        with Image.open(BytesIO(resized)) as img:
+            assert img.format == "JPEG"
+            assert max(img.size) == VISION_MAX_DIMENSION
+    
+    def test_downscale_for_vision_unreadable_data(self):
+        """Test data Pillow can't decode is passed through unchanged."""
+        from main import downscale_for_vision
+        
+        assert downscale_for_vision(b"fake-photo-data") == b"fake-photo-data"
+    
+    @pytest.mark.asyncio
+    async def test_read_image_upload_rejects_by_declared_size(self):
+        """Test oversized uploads are rejected before any bytes are read."""
+        from main import read_image_upload, AVATAR_MAX_UPLOAD_BYTES
+        from fastapi import HTTPException
+        
+        image = Mock(size=AVATAR_MAX_UPLOAD_BYTES + 1, read=AsyncMock())
+        
+        with pytest.raises(HTTPException) as exc_info:
+            await read_image_upload(image)
+        
+        assert exc_info.value.status_code == 400
+        image.read.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_read_image_upload_rejects_non_image_bytes(self):
+        """Test uploads are checked by magic bytes, not the declared content type."""
+        from main import read_image_upload, sniff_image_type
+        from fastapi import HTTPException
+
+        assert sniff_image_type(b"\x89PNG\r\n\x1a\n" + b"\x00" * 8) == "image/png"
+        assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+
+        image = Mock(size=None, content_type="image/jpeg", read=AsyncMock(side_effect=[b"<html>not an image", b""]))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await read_image_upload(image)
+
+        assert exc_info.value.status_code == 400
+        image.read.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_upload_limit_rejects_by_content_length(self):
+        """Test oversized avatar uploads get a 413 before the app sees the body."""
+        from main import UploadSizeLimitMiddleware
+
+        inner_app = AsyncMock()
+        receive = AsyncMock()
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = UploadSizeLimitMiddleware(inner_app, path_prefix="/personalization/avatar", max_bytes=100)
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/personalization/avatar",
+            "headers": [(b"content-length", b"101")]
+        }
+        await middleware(scope, receive, send)
+
+        assert sent[0]["status"] == 413
+        inner_app.assert_not_awaited()
+        receive.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_stream_avatar_status_wakes_on_completion(self):
+        """Test the status stream sends one event per status change and ends when done."""
+        from main import stream_avatar_status, notify_avatar_status
+        
+        avatar = {
+            "id": 5,
+            "avatar_name": "Benny",
+            "traits_description": "Brave mouse",
+            "s3_image_url": "",
+            "status": "IN_PROGRESS",
+            "created_at": datetime(2024, 1, 1),
+            "updated_at": datetime(2024, 1, 1)
+        }
+        completed = dict(avatar, status="COMPLETED", s3_image_url="https://s3/avatar.png")
+        req = Mock(is_disconnected=AsyncMock(return_value=False))
+        
+        with patch('core.database.get_user_avatar', AsyncMock(side_effect=[avatar, completed])):
+            response = await stream_avatar_status(5, req, current_user={"id": 1})
+            messages = []
+            async for message in response.body_iterator:
+                messages.append(message)
+                if len(messages) == 1:
+                    notify_avatar_status(5)
+        
+        assert response.media_type == "text/event-stream"
+        assert len(messages) == 2
+        assert messages[0].startswith("event: status\n")
+        assert '"status": "IN_PROGRESS"' in messages[0]
+        assert '"status": "COMPLETED"' in messages[1]
+        assert '"created_at": "2024-01-01T00:00:00"' in messages[1]
+    
+    @pytest.mark.asyncio
+    async def test_stream_avatar_status_waits_again_after_notify(self):
+        """Test a notify that doesn't change the status doesn't leave the stream spinning."""
+        from main import stream_avatar_status, notify_avatar_status, avatar_status_events
+        
+        avatar = {
+            "id": 5,
+            "avatar_name": "Benny",
+            "traits_description": "Brave mouse",
+            "s3_image_url": "",
+            "status": "IN_PROGRESS",
+            "created_at": datetime(2024, 1, 1),
+            "updated_at": datetime(2024, 1, 1)
+        }
+        completed = dict(avatar, status="COMPLETED")
+        req = Mock(is_disconnected=AsyncMock(return_value=False))
+        
+        with patch('core.database.get_user_avatar', AsyncMock(side_effect=[avatar, avatar, completed])), \
+             patch('main.AVATAR_EVENTS_RECHECK_SECONDS', 0.01):
+            response = await stream_avatar_status(5, req, current_user={"id": 1})
+            messages = []
+            async for message in response.body_iterator:
+                messages.append(message)
+                if len(messages) == 1:
+                    notify_avatar_status(5)
+        
+        # The unchanged status after the notify waits out a recheck instead of re-querying at once
+        assert messages[1] == ": keep-alive\n\n"
+        assert '"status": "COMPLETED"' in messages[2]
+        assert 5 not in avatar_status_events
+    
     @pytest.mark.asyncio
     async def test_generate_avatar_background_task_success(self, mock_openai_client, mock_s3_client, mock_db_manager):
         """Test successful avatar generation in background task."""
         from main import generate_avatar_background_task
         
         # Mock avatar generation
-        mock_openai_client.chat.completions.create.side_effect = [
-            Mock(choices=[Mock(message=Mock(content="Character description"))]),
-            Mock(choices=[Mock(message=Mock(content="Visual traits description"))])
-        ]
+        mock_openai_client.chat.completions.create.return_value = Mock(choices=[Mock(message=Mock(content=json.dumps({
+            "character_description": "Character description",
+            "visual_traits_spec": "Visual traits description"
+        })))])
         mock_openai_client.images.generate.return_value = Mock(
             data=[Mock(b64_json="avatarbase64")]
         )
@@ -189,7 +360,7 @@ class TestAvatarGeneration:
                 )
         
         # Verify avatar was processed
-        assert mock_openai_client.chat.completions.create.call_count == 2
+        assert mock_openai_client.chat.completions.create.call_count == 1
         assert mock_openai_client.images.generate.call_count == 1
     
     @pytest.mark.asyncio
@@ -238,10 +409,10 @@ class TestAvatarGeneration:
         mock_db_manager.get_connection.return_value.__aenter__.return_value = mock_conn
         
         # Mock OpenAI responses
-        mock_openai_client.chat.completions.create.side_effect = [
-            Mock(choices=[Mock(message=Mock(content="Character description"))]),
-            Mock(choices=[Mock(message=Mock(content="Visual traits"))])
-        ]
+        mock_openai_client.chat.completions.create.return_value = Mock(choices=[Mock(message=Mock(content=json.dumps({
+            "character_description": "Character description",
+            "visual_traits_spec": "Visual traits"
+        })))])
         mock_openai_client.images.generate.return_value = Mock(
             data=[Mock(b64_json="avatardata")]
         )
@@ -251,7 +422,7 @@ class TestAvatarGeneration:
             
             with patch('main.save_avatar_to_s3', AsyncMock(return_value="https://s3/avatar.png")):
                 # Create image file
-                image_data = BytesIO(b"fake-image-data")
+                image_data = BytesIO(b"\xff\xd8\xfffake-image-data")
                 files = {"image": ("avatar.jpg", image_data, "image/jpeg")}
                 data = {
                     "avatar_name": "Benny",
@@ -306,4 +477,52 @@ class TestAvatarGeneration:
         image_call = mock_openai_client.images.generate.call_args[1]
         assert "comic book/cartoon style" in image_call['prompt']
         assert "Pixar/Disney" in image_call['prompt']
-        assert "children aged 3-5" in image_call['prompt']
\ No newline at end of file
+        assert "children aged 3-5" in image_call['prompt']
+
+
+class TestAvatarWorkers:
+    """Test the avatar generation worker pool."""
+    
+    @pytest.mark.asyncio
+    async def test_avatar_workers_process_queued_jobs(self):
+        """Test stale avatars are failed on start and queued jobs are run by the workers."""
+        import main
+        
+        job = {
+            "avatar_id": 1,
+            "image_bytes": b"\xff\xd8\xfffake-image",
+            "avatar_name": "Benny",
+            "traits_description": "Brave mouse",
+            "request_id": "test-request-id",
+            "user_id": 1
+        }
+        
+        with patch('main.generate_avatar_background_task', new_callable=AsyncMock) as mock_task, \
+             patch('core.database.fail_stale_avatars', AsyncMock(return_value=0)) as mock_fail_stale, \
+             patch('main.AVATAR_WORKERS', 2):
+            await main.start_avatar_workers()
+            try:
+                assert len(main.avatar_worker_tasks) == 2
+                main.avatar_queue.put_nowait(job)
+                await main.avatar_queue.join()
+            finally:
+                await main.stop_avatar_workers()
+                main.avatar_queue = None
+        
+        mock_fail_stale.assert_awaited_once_with(main.core_db.AVATAR_STALE_MINUTES)
+        mock_task.assert_awaited_once_with(**job)
+        assert main.avatar_worker_tasks == []
+    
+    @pytest.mark.asyncio
+    async def test_avatar_workers_skip_sweep_done_by_master(self):
+        """Test workers don't repeat the stale avatar sweep the gunicorn master already ran."""
+        import main
+        
+        with patch('core.database.fail_stale_avatars', new_callable=AsyncMock) as mock_fail_stale, \
+             patch.dict(os.environ, {"STALE_AVATARS_SWEPT": "1"}):
+            await main.start_avatar_workers()
+            try:
+                mock_fail_stale.assert_not_awaited()
+            finally:
+                await main.stop_avatar_workers()
+                main.avatar_queue = None
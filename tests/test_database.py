@@ -260,19 +260,56 @@ class TestStoryOperations:
         
         assert count == 5
     
+    @pytest.mark.asyncio
+    async def test_get_stories_with_new_count(self, mock_db_manager):
+        """Test stories and new count come back from a single query."""
+        from core.database import get_stories_with_new_count
+        
+        mock_db_manager.execute_query.return_value = [
+            {"id": 2, "image_urls": '["url1"]', "formats": '["Comic Book"]', "status": "NEW", "new_count": 1},
+            {"id": 1, "image_urls": None, "formats": None, "status": "VIEWED", "new_count": 1}
+        ]
+        
+        with patch('core.database.db_manager', mock_db_manager):
+            stories, new_count = await get_stories_with_new_count(user_id="1", limit=50)
+        
+        assert new_count == 1
+        assert [story["id"] for story in stories] == [2, 1]
+        assert stories[0]["image_urls"] == ["url1"]
+        assert "new_count" not in stories[0]
+        assert mock_db_manager.execute_query.call_count == 1
+    
     @pytest.mark.asyncio
     async def test_cleanup_invalid_stories(self, mock_db_manager):
         """Test cleanup of invalid stories."""
         from core.database import cleanup_invalid_stories
         
-        mock_db_manager.execute_query.return_value = [{"count": 10}]
-        mock_db_manager.execute_update.return_value = 10
+        mock_db_manager.execute_update.return_value = 10  # Single partial batch
         
         with patch('core.database.db_manager', mock_db_manager):
             result = await cleanup_invalid_stories()
         
         assert result["deleted_count"] == 10
         assert "Successfully cleaned up 10" in result["message"]
+        
+        # Delete runs straight from the predicate, without selecting ids first
+        delete_query = mock_db_manager.execute_update.call_args[0][0]
+        assert delete_query.startswith("DELETE FROM stories WHERE (")
+        assert "LIMIT" in delete_query
+        mock_db_manager.execute_query.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_cleanup_invalid_stories_in_batches(self, mock_db_manager):
+        """Test cleanup deletes in bounded batches until a partial batch."""
+        from core.database import cleanup_invalid_stories, CLEANUP_BATCH_SIZE
+        
+        mock_db_manager.execute_update.side_effect = [CLEANUP_BATCH_SIZE, 3]
+        
+        with patch('core.database.db_manager', mock_db_manager):
+            result = await cleanup_invalid_stories()
+        
+        assert result["deleted_count"] == CLEANUP_BATCH_SIZE + 3
+        assert mock_db_manager.execute_update.call_count == 2
 
 
 class TestAvatarOperations:
@@ -288,9 +325,11 @@ class TestAvatarOperations:
         mock_db_manager.execute_update.return_value = 1
         
         # Mock connection and cursor for direct database access
+        created_at = datetime(2024, 1, 1, 12, 0, 0)
         mock_cursor = AsyncMock()
-        mock_cursor.lastrowid = 999
         mock_cursor.execute = AsyncMock()
+        mock_cursor.fetchone = AsyncMock(return_value=(created_at, created_at))
+        mock_cursor.lastrowid = 999
         mock_cursor.rowcount = 1
         
         mock_conn = AsyncMock()
@@ -305,15 +344,59 @@ class TestAvatarOperations:
         mock_db_manager.get_connection = Mock(return_value=mock_connection_cm)
         
         with patch('core.database.db_manager', mock_db_manager):
-            avatar_id = await create_user_avatar(
+            avatar = await create_user_avatar(
                 user_id=1,
                 avatar_name="TestAvatar",
                 traits_description="Test traits",
                 s3_image_url="https://s3/avatar.png",
-                visual_traits="Visual description"
+                visual_traits="Visual description",
+                with_timestamps=True
+            )
+        
+        assert avatar["id"] == 999
+        assert avatar["avatar_name"] == "TestAvatar"
+        assert avatar["s3_image_url"] == "https://s3/avatar.png"
+        assert avatar["created_at"] == avatar["updated_at"] == created_at
+        
+        # Timestamps come from the column defaults, read back by ID
+        insert_sql, insert_params = mock_cursor.execute.await_args_list[0][0]
+        assert "created_at" not in insert_sql
+        assert mock_cursor.execute.await_args_list[1][0][1] == (999,)
+    
+    @pytest.mark.asyncio
+    async def test_create_user_avatar_without_timestamps(self, mock_db_manager):
+        """Test creating an avatar placeholder runs no query after the insert."""
+        from core.database import create_user_avatar
+        
+        mock_db_manager.execute_query.return_value = [{"id": 1}]
+        mock_db_manager.execute_update.return_value = 1
+        
+        mock_cursor = AsyncMock()
+        mock_cursor.execute = AsyncMock()
+        mock_cursor.lastrowid = 999
+        mock_cursor.rowcount = 1
+        
+        mock_conn = AsyncMock()
+        mock_conn.cursor = Mock()
+        mock_conn.cursor.return_value.__aenter__ = AsyncMock(return_value=mock_cursor)
+        mock_conn.cursor.return_value.__aexit__ = AsyncMock(return_value=None)
+        
+        mock_connection_cm = AsyncMock()
+        mock_connection_cm.__aenter__ = AsyncMock(return_value=mock_conn)
+        mock_connection_cm.__aexit__ = AsyncMock(return_value=None)
+        mock_db_manager.get_connection = Mock(return_value=mock_connection_cm)
+        
+        with patch('core.database.db_manager', mock_db_manager):
+            avatar = await create_user_avatar(
+                user_id=1,
+                avatar_name="TestAvatar",
+                traits_description="Test traits",
+                status="IN_PROGRESS"
             )
         
-        assert avatar_id == 999
+        assert avatar["id"] == 999
+        assert avatar["created_at"] is None
+        mock_cursor.execute.assert_awaited_once()
     
     @pytest.mark.asyncio
     async def test_get_user_avatar(self, mock_db_manager):
@@ -343,21 +426,46 @@ class TestAvatarOperations:
         from core.database import update_user_avatar
         
         mock_db_manager.execute_update.return_value = 1
+        mock_db_manager.execute_query.return_value = [{
+            "id": 7,
+            "avatar_name": "Updated Name",
+            "traits_description": "Updated traits",
+            "s3_image_url": "https://s3/avatar.png",
+            "created_at": datetime(2024, 1, 1),
+            "updated_at": datetime(2024, 1, 2)
+        }]
         
         with patch('core.database.db_manager', mock_db_manager):
-            success = await update_user_avatar(
+            avatar = await update_user_avatar(
                 user_id=1,
                 avatar_name="Updated Name",
                 traits_description="Updated traits"
             )
         
-        assert success is True
+        assert avatar["id"] == 7
+        assert avatar["avatar_name"] == "Updated Name"
+        assert avatar["updated_at"] == datetime(2024, 1, 2)
         
         # Verify update query
         call_args = mock_db_manager.execute_update.call_args[0]
         assert "UPDATE user_avatars" in call_args[0]
         assert "avatar_name = %s" in call_args[0]
         assert "traits_description = %s" in call_args[0]
+        assert "updated_at = CURRENT_TIMESTAMP" in call_args[0]
+        assert call_args[1][-1] == 1
+    
+    @pytest.mark.asyncio
+    async def test_update_user_avatar_without_active_avatar(self, mock_db_manager):
+        """Test updating when the user has no active avatar skips the read-back."""
+        from core.database import update_user_avatar
+        
+        mock_db_manager.execute_update.return_value = 0
+        
+        with patch('core.database.db_manager', mock_db_manager):
+            avatar = await update_user_avatar(user_id=1, avatar_name="Updated Name")
+        
+        assert avatar is None
+        mock_db_manager.execute_query.assert_not_called()
     
     @pytest.mark.asyncio
     async def test_update_avatar_status_with_traits(self, mock_db_manager):
@@ -382,6 +490,22 @@ class TestAvatarOperations:
         assert "s3_image_url = %s" in call_args[0]
         assert "visual_traits = %s" in call_args[0]
     
+    @pytest.mark.asyncio
+    async def test_fail_stale_avatars(self, mock_db_manager):
+        """Test orphaned IN_PROGRESS avatars are marked FAILED by age."""
+        from core.database import fail_stale_avatars
+        
+        mock_db_manager.execute_update.return_value = 2
+        
+        with patch('core.database.db_manager', mock_db_manager):
+            failed = await fail_stale_avatars(15)
+        
+        assert failed == 2
+        query, params = mock_db_manager.execute_update.call_args[0]
+        assert "status = 'FAILED'" in query
+        assert "status = 'IN_PROGRESS'" in query
+        assert params == (15,)
+    
     @pytest.mark.asyncio
     async def test_get_completed_avatars_count(self, mock_db_manager):
         """Test getting count of completed avatars."""
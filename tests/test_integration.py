@@ -262,8 +262,10 @@ class TestAvatarCreationWorkflow:
         
         # Mock OpenAI for avatar generation
         mock_openai_client.chat.completions.create.side_effect = [
-            Mock(choices=[Mock(message=Mock(content="Character description"))]),
-            Mock(choices=[Mock(message=Mock(content="Visual traits"))])
+            Mock(choices=[Mock(message=Mock(content=json.dumps({
+                "character_description": "Character description",
+                "visual_traits_spec": "Visual traits"
+            })))])
         ]
         mock_openai_client.images.generate.return_value = Mock(data=[Mock(b64_json="avatardata")])
         
@@ -272,7 +274,7 @@ class TestAvatarCreationWorkflow:
             
             # Step 1: Create avatar
             with patch('main.save_avatar_to_s3', AsyncMock(return_value="https://s3/avatar.png")):
-                files = {"image": ("avatar.jpg", b"fake-image-data", "image/jpeg")}
+                files = {"image": ("avatar.jpg", b"\xff\xd8\xfffake-image-data", "image/jpeg")}
                 data = {
                     "avatar_name": "Benny",
                     "traits_description": "Brave mouse"
@@ -339,7 +341,7 @@ class TestAvatarCreationWorkflow:
             mock_jwt.verify_token.return_value = {"user_id": 1}
             
             # Step 1: Start async avatar creation
-            files = {"image": ("avatar.jpg", b"fake-image-data", "image/jpeg")}
+            files = {"image": ("avatar.jpg", b"\xff\xd8\xfffake-image-data", "image/jpeg")}
             data = {
                 "avatar_name": "Async Benny",
                 "traits_description": "Async mouse"
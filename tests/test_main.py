@@ -66,18 +66,21 @@ class TestStoryGeneration:
     
     @pytest.mark.asyncio
     async def test_generate_story_duplicate_request(self, test_client, mock_db_manager, sample_story_request):
-        """Test duplicate story request within cooldown period."""
+        """Test duplicate story request while the first is still generating."""
         mock_db_manager.execute_update.return_value = 1
         mock_db_manager.execute_query.return_value = [{"id": 125}]
         
-        # First request
-        response1 = test_client.post("/generateStory", json=sample_story_request)
-        assert response1.status_code == 200
+        with patch('main.generate_story_background_task', new_callable=AsyncMock):
+            # First request
+            response1 = test_client.post("/generateStory", json=sample_story_request)
+            assert response1.status_code == 200
+            
+            # Immediate duplicate request tracks the in-flight story
+            response2 = test_client.post("/generateStory", json=sample_story_request)
         
-        # Immediate duplicate request
-        response2 = test_client.post("/generateStory", json=sample_story_request)
-        assert response2.status_code == 429
-        assert "wait a moment" in response2.json()["detail"]
+        assert response2.status_code == 200
+        assert response2.json()["story_id"] == 125
+        assert response2.json()["status"] == "IN_PROGRESS"
     
     @pytest.mark.asyncio
     async def test_get_story_status_success(self, test_client, mock_db_manager):
@@ -122,6 +125,20 @@ class TestStoryGeneration:
         
         assert response.status_code == 200
         assert response.json()["message"] == "Story marked as viewed"
+    
+    @pytest.mark.asyncio
+    async def test_mark_story_viewed_invalidates_owner_cache(self, test_client, mock_db_manager):
+        """Test marking a story as viewed drops its owner's cached story list."""
+        from main import my_stories_cache
+        
+        my_stories_cache.set("7", b"[]")
+        mock_db_manager.execute_update.return_value = 1
+        mock_db_manager.execute_query.return_value = [{"user_id": "7"}]
+        
+        response = test_client.put("/story/123/viewed")
+        
+        assert response.status_code == 200
+        assert my_stories_cache.get("7") is None
 
 
 class TestFunFacts:
@@ -162,6 +179,30 @@ A: Yes! Every story takes you on a magical adventure in your mind."""
         assert "facts" in data
         assert len(data["facts"]) > 0
 
+    
+    def test_parse_fun_facts_handles_blank_lines(self):
+        """Test Q/A pairs are parsed even with blank lines between question and answer."""
+        from main import parse_fun_facts
+        
+        content = "Q: Did you know owls can turn their heads?\n\nA: Yes! Almost all the way around.\n\nQ: Did you know bees dance?\nA: They do!"
+        
+        facts = parse_fun_facts(content)
+        
+        assert [(f.question, f.answer) for f in facts] == [
+            ("Did you know owls can turn their heads?", "Yes! Almost all the way around."),
+            ("Did you know bees dance?", "They do!")
+        ]
+    
+    def test_parse_fun_facts_ignores_trailing_prose(self):
+        """Test text the model adds after the last answer isn't folded into it."""
+        from main import parse_fun_facts
+        
+        content = "Q: Did you know owls hoot?\nA: Whoo!\n\nI hope these make you smile!"
+        
+        facts = parse_fun_facts(content)
+        
+        assert [(f.question, f.answer) for f in facts] == [("Did you know owls hoot?", "Whoo!")]
+
 
 class TestUserStories:
     """Test user stories endpoints."""
@@ -179,12 +220,12 @@ class TestUserStories:
             "formats": json.dumps(["Comic Book"]),
             "created_at": datetime.now(),
             "updated_at": datetime.now(),
-            "status": "NEW"
+            "status": "NEW",
+            "new_count": 1
         }]
         mock_db_manager.execute_query.side_effect = [
             [{"id": 1, "email": "test@example.com"}],  # User lookup
-            mock_stories,  # Stories
-            [{"count": 1}]  # New stories count
+            mock_stories  # Stories with the new stories count
         ]
         
         # Mock JWT verification
@@ -197,6 +238,7 @@ class TestUserStories:
         data = response.json()
         assert "stories" in data
         assert len(data["stories"]) == 1
+        assert data["stories"][0]["created_at"] == mock_stories[0]["created_at"].isoformat()
         assert data["new_stories_count"] == 1
     
     @pytest.mark.asyncio
@@ -206,6 +248,56 @@ class TestUserStories:
         
         assert response.status_code == 401
         assert response.json()["error"] == "Authentication required"
+    
+    @pytest.mark.asyncio
+    async def test_require_user_caches_user_lookup(self):
+        """Test repeat requests from the same user skip the database lookup."""
+        from main import require_user
+        
+        req = Mock()
+        req.headers = {"Authorization": "Bearer test-token"}
+        
+        with patch('main.JWTUtils') as mock_jwt, \
+             patch('main.UserDatabase.get_user_by_id', new_callable=AsyncMock, return_value={"id": 1}) as mock_get_user:
+            mock_jwt.verify_token.return_value = {"user_id": 1}
+            
+            assert await require_user(req) == {"id": 1}
+            assert await require_user(req) == {"id": 1}
+        
+        mock_get_user.assert_awaited_once_with(1)
+    
+    def test_verify_token_cached(self):
+        """Test valid tokens are verified once and rejected tokens are not cached."""
+        import time
+        from main import verify_token_cached
+        
+        with patch('main.JWTUtils') as mock_jwt:
+            mock_jwt.verify_token.return_value = {"user_id": 1, "exp": time.time() + 3600}
+            assert verify_token_cached("good-token")["user_id"] == 1
+            assert verify_token_cached("good-token")["user_id"] == 1
+            assert mock_jwt.verify_token.call_count == 1
+            
+            mock_jwt.verify_token.return_value = None
+            assert verify_token_cached("bad-token") is None
+            assert verify_token_cached("bad-token") is None
+            assert mock_jwt.verify_token.call_count == 3
+    
+    @pytest.mark.asyncio
+    async def test_my_stories_cached_until_invalidated(self):
+        """Test repeat polls are served from cache until the user's stories change."""
+        from main import get_user_stories, invalidate_my_stories_cache
+        
+        with patch('core.database.get_stories_with_new_count', new_callable=AsyncMock, return_value=([], 0)) as mock_stories:
+            first = await get_user_stories(Mock(), current_user={"id": 1})
+            second = await get_user_stories(Mock(), current_user={"id": 1})
+            
+            assert second.body == first.body
+            assert mock_stories.await_count == 1
+            
+            invalidate_my_stories_cache(1)
+            await get_user_stories(Mock(), current_user={"id": 1})
+            
+            assert mock_stories.await_count == 2
 
 
 class TestAvatarEndpoints:
@@ -234,7 +326,7 @@ class TestAvatarEndpoints:
             mock_jwt_class.verify_token.return_value = {"user_id": 1}
             
             # Create multipart form data
-            files = {"image": ("test.jpg", b"fake-image-data", "image/jpeg")}
+            files = {"image": ("test.jpg", b"\xff\xd8\xfffake-image-data", "image/jpeg")}
             data = {
                 "avatar_name": "Benny",
                 "traits_description": "Brave mouse"
@@ -317,7 +409,7 @@ class TestAvatarEndpoints:
         with patch('main.JWTUtils') as mock_jwt_class:
             mock_jwt_class.verify_token.return_value = {"user_id": 1}
             
-            files = {"image": ("test.jpg", b"fake-image-data", "image/jpeg")}
+            files = {"image": ("test.jpg", b"\xff\xd8\xfffake-image-data", "image/jpeg")}
             data = {
                 "avatar_name": "Async Benny",
                 "traits_description": "Async mouse"
@@ -340,32 +432,38 @@ class TestAvatarEndpoints:
 class TestCORSAndPreflight:
     """Test CORS and preflight handling."""
     
+    PREFLIGHT_HEADERS = {
+        "Origin": "https://www.mystorybuddy.com",
+        "Access-Control-Request-Method": "POST"
+    }
+    
     @pytest.mark.asyncio
     async def test_preflight_generate_story(self, test_client):
         """Test OPTIONS request for generateStory."""
-        response = test_client.options("/generateStory")
+        response = test_client.options("/generateStory", headers=self.PREFLIGHT_HEADERS)
         assert response.status_code == 200
         assert "Access-Control-Allow-Origin" in response.headers
         assert "Access-Control-Allow-Methods" in response.headers
+        assert response.headers["Access-Control-Max-Age"] == "86400"
     
     @pytest.mark.asyncio
     async def test_preflight_fun_facts(self, test_client):
         """Test OPTIONS request for generateFunFacts."""
-        response = test_client.options("/generateFunFacts")
+        response = test_client.options("/generateFunFacts", headers=self.PREFLIGHT_HEADERS)
         assert response.status_code == 200
         assert "Access-Control-Allow-Origin" in response.headers
     
     @pytest.mark.asyncio
     async def test_preflight_my_stories(self, test_client):
         """Test OPTIONS request for my-stories."""
-        response = test_client.options("/my-stories")
+        response = test_client.options("/my-stories", headers=self.PREFLIGHT_HEADERS)
         assert response.status_code == 200
         assert "Access-Control-Allow-Origin" in response.headers
     
     @pytest.mark.asyncio
     async def test_preflight_avatar(self, test_client):
         """Test OPTIONS request for avatar endpoints."""
-        response = test_client.options("/personalization/avatar")
+        response = test_client.options("/personalization/avatar", headers=self.PREFLIGHT_HEADERS)
         assert response.status_code == 200
         assert "Access-Control-Allow-Origin" in response.headers
         assert "Access-Control-Allow-Methods" in response.headers
@@ -375,27 +473,20 @@ class TestAdminEndpoints:
     """Test admin endpoints."""
     
     @pytest.mark.asyncio
-    async def test_cleanup_invalid_stories(self, test_client, mock_db_manager):
-        """Test cleanup of invalid stories."""
-        # Mock cleanup results
-        mock_db_manager.execute_query.return_value = [{"count": 5}]
-        mock_db_manager.execute_update.return_value = 5
-        
-        response = test_client.post("/admin/cleanup-stories")
-        
-        assert response.status_code == 200
-        data = response.json()
-        assert data["deleted_count"] == 5
-        assert "Successfully cleaned up 5 invalid stories" in data["message"]
+    async def test_cleanup_invalid_stories(self, test_client):
+        """Test cleanup is scheduled and runs after the response."""
+        with patch('core.database.cleanup_invalid_stories', AsyncMock(return_value={"deleted_count": 5})) as mock_cleanup:
+            response = test_client.post("/admin/cleanup-stories")
+        
+        assert response.status_code == 202
+        assert response.json() == {"status": "scheduled"}
+        mock_cleanup.assert_awaited_once()
     
     @pytest.mark.asyncio
-    async def test_cleanup_no_invalid_stories(self, test_client, mock_db_manager):
-        """Test cleanup when no invalid stories exist."""
-        mock_db_manager.execute_query.return_value = [{"count": 0}]
-        
-        response = test_client.post("/admin/cleanup-stories")
+    async def test_cleanup_failure_after_response(self, test_client):
+        """Test a failing background cleanup doesn't surface as an error."""
+        with patch('core.database.cleanup_invalid_stories', AsyncMock(side_effect=Exception("DB down"))) as mock_cleanup:
+            response = test_client.post("/admin/cleanup-stories")
         
-        assert response.status_code == 200
-        data = response.json()
-        assert data["deleted_count"] == 0
-        assert data["message"] == "No invalid stories found"
\ No newline at end of file
+        assert response.status_code == 202
+        mock_cleanup.assert_awaited_once()
\ No newline at end of file
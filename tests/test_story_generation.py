@@ -114,19 +114,14 @@ class TestStoryGeneration:
         """Test story breakdown into 4 comic parts."""
         from main import generate_story_images
         
-        # Mock story breakdown response
-        breakdown_content = """Part 1: Introduction
----PART BREAK---
-Part 2: Development
----PART BREAK---
-Part 3: Climax
----PART BREAK---
-Part 4: Resolution"""
+        # Mock combined breakdown + consistency guide response
+        plan_content = json.dumps({
+            "parts": ["Part 1: Introduction", "Part 2: Development", "Part 3: Climax", "Part 4: Resolution"],
+            "style_guide": "Character description"
+        })
         
         mock_openai_client.chat.completions.create.side_effect = [
-            Mock(choices=[Mock(message=Mock(content=breakdown_content))]),  # Breakdown
-            Mock(choices=[Mock(message=Mock(content="Character description"))]),  # Consistency
-            *[Mock(choices=[Mock(message=Mock(content=f"Image {i} prompt"))]) for i in range(4)]  # Image prompts
+            Mock(choices=[Mock(message=Mock(content=plan_content))]),  # Breakdown + consistency
         ]
         
         # Mock image generation
@@ -142,6 +137,16 @@ Part 4: Resolution"""
         
         assert len(result) == 4
         assert all(url.startswith("https://") for url in result)
+        
+        # Breakdown and guide come from a single JSON-mode completion
+        assert mock_openai_client.chat.completions.create.call_count == 1
+        call_kwargs = mock_openai_client.chat.completions.create.call_args[1]
+        assert call_kwargs["response_format"] == {"type": "json_object"}
+        
+        # Each image prompt carries its story part and the shared guide
+        image_prompts = [c[1]["prompt"] for c in mock_openai_client.images.generate.call_args_list]
+        assert any("Part 3: Climax" in p for p in image_prompts)
+        assert all("Character description" in p for p in image_prompts)
     
     @pytest.mark.asyncio
     async def test_generate_story_images_fallback_breakdown(self, mock_openai_client):
@@ -151,8 +156,6 @@ Part 4: Resolution"""
         # Mock invalid breakdown response
         mock_openai_client.chat.completions.create.side_effect = [
             Mock(choices=[Mock(message=Mock(content="Invalid breakdown with only 2 parts"))]),  # Bad breakdown
-            Mock(choices=[Mock(message=Mock(content="Character description"))]),  # Consistency
-            *[Mock(choices=[Mock(message=Mock(content=f"Image {i} prompt"))]) for i in range(4)]  # Image prompts
         ]
         
         # Mock image generation
@@ -278,4 +281,34 @@ Part 4: Resolution"""
         
         # Verify each image has unique index in URL
         for i, url in enumerate(result):
-            assert f"image{i+1}.png" in url
\ No newline at end of file
+            assert f"image{i+1}.png" in url
+
+class TestStoryWorkers:
+    """Test the story generation worker pool."""
+    
+    @pytest.mark.asyncio
+    async def test_story_workers_process_queued_jobs(self):
+        """Test queued story jobs are run by the workers and drained on shutdown."""
+        import main
+        
+        job = {
+            "story_id": 1,
+            "prompt": "A brave mouse",
+            "formats": ["Text Story"],
+            "request_id": "test-request-id",
+            "user_id": None
+        }
+        
+        with patch('main.generate_story_background_task', new_callable=AsyncMock) as mock_task, \
+             patch('main.STORY_WORKERS', 2):
+            main.start_story_workers()
+            try:
+                assert len(main.story_worker_tasks) == 2
+                main.story_queue.put_nowait(job)
+                await main.story_queue.join()
+            finally:
+                await main.stop_story_workers()
+                main.story_queue = None
+        
+        mock_task.assert_awaited_once_with(**job)
+        assert main.story_worker_tasks == []
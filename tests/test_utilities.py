@@ -5,7 +5,6 @@ import pytest
 from unittest.mock import patch, Mock, AsyncMock
 from datetime import datetime
 from fastapi import HTTPException, Request
-from fastapi.responses import JSONResponse
 import json
 
 
@@ -14,19 +13,32 @@ class TestHelperFunctions:
     
     def test_cors_error_response(self):
         """Test CORS error response generation."""
-        from main import cors_error_response
+        from main import cors_error_response, FastJSONResponse
         
         response = cors_error_response("Test error", 400)
         
-        assert isinstance(response, JSONResponse)
+        assert isinstance(response, FastJSONResponse)
         assert response.status_code == 400
-        assert response.headers["Access-Control-Allow-Origin"] == "https://www.mystorybuddy.com"
-        assert response.headers["Access-Control-Allow-Methods"] == "POST, OPTIONS"
+        # CORS headers come from CORSMiddleware, not the response itself
+        assert "Access-Control-Allow-Origin" not in response.headers
         
         # Check body content
         body = json.loads(response.body)
         assert body["detail"] == "Test error"
     
+    def test_image_base64_helpers_match_stdlib(self):
+        """Test the image base64 helpers produce the same bytes as the stdlib."""
+        import base64
+        import os
+        from main import b64encode_image, b64decode_image
+        
+        data = os.urandom(256 * 1024 + 7)
+        encoded = b64encode_image(data)
+        
+        assert encoded == base64.b64encode(data)
+        assert b64decode_image(encoded) == data
+        assert b64decode_image(encoded.decode("ascii")) == data
+    
     def test_log_request_details(self, mock_request, caplog):
         """Test request logging."""
         from main import log_request_details
@@ -43,6 +55,19 @@ class TestHelperFunctions:
         assert "Request Method: POST" in caplog.text
         assert "Request Client: 192.168.1.1" in caplog.text
     
+    def test_log_request_details_redacts_sensitive_headers(self, mock_request, caplog):
+        """Test auth headers are not written to the logs."""
+        from main import log_request_details
+        
+        mock_request.headers = {"Authorization": "Bearer secret-token", "Cookie": "session=abc", "Accept": "text/html"}
+        
+        log_request_details(mock_request, "test-request-id")
+        
+        assert "secret-token" not in caplog.text
+        assert "session=abc" not in caplog.text
+        assert "[REDACTED]" in caplog.text
+        assert "text/html" in caplog.text
+    
     def test_log_error(self, caplog):
         """Test error logging."""
         from main import log_error
@@ -55,7 +80,45 @@ class TestHelperFunctions:
         assert "Error Type: ValueError" in caplog.text
         assert "Error Message: Test error message" in caplog.text
         assert "Traceback:" in caplog.text
-
+    
+    def test_request_id_log_filter(self):
+        """Test log records are stamped with the bound request ID."""
+        import contextvars
+        import logging
+        from main import RequestIdLogFilter, new_request_id
+        
+        def stamp():
+            request_id = new_request_id()
+            record = logging.LogRecord("main", logging.INFO, __file__, 1, "msg", None, None)
+            RequestIdLogFilter().filter(record)
+            return request_id, record.request_id
+        
+        request_id, stamped = contextvars.copy_context().run(stamp)
+        assert stamped == request_id
+        
+        record = logging.LogRecord("main", logging.INFO, __file__, 1, "msg", None, None)
+        RequestIdLogFilter().filter(record)
+        assert record.request_id == "-"
+    
+    def test_new_request_id_logs_well_formed_upstream_id(self, mock_request, caplog):
+        """Test an upstream X-Request-Id is logged only when it looks like an ID."""
+        import contextvars
+        import logging
+        from main import new_request_id
+        
+        caplog.set_level(logging.INFO)
+        mock_request.headers = {"x-request-id": "abc-123"}
+        request_id = contextvars.copy_context().run(new_request_id, mock_request)
+        
+        assert request_id != "abc-123"
+        assert len(request_id) == 16
+        assert "Upstream request ID: abc-123" in caplog.text
+        
+        caplog.clear()
+        mock_request.headers = {"x-request-id": "bad id\nINFO forged line"}
+        contextvars.copy_context().run(new_request_id, mock_request)
+        
+        assert "forged line" not in caplog.text
 
 class TestEmailService:
     """Test email service functionality."""
@@ -69,8 +132,7 @@ class TestEmailService:
         
         # Mock SMTP
         with patch('smtplib.SMTP') as mock_smtp:
-            mock_server = Mock()
-            mock_smtp.return_value.__enter__.return_value = mock_server
+            mock_server = mock_smtp.return_value
             
             result = await email_service.send_welcome_email("test@example.com", "Test User")
             
@@ -85,8 +147,7 @@ class TestEmailService:
         email_service = EmailService()
         
         with patch('smtplib.SMTP') as mock_smtp:
-            mock_server = Mock()
-            mock_smtp.return_value.__enter__.return_value = mock_server
+            mock_server = mock_smtp.return_value
             
             result = await email_service.send_otp_email("test@example.com", "123456", "Test")
             
@@ -111,6 +172,166 @@ class TestEmailService:
             result = await email_service.send_welcome_email("test@example.com", "Test")
             
             assert result is False
+    
+    @pytest.mark.asyncio
+    async def test_otp_recently_sent_tracks_successful_sends(self):
+        """Test OTP resend window is only armed by a successful send."""
+        from core.email_service import EmailService
+        
+        email_service = EmailService()
+        email_service._send_raw_via_ses = AsyncMock(return_value=True)
+        email_service._send_email = AsyncMock(return_value=True)
+        
+        assert email_service.otp_recently_sent("test@example.com") is False
+        
+        await email_service.send_otp_email("test@example.com", "123456", "Test")
+        
+        assert email_service.otp_recently_sent("test@example.com") is True
+        assert email_service.otp_recently_sent("other@example.com") is False
+    
+    @pytest.mark.asyncio
+    async def test_close_flushes_queued_welcome_emails(self):
+        """Test welcome emails queued for SES are sent when the service closes."""
+        from core.email_service import EmailService
+        
+        email_service = EmailService()
+        email_service.ses_client = Mock()
+        email_service._send_bulk_welcome_via_ses = AsyncMock(return_value=True)
+        
+        with patch('core.email_service.SES_BULK_FLUSH_INTERVAL', 60):
+            assert await email_service.send_welcome_email("a@example.com", "A") is True
+            assert await email_service.send_welcome_email("b@example.com", "B") is True
+            await email_service.close()
+        
+        email_service._send_bulk_welcome_via_ses.assert_awaited_once_with(
+            [("a@example.com", "A"), ("b@example.com", "B")]
+        )
+
+
+class TestTTLCache:
+    """Test the in-process TTL cache."""
+    
+    def test_get_set_and_expiry(self):
+        """Test values are returned until their TTL passes."""
+        from core.cache import TTLCache
+        
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        
+        with patch('core.cache.time.monotonic', return_value=10**9):
+            assert cache.get("a") is None
+        assert len(cache) == 0
+    
+    def test_evicts_least_recently_used(self):
+        """Test entries past maxsize are evicted oldest-first."""
+        from core.cache import TTLCache
+        
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("c") == 3
+    
+    @pytest.mark.asyncio
+    async def test_get_or_load_caches_none_and_invalidates(self):
+        """Test loader results (including None) are cached until invalidated."""
+        from core.cache import TTLCache
+        
+        cache = TTLCache(maxsize=10, ttl=60)
+        loader = AsyncMock(return_value=None)
+        
+        assert await cache.get_or_load(1, loader) is None
+        assert await cache.get_or_load(1, loader) is None
+        assert loader.await_count == 1
+        
+        cache.invalidate(1)
+        await cache.get_or_load(1, loader)
+        assert loader.await_count == 2
+    
+    def test_set_with_entry_ttl(self):
+        """Test a per-entry ttl overrides the cache-wide ttl."""
+        from core.cache import TTLCache
+        
+        cache = TTLCache(maxsize=10, ttl=60)
+        with patch('core.cache.time.monotonic', return_value=100):
+            cache.set("short", 1, ttl=5)
+            cache.set("long", 2)
+        
+        with patch('core.cache.time.monotonic', return_value=110):
+            assert cache.get("short") is None
+            assert cache.get("long") == 2
+
+
+class TestOpenAIGateway:
+    """Test the rate-limited OpenAI gateway."""
+    
+    def test_estimate_chat_tokens(self):
+        """Test token estimates cover text, images and the completion budget."""
+        from core.openai_gateway import estimate_chat_tokens, IMAGE_INPUT_TOKENS
+        
+        messages = [
+            {"role": "system", "content": "x" * 400},
+            {"role": "user", "content": [
+                {"type": "text", "text": "y" * 40},
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64,abc"}}
+            ]}
+        ]
+        
+        assert estimate_chat_tokens(messages, max_tokens=100) == 110 + IMAGE_INPUT_TOKENS + 100
+    
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self):
+        """Test connection errors are retried and other errors are not."""
+        import httpx
+        from openai import APIConnectionError
+        from core.openai_gateway import OpenAIGateway
+        
+        gateway = OpenAIGateway(
+            requests_per_minute=600, tokens_per_minute=100000, images_per_minute=600,
+            backoff_min=0, backoff_max=0
+        )
+        transient = APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/images"))
+        generate = AsyncMock(side_effect=[transient, "image"])
+        
+        assert await gateway.image_generate(generate, prompt="p") == "image"
+        assert generate.await_count == 2
+        generate.assert_awaited_with(prompt="p")
+        
+        failing = AsyncMock(side_effect=ValueError("bad request"))
+        with pytest.raises(ValueError):
+            await gateway.chat_completion(failing, messages=[])
+        assert failing.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_limiter_released_between_retries(self):
+        """Test the image limiter is only held while a call is in flight."""
+        import asyncio
+        import httpx
+        from openai import APIConnectionError
+        from core.openai_gateway import OpenAIGateway
+        
+        gateway = OpenAIGateway(
+            requests_per_minute=600, tokens_per_minute=100000, images_per_minute=600,
+            backoff_min=0, backoff_max=0
+        )
+        limiter = asyncio.Semaphore(1)
+        transient = APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/images"))
+        held = []
+        
+        async def generate(**kwargs):
+            held.append(limiter.locked())
+            if len(held) == 1:
+                raise transient
+            return "image"
+        
+        assert await gateway.image_generate(generate, limiter=limiter, prompt="p") == "image"
+        assert held == [True, True]
+        assert not limiter.locked()
 
 
 class TestAuthModels:
@@ -281,8 +502,8 @@ class TestRequestDeduplication:
     """Test request deduplication logic."""
     
     @pytest.mark.asyncio
-    async def test_duplicate_request_prevention(self, test_client, mock_db_manager):
-        """Test that duplicate requests are prevented."""
+    async def test_duplicate_request_tracks_in_flight_story(self, test_client, mock_db_manager):
+        """Test a duplicate request is handed the story already being generated."""
         from main import recent_requests
         
         # Clear recent requests
@@ -296,20 +517,37 @@ class TestRequestDeduplication:
             "formats": ["Comic Book"]
         }
         
-        # First request should succeed
-        response1 = test_client.post("/generateStory", json=request_data)
-        assert response1.status_code == 200
-        
-        # Immediate duplicate should fail
-        response2 = test_client.post("/generateStory", json=request_data)
-        assert response2.status_code == 429
-        assert "wait a moment" in response2.json()["detail"]
-        
-        # Clear cache and try again
-        recent_requests.clear()
-        response3 = test_client.post("/generateStory", json=request_data)
-        assert response3.status_code == 200
-
+        # Keep the first story in flight so the duplicate finds it
+        with patch('main.generate_story_background_task', new_callable=AsyncMock) as mock_task, \
+             patch('main.get_optional_user', new_callable=AsyncMock, return_value={"id": 1}):
+            response1 = test_client.post("/generateStory", json=request_data)
+            assert response1.status_code == 200
+            
+            # Immediate duplicate tracks the same story without starting another
+            response2 = test_client.post("/generateStory", json=request_data)
+            assert response2.status_code == 200
+            assert response2.json()["story_id"] == response1.json()["story_id"]
+            assert "already in progress" in response2.json()["message"]
+            assert mock_task.await_count == 1
+            
+            # Once the story is no longer in flight a new one is started
+            recent_requests.clear()
+            response3 = test_client.post("/generateStory", json=request_data)
+            assert response3.status_code == 200
+            assert mock_task.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_anonymous_duplicates_are_not_coalesced(self, test_client, mock_db_manager):
+        """Test anonymous requests with the same prompt each get their own story."""
+        with patch('main.generate_story_background_task', new_callable=AsyncMock) as mock_task, \
+             patch('main.get_optional_user', new_callable=AsyncMock, return_value=None), \
+             patch('core.database.create_story_placeholder', new_callable=AsyncMock, side_effect=[1, 2]):
+            response1 = test_client.post("/generateStory", json={"prompt": "Same story prompt"})
+            response2 = test_client.post("/generateStory", json={"prompt": "Same story prompt"})
+        
+        assert response1.json()["story_id"] == 1
+        assert response2.json()["story_id"] == 2
+        assert mock_task.await_count == 2
 
 class TestCatchAllRoute:
     """Test catch-all route handling."""
@@ -326,6 +564,18 @@ class TestCatchAllRoute:
         assert response.status_code == 200
         assert "story_id" in response.json()
     
+    @pytest.mark.asyncio
+    async def test_catch_all_route_runs_background_task(self, test_client, mock_db_manager):
+        """Test the story fallback's background task runs after the response."""
+        mock_db_manager.execute_update.return_value = 1
+        mock_db_manager.execute_query.return_value = [{"id": 1}]
+        
+        with patch('main.generate_story_background_task', new_callable=AsyncMock) as mock_task:
+            response = test_client.post("/random-path", json={"prompt": "Test"})
+        
+        assert response.status_code == 200
+        mock_task.assert_awaited_once()
+    
     @pytest.mark.asyncio
     async def test_catch_all_route_fun_facts(self, test_client, mock_openai_client):
         """Test catch-all route for fun facts."""
@@ -336,4 +586,47 @@ class TestCatchAllRoute:
         response = test_client.post("/generateFunFacts", json={"prompt": "Test"})
         
         assert response.status_code == 200
-        assert "facts" in response.json()
\ No newline at end of file
+        assert "facts" in response.json()
+    
+    @pytest.mark.asyncio
+    async def test_catch_all_route_ignores_get(self, test_client):
+        """Test unknown GET paths are rejected by the router instead of generating a story."""
+        with patch('main.generate_story_async', new_callable=AsyncMock) as mock_generate:
+            response = test_client.get("/wp-login.php")
+        
+        assert response.status_code == 405
+        mock_generate.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_catch_all_route_skips_form_body(self, test_client):
+        """Test form posts reach the story fallback with an empty prompt without parsing the body."""
+        with patch('main.generate_story_async', new_callable=AsyncMock, return_value={"story_id": 1}) as mock_generate:
+            response = test_client.post("/random-path", data={"prompt": "Test"})
+        
+        assert response.status_code == 200
+        assert mock_generate.await_args[0][0].prompt == ""
+    
+    @pytest.mark.asyncio
+    async def test_catch_all_route_rejects_large_body(self, test_client):
+        """Test oversized bodies are rejected with 413 before reaching the story fallback."""
+        from main import LEGACY_MAX_BODY_BYTES
+        
+        with patch('main.generate_story_async', new_callable=AsyncMock) as mock_generate:
+            response = test_client.post(
+                "/random-path",
+                content=b'{"prompt": "' + b"a" * LEGACY_MAX_BODY_BYTES + b'"}',
+                headers={"Content-Type": "application/json"}
+            )
+        
+        assert response.status_code == 413
+        mock_generate.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_explicit_admin_route_not_shadowed(self, test_client):
+        """Test admin paths hit their own routes, keeping the {"error": ...} auth failure body."""
+        with patch('main.generate_story_async', new_callable=AsyncMock) as mock_generate:
+            response = test_client.post("/admin/create-public-story", json={"title": "Test"})
+        
+        assert response.status_code == 401
+        assert response.json() == {"error": "Authentication required"}
+        mock_generate.assert_not_awaited()